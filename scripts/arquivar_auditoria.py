@@ -0,0 +1,144 @@
+"""
+Arquivamento da Auditoria - historico_alteracoes → .jsonl.gz
+Data: 29 de Janeiro de 2026
+Descrição: Exporta as partições mensais de public.historico_alteracoes mais antigas que
+           a retenção para arquivos JSONL comprimidos e, com --remover, descarta as
+           partições exportadas no banco
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+from supabase import create_client, Client
+
+# Configuração do Supabase
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_KEY")
+
+if not SUPABASE_URL or not SUPABASE_KEY:
+    print("[ERROR] ERRO: Variaveis de ambiente SUPABASE_URL e SUPABASE_SERVICE_KEY nao configuradas!")
+    sys.exit(1)
+
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+DIRETORIO_ARQUIVO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'arquivo_auditoria')
+
+# Meses mantidos no banco, além do mês atual
+MESES_RETENCAO_PADRAO = 12
+
+# Meses futuros com partição já criada
+MESES_A_FRENTE = 3
+
+TAMANHO_PAGINA = 1000
+
+def inicio_retencao(meses_retencao: int, agora: datetime = None) -> datetime:
+    """Primeiro dia do mês mais antigo mantido no banco."""
+    agora = agora or datetime.now(timezone.utc)
+    mes = agora.year * 12 + agora.month - 1 - meses_retencao
+    return datetime(mes // 12, mes % 12 + 1, 1, tzinfo=timezone.utc)
+
+def listar_particoes() -> list:
+    particoes = supabase.rpc('listar_particoes_auditoria').execute().data or []
+    for particao in particoes:
+        for campo in ('inicio', 'fim'):
+            if particao[campo]:
+                particao[campo] = datetime.fromisoformat(particao[campo])
+    return particoes
+
+def exportar_particao(particao: dict, destino: str, tamanho_pagina: int = TAMANHO_PAGINA) -> tuple:
+    """Grava as linhas do mês em <destino>/<particao>.jsonl.gz. Devolve (caminho, linhas).
+
+    Lê pela tabela pai com filtro de changed_at (o PostgREST não enxerga o
+    schema auditoria), paginando por id. O arquivo só aparece com o nome
+    final depois de escrito por inteiro.
+    """
+    os.makedirs(destino, exist_ok=True)
+    caminho = os.path.join(destino, f"{particao['particao']}.jsonl.gz")
+    temporario = caminho + '.tmp'
+
+    linhas, ultimo_id = 0, 0
+    with gzip.open(temporario, 'wt', encoding='utf-8') as arquivo:
+        while True:
+            pagina = (supabase.table('historico_alteracoes').select('*')
+                      .gte('changed_at', particao['inicio'].isoformat())
+                      .lt('changed_at', particao['fim'].isoformat())
+                      .gt('id', ultimo_id)
+                      .order('id')
+                      .limit(tamanho_pagina)
+                      .execute().data or [])
+            for registro in pagina:
+                arquivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+            linhas += len(pagina)
+            if len(pagina) < tamanho_pagina:
+                break
+            ultimo_id = pagina[-1]['id']
+
+    os.replace(temporario, caminho)
+    return caminho, linhas
+
+def arquivar(meses_retencao: int = MESES_RETENCAO_PADRAO, destino: str = DIRETORIO_ARQUIVO,
+             remover=False, tamanho_pagina: int = TAMANHO_PAGINA):
+    print("\n" + "="*60)
+    print(">> ARQUIVAMENTO DA AUDITORIA")
+    print("="*60)
+
+    criadas = supabase.rpc('garantir_particoes_auditoria', {'p_meses_a_frente': MESES_A_FRENTE}).execute().data
+    if criadas:
+        print(f"[OK] Particoes mensais criadas: {criadas}")
+
+    limite = inicio_retencao(meses_retencao)
+    particoes = listar_particoes()
+    antigas = [p for p in particoes if p['fim'] and p['fim'] <= limite]
+    print(f"[*] Retencao: {meses_retencao} meses (mantido a partir de {limite:%m/%Y})")
+    print(f"[*] Particoes no banco: {len(particoes)}, a arquivar: {len(antigas)}")
+
+    exportadas = removidas = 0
+    for particao in antigas:
+        print(f"\n[*] {particao['particao']} ({particao['inicio']:%m/%Y}, "
+              f"~{particao['linhas_estimadas']} linhas, {particao['tamanho_bytes'] / 1024 / 1024:.1f} MB)")
+        try:
+            caminho, linhas = exportar_particao(particao, destino, tamanho_pagina)
+        except Exception as e:
+            print(f"   [X] Erro ao exportar: {e}")
+            continue
+        exportadas += 1
+        print(f"   [OK] {linhas} linhas em {caminho} ({os.path.getsize(caminho) / 1024 / 1024:.1f} MB)")
+
+        if not remover:
+            continue
+        try:
+            supabase.rpc('remover_particao_auditoria', {
+                'p_particao': particao['particao'], 'p_linhas_exportadas': linhas,
+            }).execute()
+        except Exception as e:
+            # Ex.: linhas novas no mês depois da exportação; a partição fica para a próxima execução
+            print(f"   [X] Particao mantida no banco: {e}")
+            continue
+        removidas += 1
+        print("   [OK] Particao removida do banco")
+
+    print("\n" + "="*60)
+    print(f"[OK] Exportadas: {exportadas}")
+    if remover:
+        print(f"[OK] Removidas: {removidas}")
+    elif exportadas:
+        print("[!] Particoes mantidas no banco (use --remover para descartar as exportadas)")
+    print("="*60)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta e descarta meses antigos de public.historico_alteracoes")
+    parser.add_argument("--meses-retencao", type=int, default=MESES_RETENCAO_PADRAO,
+                        help=f"Meses mantidos no banco alem do atual (padrao: {MESES_RETENCAO_PADRAO})")
+    parser.add_argument("--destino", default=DIRETORIO_ARQUIVO,
+                        help="Diretorio dos arquivos .jsonl.gz (padrao: scripts/arquivo_auditoria/)")
+    parser.add_argument("--remover", action="store_true",
+                        help="Remove do banco as particoes exportadas com sucesso")
+    parser.add_argument("--tamanho-pagina", type=int, default=TAMANHO_PAGINA,
+                        help=f"Linhas por requisicao na exportacao (padrao: {TAMANHO_PAGINA})")
+    args = parser.parse_args()
+
+    arquivar(args.meses_retencao, args.destino, args.remover, args.tamanho_pagina)
@@ -0,0 +1,491 @@
+"""
+Benchmark da Migração - Planilha sintética → PostgREST local
+Descrição: Gera planilhas sintéticas no layout Histórico/Pipe/Pendências, sobe um servidor
+           local que imita os endpoints REST do Supabase e mede cada etapa da migração
+           (tempo, linhas/s, pico de memória e requisições), gravando o resultado em JSON
+
+Uso:
+    python benchmark_migracao.py                          # 1k, 10k e 100k linhas
+    python benchmark_migracao.py --linhas 1000 10000 --concorrencia 4
+    python benchmark_migracao.py --comparar benchmarks/benchmark-anterior.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from instrumentacao import pico_rss_mb
+
+DIRETORIO_SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_PLANILHAS = os.path.join(DIRETORIO_SCRIPTS, '.cache', 'benchmark')
+DIRETORIO_RESULTADOS = os.path.join(DIRETORIO_SCRIPTS, 'benchmarks')
+
+TAMANHOS_PADRAO = (1000, 10000, 100000)
+
+# Alterar quando o gerador mudar: invalida as planilhas sintéticas já geradas
+VERSAO_GERADOR = 1
+
+# Divisão das linhas entre as abas (o Histórico é a maior na planilha real)
+PROPORCAO_ABAS = (('Histórico', 0.80), ('Pipe', 0.15), ('Pendências', 0.05))
+
+# Piora (fração) a partir da qual --comparar acusa regressão; diferenças menores que
+# DIFERENCA_MINIMA_SEGUNDOS são ruído de medição em etapas curtas
+TOLERANCIA_REGRESSAO = 0.20
+DIFERENCA_MINIMA_SEGUNDOS = 0.05
+
+# Etapas cujo custo cresce com o número de linhas (as demais são fixas por execução)
+ETAPAS_POR_LINHA = ('leitura', 'conversao', 'validacao', 'escrita')
+
+# Cabeçalhos como na planilha "Pipe - Overview"; o Pipe usa as 42 primeiras colunas do Histórico
+COLUNAS_HISTORICO = [
+    'UID', 'PMO', 'Categoria', 'Operação', 'Previsão de Liquidação', 'Veículo', 'Emissão', 'Séries',
+    'Compliance', 'Estruturação', 'Gestão', 'Originação', 'Volume', 'Remuneração', 'Lastro',
+    'Tipo Operação', 'Boletagem', 'DF', 'Banco', 'Agência', 'Conta Bancária', 'Majoração',
+    'Analista Financeiro', 'Analista Contábil', 'Data de Entrada no Pipe', 'Próximos Passos',
+    'Alertas', 'Floating', 'Status', 'Tech', 'Resumo', 'Analista Gestão', 'Investidores',
+    'Data de Liquidação', '1ª Data de Pagamento', 'Mapa de Liquidação', 'Mapa de Registros', 'LO ',
+    'DD', 'Envio e-mail prestadores', 'Passagem de Bastão', 'Kick off', 'Histórico',
+    'Coordenador Líder', 'Agente Fiduciário ', 'Escriturador ', 'Liquidante ',
+]
+COLUNAS_PIPE = COLUNAS_HISTORICO[:42]
+COLUNAS_PENDENCIAS = [c for c in COLUNAS_HISTORICO[:43] if c not in ('Analista Financeiro', 'Analista Contábil')]
+
+# Nomes de referência; a planilha sintética usa também variações de grafia deles
+CATEGORIAS = ['CRI', 'CRA', 'DEB', 'CCI', 'NC', 'FIDC']
+VEICULOS = [
+    'Travessia Securitizadora S.A.',
+    'Travessia Securitizadora de Créditos Financeiros S.A.',
+    'Travessia & Inco Securitizadora de Créditos Mercantis S.A.',
+    'Travessia & MB Securitizadora de Créditos Mercantis S.A.',
+]
+PMOS = ['Beatriz', 'Eduarda', 'Léo', 'Lucas', 'Ronaldo']
+ANALISTAS = ['Ana', 'Eduardo', 'Felipe', 'Paula', 'Raphaela', 'Yuri']
+
+TEXTOS = [
+    'Aguardando minutas consolidadas',
+    'Iniciar boletagem nas contas escrow\nValidar fluxo com o investidor',
+    'CRI com INCO via resolução 88. Lastro em Nota Comercial (CCI) - destinação de recursos '
+    'para empreendimento das SPEs. Desembolso conforme relatório de obras.',
+    None,
+]
+
+# =====================================================
+# Planilhas sintéticas
+# =====================================================
+
+def _variar(rnd: random.Random, nome: str) -> str:
+    """Grafias que aparecem na planilha real: espaço sobrando, caixa e acento."""
+    sorteio = rnd.random()
+    if sorteio < 0.05:
+        return nome + ' '
+    if sorteio < 0.08:
+        return nome.upper()
+    if sorteio < 0.10:
+        return nome.replace('é', 'e').replace('ó', 'o')
+    return nome
+
+def _linha_sintetica(rnd: random.Random, aba: str, numero: int, colunas: list) -> list:
+    entrada = datetime(2018, 1, 1) + timedelta(days=rnd.randrange(0, 3000))
+    liquidacao = entrada + timedelta(days=rnd.randrange(0, 120))
+    liquidada = aba != 'Pipe'
+
+    valores = {
+        'UID': float(numero) if aba == 'Histórico' else None,
+        'Emissão': float(numero),
+        'PMO': _variar(rnd, rnd.choice(PMOS)),
+        'Categoria': _variar(rnd, rnd.choice(CATEGORIAS)),
+        'Operação': f"Operação {numero}",
+        'Previsão de Liquidação': liquidacao,
+        'Veículo': _variar(rnd, rnd.choice(VEICULOS)),
+        'Séries': rnd.choice(['Série Única', '2 Séries', '3 séries']),
+        'Estruturação': 50000.0,
+        'Gestão': 5000.0,
+        'Volume': 'Pendente' if rnd.random() < 0.03 else float(rnd.randrange(1_000_000, 200_000_000)),
+        'Remuneração': 'CDI + 5%',
+        'Boletagem': rnd.choice(['OK', 'Iniciar boletagem', None]),
+        'Banco': 'Itaú',
+        'Agência': 8499.0,
+        'Data de Entrada no Pipe': entrada,
+        'Próximos Passos': rnd.choice(TEXTOS),
+        'Alertas': rnd.choice(TEXTOS),
+        'Floating': rnd.choice(['Sim', 'N/A', None]),
+        'Status': ('Liquidada' if liquidada else rnd.choice(['Em Estruturação', 'On hold', 'Em Estruturação'])),
+        'Resumo': rnd.choice(TEXTOS),
+        'Analista Gestão': _variar(rnd, rnd.choice(ANALISTAS)),
+        'Data de Liquidação': liquidacao if liquidada else None,
+        '1ª Data de Pagamento': liquidacao + timedelta(days=rnd.randrange(30, 400)) if liquidada else 'Pendente',
+    }
+    # ~1% sem identificação: vão para a quarentena, como na planilha real
+    if rnd.random() < 0.01:
+        valores['UID'] = valores['Emissão'] = None
+    return [valores.get(coluna) for coluna in colunas]
+
+def gerar_planilha(caminho: str, linhas: int, semente: int = 42):
+    """Grava uma planilha com `linhas` operações divididas entre as três abas migradas."""
+    from openpyxl import Workbook
+
+    rnd = random.Random(semente)
+    planilha = Workbook(write_only=True)
+    numero = 0
+    for aba, proporcao in PROPORCAO_ABAS:
+        folha = planilha.create_sheet(aba)
+        colunas = {'Histórico': COLUNAS_HISTORICO, 'Pipe': COLUNAS_PIPE, 'Pendências': COLUNAS_PENDENCIAS}[aba]
+        if aba == 'Pipe':
+            # Cabeçalho na linha 7 (header=6), com as linhas de título acima como na planilha real
+            for _ in range(4):
+                folha.append([None, ' '])
+            folha.append([' '] + list(range(2, len(colunas) + 1)))
+            folha.append([None] * 9 + ['Fees'] + [None] * 6 + ['Financeiro'])
+        folha.append(colunas)
+        quantidade = round(linhas * proporcao) if aba != PROPORCAO_ABAS[-1][0] else linhas - numero
+        for _ in range(quantidade):
+            numero += 1
+            folha.append(_linha_sintetica(rnd, aba, numero, colunas))
+
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = caminho + '.tmp'
+    planilha.save(temporario)
+    os.replace(temporario, caminho)
+
+def planilha_sintetica(linhas: int, semente: int = 42) -> str:
+    """Caminho da planilha sintética de `linhas` linhas, gerada só na primeira vez."""
+    caminho = os.path.join(DIRETORIO_PLANILHAS, f"sintetica-{linhas}-s{semente}-v{VERSAO_GERADOR}.xlsx")
+    if not os.path.exists(caminho):
+        print(f"[*] Gerando planilha sintetica com {linhas} linhas...")
+        inicio = time.perf_counter()
+        gerar_planilha(caminho, linhas, semente)
+        print(f"   [OK] {caminho} ({time.perf_counter() - inicio:.1f}s)")
+    return caminho
+
+# =====================================================
+# PostgREST local
+# =====================================================
+
+def _tabelas_referencia() -> dict:
+    """Respostas do GET de cada tabela de referência, com os campos que a migração seleciona."""
+    def linhas(nomes, campo):
+        return [{'id': str(uuid.uuid5(uuid.NAMESPACE_OID, f"{campo}:{nome}")), campo: nome} for nome in nomes]
+
+    return {
+        'categorias': linhas(CATEGORIAS, 'codigo'),
+        'veiculos': linhas(VEICULOS, 'sigla'),
+        'user_profiles': linhas(PMOS, 'nome'),
+        'analistas_gestao': linhas(ANALISTAS, 'nome'),
+    }
+
+class ServidorPostgrestFalso:
+    """Imita o necessário de /rest/v1 para a migração, contando as requisições.
+
+    GET devolve as tabelas de referência (as demais vêm vazias), POST aceita
+    insert/upsert e DELETE aceita qualquer filtro. Nada é persistido; só
+    são contadas requisições por rota e linhas recebidas. `latencia` simula
+    o tempo de resposta do Supabase.
+    """
+
+    def __init__(self, latencia: float = 0.0):
+        self.latencia = latencia
+        self.respostas_get = _tabelas_referencia()
+        self.lock = threading.Lock()
+        self.zerar()
+
+        servidor = self
+
+        class Manipulador(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _responder(self, status: int, corpo: bytes = b''):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def _tabela(self) -> str:
+                return urlparse(self.path).path.rstrip('/').rsplit('/', 1)[-1]
+
+            def _registrar(self, linhas: int = 0):
+                with servidor.lock:
+                    servidor.requisicoes[f"{self.command} {self._tabela()}"] += 1
+                    servidor.linhas_recebidas += linhas
+                if servidor.latencia:
+                    time.sleep(servidor.latencia)
+
+            def do_GET(self):
+                self._registrar()
+                self._responder(200, json.dumps(servidor.respostas_get.get(self._tabela(), [])).encode())
+
+            def do_POST(self):
+                corpo = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'[]')
+                self._registrar(len(corpo) if isinstance(corpo, list) else 1)
+                self._responder(201)
+
+            def do_DELETE(self):
+                self._registrar()
+                self._responder(200, b'[]')
+
+        self.http = ThreadingHTTPServer(('127.0.0.1', 0), Manipulador)
+        self.http.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.http.server_address[1]}"
+
+    def zerar(self):
+        with self.lock:
+            self.requisicoes = Counter()
+            self.linhas_recebidas = 0
+
+    def resumo(self) -> dict:
+        with self.lock:
+            return {
+                'total': sum(self.requisicoes.values()),
+                'por_rota': dict(sorted(self.requisicoes.items())),
+                'linhas_recebidas': self.linhas_recebidas,
+            }
+
+    def iniciar(self):
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+        return self
+
+    def parar(self):
+        self.http.shutdown()
+        self.http.server_close()
+
+# =====================================================
+# Medição (executada em um processo filho por caso)
+# =====================================================
+
+@contextmanager
+def _etapa(etapas: dict, nome: str):
+    inicio = time.perf_counter()
+    yield
+    etapas[nome] = {'segundos': round(time.perf_counter() - inicio, 4), 'pico_rss_mb': pico_rss_mb()}
+
+def medir_caso(caminho: str, url: str, motor: str, concorrencia: int, tamanho_lote: int,
+               max_req_por_segundo: float) -> dict:
+    """Roda limpeza → referências → leitura → conversão → validação → escrita e mede cada etapa.
+
+    Usa as mesmas funções de migrate_data.executar_migracao, sem os caches
+    locais (planilha e referências), para medir sempre a execução completa.
+    """
+    os.environ['SUPABASE_URL'] = url
+    os.environ['SUPABASE_SERVICE_KEY'] = 'benchmark'
+    sys.path.insert(0, DIRETORIO_SCRIPTS)
+    import migrate_data as migracao
+    from validacao import Validador
+
+    etapas = {}
+    inicio = time.perf_counter()
+
+    with _etapa(etapas, 'limpeza'):
+        migracao.limpar_dados_antigos()
+    with _etapa(etapas, 'referencias'):
+        refs = migracao.criar_resolvedores(migracao._buscar_tabelas_referencia())
+    with _etapa(etapas, 'leitura'):
+        dados = migracao.carregar_planilha(caminho, motor)
+    with _etapa(etapas, 'conversao'):
+        convertidas = {chave: migracao.converter_aba(config['df'], refs, config['status_padrao'])
+                       for chave, config in dados.items()}
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        validador = Validador(os.path.join(diretorio, 'quarentena.jsonl'))
+        with _etapa(etapas, 'validacao'):
+            itens = {chave: validador.filtrar(chave, convertida['operacoes'])
+                     for chave, convertida in convertidas.items()}
+        validador.fechar()
+
+    with _etapa(etapas, 'escrita'):
+        gravacao = migracao.Gravacao(tamanho_lote, concorrencia, max_req_por_segundo)
+        for chave in itens:
+            gravacao.inserir(itens[chave])
+        sucessos, erros = gravacao.finalizar()
+
+    linhas = sum(len(convertida['operacoes']) for convertida in convertidas.values())
+    total = time.perf_counter() - inicio
+    for nome, etapa in etapas.items():
+        por_linha = nome in ETAPAS_POR_LINHA and etapa['segundos']
+        etapa['linhas_por_segundo'] = round(linhas / etapa['segundos']) if por_linha else None
+
+    return {
+        'linhas': linhas,
+        'gravadas': sucessos,
+        'erros': erros,
+        'quarentena': validador.recusados,
+        'total_segundos': round(total, 4),
+        'linhas_por_segundo': round(linhas / total) if total else None,
+        'pico_rss_mb': pico_rss_mb(),
+        'etapas': etapas,
+        'latencia_requisicoes': migracao.metricas.relatorio()['requisicoes'],
+    }
+
+def executar_caso(servidor: ServidorPostgrestFalso, caminho: str, args) -> dict:
+    """Mede uma planilha num processo novo, para que o pico de RSS seja só daquele caso."""
+    servidor.zerar()
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as arquivo:
+        saida = arquivo.name
+    comando = [
+        sys.executable, os.path.abspath(__file__), '--caso', caminho, '--saida-caso', saida,
+        '--url', servidor.url, '--motor', args.motor, '--concorrencia', str(args.concorrencia),
+        '--tamanho-lote', str(args.tamanho_lote), '--max-req-por-segundo', str(args.max_req_por_segundo),
+    ]
+    try:
+        subprocess.run(comando, check=True, stdout=None if args.verbose else subprocess.DEVNULL)
+        with open(saida, encoding='utf-8') as arquivo:
+            resultado = json.load(arquivo)
+    finally:
+        os.remove(saida)
+
+    resultado['requisicoes'] = servidor.resumo()
+    resultado['tamanho_arquivo_mb'] = round(os.path.getsize(caminho) / (1024 * 1024), 2)
+    return resultado
+
+# =====================================================
+# Relatório
+# =====================================================
+
+def _versao_codigo():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=DIRETORIO_SCRIPTS,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _metadados(args) -> dict:
+    sys.path.insert(0, DIRETORIO_SCRIPTS)
+    import pandas as pd
+    from leitor_planilha import resolver_motor
+    from transformacao import VERSAO_TRANSFORMACAO
+
+    return {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'versao_codigo': _versao_codigo(),
+        'versao_transformacao': VERSAO_TRANSFORMACAO,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'plataforma': platform.platform(),
+        'motor': resolver_motor(args.motor),
+        'concorrencia': args.concorrencia,
+        'tamanho_lote': args.tamanho_lote,
+        'max_req_por_segundo': args.max_req_por_segundo,
+        'latencia_ms': args.latencia_ms,
+    }
+
+def imprimir_caso(resultado: dict):
+    print(f"\n[*] {resultado['linhas']} linhas ({resultado['tamanho_arquivo_mb']} MB): "
+          f"{resultado['total_segundos']:.2f}s, {resultado['linhas_por_segundo']} linhas/s, "
+          f"pico RSS {resultado['pico_rss_mb']} MB, {resultado['requisicoes']['total']} requisicoes")
+    for nome, etapa in resultado['etapas'].items():
+        print(f"   {nome:12s} {etapa['segundos']:9.3f}s  {etapa['linhas_por_segundo'] or '-':>10} linhas/s  "
+              f"RSS {etapa['pico_rss_mb']} MB")
+    print(f"   gravadas: {resultado['gravadas']} | erros: {resultado['erros']} | quarentena: {resultado['quarentena']}")
+
+def comparar(atual: dict, anterior: dict, tolerancia: float = TOLERANCIA_REGRESSAO) -> list:
+    """Compara tempos por caso e etapa; retorna as regressões acima da tolerância."""
+    regressoes = []
+    casos_anteriores = {caso['linhas']: caso for caso in anterior.get('casos', [])}
+    print(f"\n[*] Comparacao com {anterior['metadados'].get('versao_codigo') or 'execucao anterior'} "
+          f"({anterior['metadados'].get('gerado_em')})")
+
+    for caso in atual['casos']:
+        base = casos_anteriores.get(caso['linhas'])
+        if base is None:
+            continue
+        medidas = [('total', caso['total_segundos'], base['total_segundos'])]
+        medidas += [(nome, etapa['segundos'], base['etapas'][nome]['segundos'])
+                    for nome, etapa in caso['etapas'].items() if nome in base.get('etapas', {})]
+        for nome, agora, antes in medidas:
+            if not antes:
+                continue
+            variacao = (agora - antes) / antes
+            regrediu = variacao > tolerancia and agora - antes >= DIFERENCA_MINIMA_SEGUNDOS
+            marcador = '[X]' if regrediu else '[OK]'
+            print(f"   {marcador} {caso['linhas']:>7} linhas {nome:12s} {antes:8.3f}s -> {agora:8.3f}s ({variacao:+.0%})")
+            if regrediu:
+                regressoes.append((caso['linhas'], nome, variacao))
+
+        if caso['requisicoes']['total'] > base['requisicoes']['total']:
+            print(f"   [X] {caso['linhas']:>7} linhas requisicoes {base['requisicoes']['total']} -> {caso['requisicoes']['total']}")
+            regressoes.append((caso['linhas'], 'requisicoes', None))
+    return regressoes
+
+def main(args):
+    servidor = ServidorPostgrestFalso(args.latencia_ms / 1000).iniciar()
+    print("=" * 60)
+    print(">> BENCHMARK DA MIGRACAO")
+    print("=" * 60)
+    print(f"[*] PostgREST local em {servidor.url}")
+
+    resultado = {'metadados': _metadados(args), 'casos': []}
+    try:
+        for linhas in args.linhas:
+            caminho = planilha_sintetica(linhas, args.semente)
+            caso = executar_caso(servidor, caminho, args)
+            imprimir_caso(caso)
+            resultado['casos'].append(caso)
+    finally:
+        servidor.parar()
+
+    saida = args.saida or os.path.join(DIRETORIO_RESULTADOS, f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+    print(f"\n[OK] Resultado gravado em {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            regressoes = comparar(resultado, json.load(arquivo), args.tolerancia)
+        if regressoes:
+            print(f"\n[X] {len(regressoes)} regressoes acima de {args.tolerancia:.0%}")
+            sys.exit(1)
+        print("\n[OK] Nenhuma regressao")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark da migracao contra um PostgREST local")
+    parser.add_argument("--linhas", type=int, nargs="+", default=list(TAMANHOS_PADRAO),
+                        help="Tamanhos das planilhas sinteticas (padrao: 1000 10000 100000)")
+    parser.add_argument("--motor", default="auto", choices=("auto", "openpyxl", "calamine"),
+                        help="Leitor do Excel (padrao: auto)")
+    parser.add_argument("--concorrencia", type=int, default=1,
+                        help="Workers de escrita, como em migrate_data.py (padrao: 1)")
+    parser.add_argument("--tamanho-lote", type=int, default=500,
+                        help="Linhas por requisicao de insert (padrao: 500)")
+    parser.add_argument("--max-req-por-segundo", type=float, default=0,
+                        help="Teto de requisicoes/s com --concorrencia > 1; 0 desativa (padrao: 0)")
+    parser.add_argument("--latencia-ms", type=float, default=0,
+                        help="Atraso de cada resposta do servidor local (padrao: 0)")
+    parser.add_argument("--semente", type=int, default=42,
+                        help="Semente do gerador de planilhas (padrao: 42)")
+    parser.add_argument("--saida", default=None,
+                        help="Arquivo JSON do resultado (padrao: scripts/benchmarks/benchmark-<data>.json)")
+    parser.add_argument("--comparar", default=None,
+                        help="JSON de uma execucao anterior; sai com codigo 1 se houver regressao")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_REGRESSAO,
+                        help=f"Piora relativa aceita no --comparar (padrao: {TOLERANCIA_REGRESSAO})")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Mostra a saida da migracao de cada caso")
+    # Uso interno: execução de um caso no processo filho
+    parser.add_argument("--caso", help=argparse.SUPPRESS)
+    parser.add_argument("--saida-caso", help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.caso:
+        resultado = medir_caso(args.caso, args.url, args.motor, args.concorrencia,
+                               args.tamanho_lote, args.max_req_por_segundo)
+        with open(args.saida_caso, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo)
+    else:
+        main(args)
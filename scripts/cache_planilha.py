@@ -0,0 +1,215 @@
+"""
+Cache Local da Planilha
+Descrição: Guarda em disco as abas lidas e os registros de operações já convertidos,
+           indexados pelo hash do arquivo e pela versão da transformação, para que
+           execuções repetidas sobre a mesma planilha pulem leitura e conversão
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+
+from transformacao import VERSAO_TRANSFORMACAO
+
+try:
+    import pyarrow  # noqa: F401 - motor do pandas para to_parquet/read_parquet
+    CACHE_DISPONIVEL = True
+except ImportError:
+    CACHE_DISPONIVEL = False
+
+DIRETORIO_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'planilhas')
+
+# Limites de despejo: entradas mais antigas que MAX_DIAS saem primeiro; depois,
+# as menos usadas até o total caber em MAX_MB
+MAX_DIAS = 30
+MAX_MB = 200
+
+def hash_arquivo(caminho: str) -> str:
+    """SHA-256 do conteúdo do arquivo, lido em blocos."""
+    digest = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+            digest.update(bloco)
+    return digest.hexdigest()
+
+def hash_referencias(refs) -> str:
+    """Impressão digital das referências (categorias, veículos, usuários, analistas)."""
+    conteudo = json.dumps(
+        [[sorted(map(str, mapa.items())), getattr(mapa, 'similaridade_minima', None)] for mapa in refs],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()[:16]
+
+def _tamanho(caminho: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(raiz, nome))
+        for raiz, _, nomes in os.walk(caminho) for nome in nomes
+    )
+
+def limpar_cache(diretorio: str = DIRETORIO_CACHE, max_dias: float = MAX_DIAS, max_mb: float = MAX_MB):
+    """Despeja entradas por idade e, depois, por tamanho total (LRU pelo mtime)."""
+    if not os.path.isdir(diretorio):
+        return
+
+    agora = time.time()
+    entradas = []
+    for nome in os.listdir(diretorio):
+        caminho = os.path.join(diretorio, nome)
+        if not os.path.isdir(caminho):
+            continue
+        usado_em = os.path.getmtime(caminho)
+        if agora - usado_em > max_dias * 86400:
+            shutil.rmtree(caminho, ignore_errors=True)
+            continue
+        entradas.append((usado_em, _tamanho(caminho), caminho))
+
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, caminho in sorted(entradas):
+        if total <= max_mb * 1024 * 1024:
+            break
+        shutil.rmtree(caminho, ignore_errors=True)
+        total -= tamanho
+
+class CachePlanilha:
+    """Cache de uma planilha específica.
+
+    Estrutura: <diretorio>/<hash do arquivo>-v<versão>/
+        manifesto.json                    abas presentes e status padrão
+        <aba>.aba.parquet                 DataFrame lido (ou .aba.pkl, ver gravar_abas)
+        <aba>.registros.<refs>.parquet    operações convertidas para aquelas referências
+        relatorios.<refs>.json            nomes sem correspondência e valores não convertidos
+    """
+
+    def __init__(self, caminho_planilha: str, diretorio: str = DIRETORIO_CACHE):
+        self.diretorio_raiz = diretorio
+        chave = f"{hash_arquivo(caminho_planilha)[:32]}-v{VERSAO_TRANSFORMACAO}"
+        self.diretorio = os.path.join(diretorio, chave)
+
+    def _manifesto(self):
+        try:
+            with open(os.path.join(self.diretorio, 'manifesto.json'), encoding='utf-8') as arquivo:
+                return json.load(arquivo)
+        except (OSError, ValueError):
+            return None
+
+    def _tocar(self):
+        """Marca a entrada como usada agora (ordem do despejo LRU)."""
+        os.utime(self.diretorio)
+
+    def ler_abas(self):
+        """Retorna {chave: {'df', 'status_padrao'}} como carregar_planilha, ou None."""
+        manifesto = self._manifesto()
+        if manifesto is None:
+            return None
+
+        dados = {}
+        for chave, status_padrao in manifesto['abas'].items():
+            base = os.path.join(self.diretorio, f"{chave}.aba")
+            if os.path.exists(base + '.parquet'):
+                df = pd.read_parquet(base + '.parquet')
+            elif os.path.exists(base + '.pkl'):
+                df = pd.read_pickle(base + '.pkl')
+            else:
+                return None
+            dados[chave] = {'df': df, 'status_padrao': status_padrao}
+
+        self._tocar()
+        return dados
+
+    def gravar_abas(self, dados: dict):
+        """Grava as abas lidas.
+
+        Parquet preserva os tipos das colunas homogêneas; colunas object com
+        tipos misturados (ex.: Volume com números e 'Pendente') não têm tipo
+        Arrow equivalente, e nesse caso a aba vai em pickle para que a
+        conversão gere exatamente o mesmo resultado.
+        """
+        os.makedirs(self.diretorio, exist_ok=True)
+        for chave, config in dados.items():
+            base = os.path.join(self.diretorio, f"{chave}.aba")
+            try:
+                config['df'].to_parquet(base + '.parquet', index=True)
+            except Exception:
+                if os.path.exists(base + '.parquet'):
+                    os.remove(base + '.parquet')
+                config['df'].to_pickle(base + '.pkl')
+
+        manifesto = {
+            'abas': {chave: config['status_padrao'] for chave, config in dados.items()},
+            'versao_transformacao': VERSAO_TRANSFORMACAO,
+            'criado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        with open(os.path.join(self.diretorio, 'manifesto.json'), 'w', encoding='utf-8') as arquivo:
+            json.dump(manifesto, arquivo, ensure_ascii=False, indent=2)
+
+    def ler_registros(self, refs):
+        """Retorna {chave: {'status_padrao', 'operacoes': [(linha, operação ou erro)]}}, ou None."""
+        manifesto = self._manifesto()
+        if manifesto is None:
+            return None
+
+        sufixo = hash_referencias(refs)
+        resultado = {}
+        for chave, status_padrao in manifesto['abas'].items():
+            caminho = os.path.join(self.diretorio, f"{chave}.registros.{sufixo}.parquet")
+            if not os.path.exists(caminho):
+                return None
+            resultado[chave] = {'status_padrao': status_padrao, 'operacoes': _ler_operacoes(caminho)}
+
+        self._tocar()
+        return resultado
+
+    def gravar_registros(self, refs, resultado: dict):
+        """Grava as operações convertidas de cada aba (formato de ler_registros)."""
+        os.makedirs(self.diretorio, exist_ok=True)
+        sufixo = hash_referencias(refs)
+        for chave, config in resultado.items():
+            caminho = os.path.join(self.diretorio, f"{chave}.registros.{sufixo}.parquet")
+            _gravar_operacoes(caminho, config['operacoes'])
+
+    def ler_relatorios(self, refs):
+        """Retorna {'referencias': [relatorio() de cada resolvedor], 'falhas_conversao': resumo()}, ou None."""
+        try:
+            with open(os.path.join(self.diretorio, f"relatorios.{hash_referencias(refs)}.json"),
+                      encoding='utf-8') as arquivo:
+                return json.load(arquivo)
+        except (OSError, ValueError):
+            return None
+
+    def gravar_relatorios(self, refs, relatorios: dict):
+        """Grava os relatórios da conversão de todas as abas (formato de ler_relatorios).
+
+        Sem eles um acerto em ler_registros mostraria os relatórios vazios.
+        """
+        os.makedirs(self.diretorio, exist_ok=True)
+        with open(os.path.join(self.diretorio, f"relatorios.{hash_referencias(refs)}.json"), 'w',
+                  encoding='utf-8') as arquivo:
+            json.dump(relatorios, arquivo, ensure_ascii=False)
+
+def _gravar_operacoes(caminho: str, operacoes: list):
+    """Uma linha por linha da planilha; erros de conversão vão na coluna _erro."""
+    linhas = []
+    for linha, operacao in operacoes:
+        if isinstance(operacao, Exception):
+            linhas.append({'_linha': linha, '_erro': str(operacao)})
+        else:
+            linhas.append({'_linha': linha, '_erro': None, **operacao})
+    pd.DataFrame(linhas).to_parquet(caminho, index=False)
+
+def _ler_operacoes(caminho: str) -> list:
+    df = pd.read_parquet(caminho)
+    df = df.astype(object).where(df.notna(), None)
+    campos = [coluna for coluna in df.columns if coluna not in ('_linha', '_erro')]
+
+    operacoes = []
+    for registro in df.to_dict('records'):
+        linha = int(registro['_linha'])
+        if registro['_erro'] is not None:
+            operacoes.append((linha, ValueError(registro['_erro'])))
+        else:
+            operacoes.append((linha, {campo: registro[campo] for campo in campos}))
+    return operacoes
@@ -1,13 +1,17 @@
 """
 Script de Verificação da Planilha Excel
 Verifica as abas e colunas antes de executar a migração
+Com --perfil, gera o perfil de tipos/formatos por coluna (ver perfil_planilha.py)
 """
 
-import pandas as pd
-import sys
+import argparse
 import os
 
-def verificar_planilha(caminho: str):
+from instrumentacao import caminho_relatorio_padrao
+from leitor_planilha import MOTORES, abrir_planilha, ler_aba
+from perfil_planilha import TAMANHO_BLOCO, gravar_perfil, imprimir_perfil, perfilar_planilha
+
+def verificar_planilha(caminho: str, motor: str = 'auto'):
     """Verifica estrutura da planilha."""
     print("=" * 60)
     print("🔍 VERIFICAÇÃO DA PLANILHA EXCEL")
@@ -21,8 +25,8 @@ def verificar_planilha(caminho: str):
     print(f"📏 Tamanho: {os.path.getsize(caminho) / 1024:.2f} KB\n")
 
     try:
-        # Listar todas as abas
-        excel_file = pd.ExcelFile(caminho)
+        # Listar todas as abas (workbook aberto uma única vez)
+        excel_file = abrir_planilha(caminho, motor)
         print(f"📑 Abas encontradas ({len(excel_file.sheet_names)}):")
         for aba in excel_file.sheet_names:
             print(f"   • {aba}")
@@ -31,7 +35,7 @@ def verificar_planilha(caminho: str):
 
         # Analisar cada aba
         for nome_aba in excel_file.sheet_names:
-            df = pd.read_excel(caminho, sheet_name=nome_aba)
+            df = ler_aba(excel_file, nome_aba)
 
             print(f"\n📊 ABA: {nome_aba}")
             print(f"   Linhas: {len(df)}")
@@ -57,10 +61,57 @@ def verificar_planilha(caminho: str):
         print(f"❌ Erro ao verificar planilha: {e}")
         return False
 
-if __name__ == "__main__":
-    caminho = "Pipe - Overview (3).xlsx"
+def perfilar(caminho: str, arquivo_perfil: str, amostra: int = None, tamanho_bloco: int = TAMANHO_BLOCO,
+             somente_migracao=False):
+    """Perfil de tipos, formatos e valores distintos por coluna, lido em blocos e gravado em JSON."""
+    print("=" * 60)
+    print("🔍 PERFIL DA PLANILHA EXCEL")
+    print("=" * 60)
 
-    if len(sys.argv) > 1:
-        caminho = sys.argv[1]
+    if not os.path.exists(caminho):
+        print(f"❌ Arquivo não encontrado: {caminho}")
+        return False
 
-    verificar_planilha(caminho)
+    print(f"📂 Arquivo: {caminho}")
+    print(f"📏 Tamanho: {os.path.getsize(caminho) / 1024:.2f} KB")
+    if amostra is not None:
+        print(f"🎯 Amostra: primeiras {amostra} linhas de cada aba")
+
+    try:
+        perfil = perfilar_planilha(caminho, amostra, tamanho_bloco, somente_migracao)
+    except Exception as e:
+        print(f"❌ Erro ao perfilar planilha: {e}")
+        return False
+
+    imprimir_perfil(perfil)
+    gravar_perfil(perfil, arquivo_perfil)
+    falhas = sum(coluna['falhas_conversao'] for aba in perfil['abas'].values() for coluna in aba['colunas'].values())
+    print("\n" + "-" * 60)
+    if falhas:
+        print(f"⚠️  {falhas} valores não serão convertidos pela migração (vão para o relatório de conversão)")
+    print(f"💾 Perfil salvo em: {arquivo_perfil}")
+    print(f"   Reaproveite na migração: python migrate_data.py \"{caminho}\" --perfil \"{arquivo_perfil}\"")
+    print("\n✅ Perfil concluído!")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verifica as abas e colunas da planilha")
+    parser.add_argument("caminho", nargs="?", default="Pipe - Overview (3).xlsx",
+                        help="Caminho da planilha")
+    parser.add_argument("--motor", choices=MOTORES, default="auto",
+                        help="Leitor do Excel: calamine e mais rapido (padrao: auto)")
+    parser.add_argument("--perfil", nargs="?", const="", default=None, metavar="ARQUIVO",
+                        help="Gera o perfil de tipos/formatos por coluna em JSON (padrao: scripts/relatorios/perfil-*.json)")
+    parser.add_argument("--amostra", type=int, default=None, metavar="N",
+                        help="Com --perfil, analisa so as primeiras N linhas de cada aba")
+    parser.add_argument("--tamanho-bloco", type=int, default=TAMANHO_BLOCO,
+                        help=f"Com --perfil, linhas lidas por vez (padrao: {TAMANHO_BLOCO})")
+    parser.add_argument("--somente-migracao", action="store_true",
+                        help="Com --perfil, so as abas que a migracao le")
+    args = parser.parse_args()
+
+    if args.perfil is not None:
+        perfilar(args.caminho, args.perfil or caminho_relatorio_padrao('perfil'), args.amostra,
+                 args.tamanho_bloco, args.somente_migracao)
+    else:
+        verificar_planilha(args.caminho, args.motor)
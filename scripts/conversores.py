@@ -0,0 +1,328 @@
+"""
+Conversores - Números, Valores em Reais e Datas da Planilha
+Descrição: Interpreta textos no formato brasileiro ("1.234,56", "R$ 2,5 mi", "05/03/2024")
+           sem a inferência do pandas: o formato é detectado uma vez por coluna, cada
+           texto distinto é convertido uma vez e os valores que falharam são registrados
+"""
+
+import math
+import numbers
+import re
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+import pandas as pd
+
+# Separadores de milhar e decimal
+FORMATO_BR = 'br'  # 1.234,56
+FORMATO_US = 'us'  # 1,234.56
+
+# Textos que significam "sem valor" (comparados sem caixa): viram None sem contar como falha
+TEXTOS_SEM_VALOR = {'pendente', 'a confirmar', 'confirmar', 'a definir', '-', '', 'n.a', 'n.a.', 'n/a'}
+
+# Sufixos de escala usados em volumes ("R$ 2,5 mi", "300 mil")
+MULTIPLICADORES = {
+    'mil': 1e3, 'k': 1e3,
+    'mi': 1e6, 'mm': 1e6, 'milhao': 1e6, 'milhão': 1e6, 'milhoes': 1e6, 'milhões': 1e6,
+    'bi': 1e9, 'bilhao': 1e9, 'bilhão': 1e9, 'bilhoes': 1e9, 'bilhões': 1e9,
+}
+
+# Sinal, moeda opcional, dígitos com separadores e sufixo de escala
+_NUMERO = re.compile(r'^([+-]?)\s*(?:R\$|US\$|\$)?\s*([+-]?)\s*(\d[\d.,]*)\s*([^\d\s.,]*)$', re.IGNORECASE)
+
+# Dígitos válidos em cada formato: milhar em grupos de 3 ou sem separador de milhar
+_DIGITOS = {
+    FORMATO_BR: re.compile(r'^(?:\d{1,3}(?:\.\d{3})+|\d+)(?:,\d+)?$'),
+    FORMATO_US: re.compile(r'^(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?$'),
+}
+
+# Formatos de data tentados, em ordem de preferência: dia antes do mês.
+# ISO com horário e fuso fica para datetime.fromisoformat.
+FORMATOS_DATA = (
+    '%d/%m/%Y', '%d/%m/%y', '%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S',
+    '%d-%m-%Y', '%d.%m.%Y', '%Y-%m-%d', '%Y/%m/%d',
+    '%m/%d/%Y', '%m/%d/%y',
+)
+
+# Anos aceitos: fora disso é quase sempre um texto que por acaso casou com o formato
+# (ex.: '05/03/24' lido com %Y vira o ano 24)
+ANO_MINIMO = 1900
+ANO_MAXIMO = 2100
+
+# Números em coluna de data são datas seriais do Excel (dias desde 30/12/1899),
+# aceitas entre 01/01/1950 e 01/01/2100
+ORIGEM_EXCEL = datetime(1899, 12, 30)
+SERIAL_EXCEL_MINIMO = 18264
+SERIAL_EXCEL_MAXIMO = 73051
+
+# Textos distintos usados para detectar o formato de uma coluna
+AMOSTRA_DETECCAO = 200
+
+# Textos distintos memorizados por conversor (valem para todas as colunas)
+TAMANHO_MEMO = 65536
+
+# Valores não convertidos exibidos no terminal (o relatório da execução tem todos)
+MAX_FALHAS_EXIBIDAS = 15
+
+class FalhasConversao:
+    """Valores da planilha que não puderam ser convertidos, por coluna.
+
+    Guarda a contagem de cada (coluna, valor) e as primeiras linhas em que
+    ele aparece, para corrigir a planilha direto na célula.
+    """
+
+    MAX_LINHAS_POR_VALOR = 5
+
+    def __init__(self):
+        self.valores = {}
+
+    def limpar(self):
+        self.valores.clear()
+
+    def registrar(self, coluna, valor, linha=None):
+        chave = (coluna, str(valor))
+        falha = self.valores.setdefault(chave, {'ocorrencias': 0, 'linhas': []})
+        falha['ocorrencias'] += 1
+        if linha is not None and len(falha['linhas']) < self.MAX_LINHAS_POR_VALOR:
+            falha['linhas'].append(linha)
+
+    @property
+    def total(self) -> int:
+        return sum(falha['ocorrencias'] for falha in self.valores.values())
+
+    def incorporar(self, resumo: list, prefixo: str = ''):
+        """Soma o resumo() de outra coleta, com `prefixo` no nome das colunas (ex.: o arquivo)."""
+        for item in resumo:
+            falha = self.valores.setdefault((f"{prefixo}{item['coluna']}", item['valor']),
+                                            {'ocorrencias': 0, 'linhas': []})
+            falha['ocorrencias'] += item['ocorrencias']
+            falha['linhas'] = (falha['linhas'] + item['linhas'])[:self.MAX_LINHAS_POR_VALOR]
+
+    def resumo(self) -> list:
+        """[{'coluna', 'valor', 'ocorrencias', 'linhas'}], dos mais frequentes para os menos."""
+        itens = [
+            {'coluna': coluna, 'valor': valor, **falha}
+            for (coluna, valor), falha in self.valores.items()
+        ]
+        return sorted(itens, key=lambda item: -item['ocorrencias'])
+
+    def imprimir(self, limite: int = MAX_FALHAS_EXIBIDAS):
+        if not self.valores:
+            print("   [OK] Todos os numeros e datas convertidos")
+            return
+        print(f"   [!] {self.total} valores nao convertidos ({len(self.valores)} distintos):")
+        resumo = self.resumo()
+        for item in resumo[:limite]:
+            linhas = ', '.join(str(linha) for linha in item['linhas'])
+            print(f"       {item['coluna']}: {item['valor']!r} ({item['ocorrencias']} linhas; ex.: {linhas})")
+        if len(resumo) > limite:
+            print(f"       ... e mais {len(resumo) - limite} valores")
+
+# =====================================================
+# Números
+# =====================================================
+
+def _sem_valor(texto: str) -> bool:
+    return texto.casefold() in TEXTOS_SEM_VALOR
+
+def _voto_formato(digitos: str):
+    """FORMATO_BR/FORMATO_US quando os separadores não deixam dúvida; None se ambíguo.
+
+    "1.234" e "1,234" são ambíguos (milhar ou decimal?); "1.234,5", "1,5",
+    "1.234.567" e "10.5" não são.
+    """
+    virgulas, pontos = digitos.count(','), digitos.count('.')
+    if virgulas and pontos:
+        return FORMATO_BR if digitos.rfind(',') > digitos.rfind('.') else FORMATO_US
+    if not virgulas and not pontos:
+        return None
+    separador = ',' if virgulas else '.'
+    if max(virgulas, pontos) > 1:
+        # Separador repetido só pode ser de milhar
+        return FORMATO_US if separador == ',' else FORMATO_BR
+    if len(digitos) - digitos.rfind(separador) - 1 == 3:
+        return None
+    # Separador único sem 3 casas depois só pode ser decimal
+    return FORMATO_BR if separador == ',' else FORMATO_US
+
+def detectar_formato_numero(textos, padrao: str = FORMATO_BR) -> str:
+    """Formato da maioria dos textos não ambíguos da coluna; `padrao` se nenhum decidir."""
+    votos = {FORMATO_BR: 0, FORMATO_US: 0}
+    for texto in _amostra(textos):
+        encontrado = _NUMERO.match(texto)
+        voto = _voto_formato(encontrado.group(3)) if encontrado else None
+        if voto:
+            votos[voto] += 1
+    if votos[FORMATO_BR] == votos[FORMATO_US]:
+        return padrao
+    return max(votos, key=votos.get)
+
+@lru_cache(maxsize=TAMANHO_MEMO)
+def interpretar_numero(texto: str, formato: str = None):
+    """Número de um texto como "1.234,56", "R$ 10", "-2,5 mi" ou "1,234.56".
+
+    Com `formato`, ele é tentado primeiro; um texto que só faz sentido no
+    outro formato (ex.: "10.5" numa coluna brasileira) ainda é aceito.
+    Sem `formato`, decide pelo próprio texto, e o ambíguo fica brasileiro.
+    Retorna None para os textos sem valor e levanta ValueError se não
+    conseguir interpretar.
+    """
+    texto = texto.strip()
+    if _sem_valor(texto):
+        return None
+    encontrado = _NUMERO.match(texto)
+    if not encontrado:
+        raise ValueError(f"numero invalido: {texto!r}")
+    sinal, sinal_moeda, digitos, sufixo = encontrado.groups()
+    if sinal and sinal_moeda:
+        raise ValueError(f"numero invalido: {texto!r}")
+
+    escala = 1.0
+    if sufixo:
+        escala = MULTIPLICADORES.get(sufixo.casefold())
+        if escala is None:
+            raise ValueError(f"sufixo desconhecido em {texto!r}")
+
+    voto = _voto_formato(digitos)
+    formatos = [formato or voto or FORMATO_BR]
+    if voto and voto != formatos[0]:
+        formatos.append(voto)
+    for tentativa in formatos:
+        if _DIGITOS[tentativa].match(digitos):
+            milhar, decimal = ('.', ',') if tentativa == FORMATO_BR else (',', '.')
+            numero = float(digitos.replace(milhar, '').replace(decimal, '.')) * escala
+            return -numero if '-' in (sinal, sinal_moeda) else numero
+    raise ValueError(f"separadores invalidos em {texto!r}")
+
+def valor_numerico(valor, formato: str = None):
+    """Float de uma célula (número ou texto); None se vazia ou sem valor."""
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    if isinstance(valor, numbers.Real):
+        return float(valor)
+    if isinstance(valor, str):
+        return interpretar_numero(valor, formato)
+    raise ValueError(f"tipo sem conversao numerica: {type(valor).__name__}")
+
+# =====================================================
+# Datas
+# =====================================================
+
+def _ano_valido(data: datetime) -> bool:
+    return ANO_MINIMO <= data.year <= ANO_MAXIMO
+
+def _tentar_formato(texto: str, formato: str):
+    try:
+        data = datetime.strptime(texto, formato)
+    except ValueError:
+        return None
+    return data if _ano_valido(data) else None
+
+def detectar_formato_data(textos):
+    """Formato de FORMATOS_DATA que interpreta mais textos da coluna (empate: o primeiro); None se nenhum."""
+    amostra = _amostra(textos)
+    melhor, acertos_melhor = None, 0
+    for formato in FORMATOS_DATA:
+        acertos = sum(1 for texto in amostra if _tentar_formato(texto, formato))
+        if acertos > acertos_melhor:
+            melhor, acertos_melhor = formato, acertos
+    return melhor
+
+@lru_cache(maxsize=TAMANHO_MEMO)
+def interpretar_data(texto: str, formato: str = None) -> datetime:
+    """datetime de um texto como "05/03/2024", "05/03/24" ou "2024-03-05T10:00:00".
+
+    Tenta `formato` (o detectado para a coluna) e depois FORMATOS_DATA na
+    ordem, com dia antes do mês. Retorna None para os textos sem valor e
+    levanta ValueError se não conseguir interpretar.
+    """
+    texto = texto.strip()
+    if _sem_valor(texto):
+        return None
+    for tentativa in ((formato,) if formato else ()) + FORMATOS_DATA:
+        data = _tentar_formato(texto, tentativa)
+        if data:
+            return data
+    try:
+        data = datetime.fromisoformat(texto)
+    except ValueError:
+        raise ValueError(f"data invalida: {texto!r}") from None
+    if not _ano_valido(data):
+        raise ValueError(f"ano fora de {ANO_MINIMO}-{ANO_MAXIMO}: {texto!r}")
+    return data
+
+def data_serial_excel(numero: float) -> datetime:
+    if not SERIAL_EXCEL_MINIMO <= numero <= SERIAL_EXCEL_MAXIMO:
+        raise ValueError(f"numero nao e data serial do Excel: {numero}")
+    return ORIGEM_EXCEL + timedelta(days=numero)
+
+def valor_data(valor, formato: str = None):
+    """Data ISO de uma célula (datetime, data serial ou texto); None se vazia ou sem valor."""
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, date):
+        return datetime.combine(valor, datetime.min.time()).isoformat()
+    if isinstance(valor, numbers.Real) and not isinstance(valor, bool) and math.isfinite(valor):
+        return data_serial_excel(valor).isoformat()
+    if isinstance(valor, str):
+        data = interpretar_data(valor, formato)
+        return data.isoformat() if data else None
+    raise ValueError(f"tipo sem conversao para data: {type(valor).__name__}")
+
+# =====================================================
+# Colunas inteiras
+# =====================================================
+
+def _amostra(textos) -> list:
+    """Até AMOSTRA_DETECCAO textos distintos, sem espaços nas pontas e sem os textos sem valor."""
+    distintos = []
+    vistos = set()
+    for texto in textos:
+        texto = texto.strip()
+        if texto in vistos or _sem_valor(texto):
+            continue
+        vistos.add(texto)
+        distintos.append(texto)
+        if len(distintos) >= AMOSTRA_DETECCAO:
+            break
+    return distintos
+
+def _converter_coluna(valores: list, converter, coluna, linhas, falhas: FalhasConversao) -> list:
+    """Aplica `converter` uma vez por valor distinto; as falhas viram None e vão para `falhas`."""
+    memo = {}
+    resultado = []
+    for pos, valor in enumerate(valores):
+        chave = (type(valor), valor)
+        try:
+            convertido, erro = memo[chave]
+        except KeyError:
+            try:
+                convertido, erro = converter(valor), None
+            except ValueError as e:
+                convertido, erro = None, e
+            memo[chave] = (convertido, erro)
+        except TypeError:
+            try:
+                convertido, erro = converter(valor), None
+            except ValueError as e:
+                convertido, erro = None, e
+        if erro is not None and falhas is not None:
+            falhas.registrar(coluna, valor, linhas[pos] if linhas else None)
+        resultado.append(convertido)
+    return resultado
+
+def converter_numeros(valores: list, coluna=None, linhas: list = None, falhas: FalhasConversao = None,
+                      formato: str = None) -> list:
+    """valor_numerico para uma coluna, com o formato de milhar/decimal detectado uma vez (ou o `formato` dado)."""
+    if formato is None:
+        formato = detectar_formato_numero(valor for valor in valores if isinstance(valor, str))
+    return _converter_coluna(valores, lambda valor: valor_numerico(valor, formato), coluna, linhas, falhas)
+
+def converter_datas(valores: list, coluna=None, linhas: list = None, falhas: FalhasConversao = None,
+                    formato: str = None) -> list:
+    """valor_data para uma coluna, com o formato dos textos detectado uma vez (ou o `formato` dado)."""
+    if formato is None:
+        formato = detectar_formato_data(valor for valor in valores if isinstance(valor, str))
+    return _converter_coluna(valores, lambda valor: valor_data(valor, formato), coluna, linhas, falhas)
@@ -0,0 +1,161 @@
+"""
+Diário de Execução da Migração
+Descrição: Registra em disco, a cada lote confirmado pelo banco, a aba, as linhas e os
+           números de emissão gravados, para que uma carga interrompida seja retomada
+           (--retomar) de onde parou, sem limpar a tabela de novo nem duplicar linhas
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import Counter
+from datetime import datetime
+
+from cache_planilha import hash_arquivo
+from transformacao import VERSAO_TRANSFORMACAO
+
+DIRETORIO_DIARIOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'diarios')
+
+def _faixas(linhas: list) -> list:
+    """[2, 3, 4, 7, 8] -> [[2, 4], [7, 8]]"""
+    faixas = []
+    for linha in sorted(linhas):
+        if faixas and linha == faixas[-1][1] + 1:
+            faixas[-1][1] = linha
+        else:
+            faixas.append([linha, linha])
+    return faixas
+
+class DiarioMigracao:
+    """Diário (JSONL) das cargas de uma planilha.
+
+    Um arquivo por caminho de planilha, com um evento por linha:
+      inicio  - hash do arquivo e versão da transformação da execução
+      limpeza - limpar_dados_antigos terminou; a retomada não limpa de novo
+      lote    - aba, faixas de linhas e numero_emissao de um envio confirmado
+
+    Cada evento é gravado com fsync logo depois da resposta do banco. Uma
+    linha final truncada (queda no meio da escrita) é ignorada na leitura.
+    O diário é removido quando a carga termina sem erros de gravação.
+    """
+
+    def __init__(self, caminho_planilha: str, diretorio: str = DIRETORIO_DIARIOS):
+        self.caminho_planilha = os.path.abspath(caminho_planilha)
+        nome = hashlib.sha256(self.caminho_planilha.encode('utf-8')).hexdigest()[:16]
+        self.caminho = os.path.join(diretorio, f"{nome}.jsonl")
+        self.hash = hash_arquivo(caminho_planilha)
+        self.lock = threading.Lock()
+
+    def _registrar(self, evento: dict):
+        linha = json.dumps(evento, ensure_ascii=False) + '\n'
+        with self.lock:
+            with open(self.caminho, 'a', encoding='utf-8') as arquivo:
+                arquivo.write(linha)
+                arquivo.flush()
+                os.fsync(arquivo.fileno())
+
+    def _ler_eventos(self) -> list:
+        if not os.path.exists(self.caminho):
+            return []
+        eventos = []
+        with open(self.caminho, encoding='utf-8') as arquivo:
+            for linha in arquivo:
+                try:
+                    eventos.append(json.loads(linha))
+                except json.JSONDecodeError:
+                    break
+        return eventos
+
+    def iniciar(self):
+        """Começa um diário novo, descartando o de uma execução anterior."""
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        if os.path.exists(self.caminho):
+            os.remove(self.caminho)
+        self._registrar({
+            'evento': 'inicio',
+            'planilha': self.caminho_planilha,
+            'hash': self.hash,
+            'versao_transformacao': VERSAO_TRANSFORMACAO,
+            'iniciada_em': datetime.now().isoformat(timespec='seconds'),
+        })
+
+    def registrar_limpeza(self):
+        self._registrar({'evento': 'limpeza'})
+
+    def registrando(self, aba: str, itens: list, enviar):
+        """Envolve `enviar` para registrar cada envio confirmado dos itens (linha, registro) da aba.
+
+        Vale também para os pedaços da bissecção: só o que o banco aceitou
+        entra no diário.
+        """
+        linhas = {id(registro): linha for linha, registro in itens}
+
+        def enviar_registrando(registros: list):
+            enviar(registros)
+            self._registrar({
+                'evento': 'lote',
+                'aba': aba,
+                'linhas': _faixas([linhas[id(registro)] for registro in registros]),
+                'numeros': [registro.get('numero_emissao') for registro in registros],
+            })
+
+        return enviar_registrando
+
+    def retomar(self):
+        """Estado da execução interrompida, ou None (com o motivo impresso) se não der para retomar.
+
+        Retorna {'iniciada_em', 'limpeza', 'lotes', 'gravados'}, onde
+        gravados é um Counter de (aba, numero_emissao).
+        """
+        eventos = self._ler_eventos()
+        if not eventos or eventos[0].get('evento') != 'inicio':
+            print(f"[X] Nenhuma execucao interrompida para retomar ({self.caminho_planilha})")
+            return None
+
+        inicio = eventos[0]
+        if inicio['hash'] != self.hash:
+            print("[X] A planilha mudou desde a execucao interrompida: as linhas nao batem mais")
+            print("   Rode de novo sem --retomar, ou use --sincronizar para gravar so as diferencas")
+            return None
+        if inicio['versao_transformacao'] != VERSAO_TRANSFORMACAO:
+            print("[X] A transformacao mudou desde a execucao interrompida; rode de novo sem --retomar")
+            return None
+
+        estado = {'iniciada_em': inicio['iniciada_em'], 'limpeza': False, 'lotes': 0, 'gravados': Counter()}
+        for evento in eventos[1:]:
+            if evento['evento'] == 'limpeza':
+                estado['limpeza'] = True
+            elif evento['evento'] == 'lote':
+                estado['lotes'] += 1
+                estado['gravados'].update((evento['aba'], numero) for numero in evento['numeros'])
+        return estado
+
+    def concluir(self, erros: int):
+        """Remove o diário se não houve erro de gravação; senão, mantém para uma nova tentativa."""
+        if erros:
+            print(f"[!] Diario mantido em {self.caminho}: use --retomar para tentar de novo as linhas com erro")
+        elif os.path.exists(self.caminho):
+            os.remove(self.caminho)
+
+def filtrar_pendentes(aba: str, itens: list, gravados: Counter, no_banco: Counter):
+    """Tira de `itens` (linha, registro) o que a execução interrompida já gravou.
+
+    A chave natural é (aba, numero_emissao). Primeiro consome o que está no
+    diário; depois, `no_banco` (ocorrências no banco além das registradas no
+    diário) cobre o lote que o banco gravou mas cuja confirmação se perdeu na
+    queda. Os dois contadores são consumidos. Retorna (restantes, pulados).
+    """
+    restantes = []
+    pulados = 0
+    for linha, registro in itens:
+        numero = registro.get('numero_emissao')
+        if gravados[(aba, numero)] > 0:
+            gravados[(aba, numero)] -= 1
+        elif no_banco[numero] > 0:
+            no_banco[numero] -= 1
+        else:
+            restantes.append((linha, registro))
+            continue
+        pulados += 1
+    return restantes, pulados
@@ -0,0 +1,214 @@
+"""
+Escrita Concorrente no PostgREST
+Descrição: Cliente HTTP com pool de conexões compartilhado, limitador de taxa e um
+           conjunto limitado de workers que gravam lotes enquanto a planilha
+           continua sendo lida e convertida
+"""
+
+import queue
+import random
+import threading
+import time
+from contextlib import nullcontext
+
+import httpx
+from postgrest import APIError
+
+# Status HTTP que indicam sobrecarga/instabilidade e valem nova tentativa
+STATUS_TRANSITORIOS = {408, 425, 429, 500, 502, 503, 504}
+
+# Códigos que o PostgREST devolve no corpo JSON dos 503/504 (sem conexão com o
+# banco, pool esgotado) e erros do Postgres que passam ao repetir a transação
+CODIGOS_TRANSITORIOS = {'PGRST000', 'PGRST001', 'PGRST002', 'PGRST003', '40001', '40P01', '53300'}
+
+# Backoff exponencial com jitter total: espera aleatória em [0, BASE * 2^(tentativa-1)]
+BACKOFF_BASE_SEGUNDOS = 0.5
+BACKOFF_MAX_SEGUNDOS = 30
+
+class ErroTransitorio(Exception):
+    """Resposta 429/5xx (ou falha de rede): o mesmo lote pode ser reenviado."""
+
+    def __init__(self, mensagem: str, status: int = None, retry_after: float = None):
+        super().__init__(mensagem)
+        self.status = status
+        self.retry_after = retry_after
+
+def status_http(erro: Exception):
+    """Status HTTP de um erro de escrita, quando se sabe.
+
+    O cliente supabase-py só põe o status em APIError.code quando o corpo da
+    resposta não é JSON (ex.: 502/503 do proxy); ClientePostgrest guarda o
+    status em `.status` também nos erros de dados.
+    """
+    status = getattr(erro, 'status', None)
+    if status is None and isinstance(erro, APIError):
+        status = erro.code
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return None
+    # Códigos do Postgres (ex.: '23505') também são numéricos
+    return status if 100 <= status < 600 else None
+
+def erro_transitorio(erro: Exception) -> bool:
+    """True se vale reenviar o mesmo lote (408/425/429/5xx, rede).
+
+    Qualquer outra exceção, inclusive falhas locais como um float NaN que
+    não vira JSON, é tratada como erro de dados: o lote é bisseccionado
+    até a linha culpada.
+    """
+    if isinstance(erro, (ErroTransitorio, httpx.TransportError, ConnectionError)):
+        return True
+    if not isinstance(erro, APIError):
+        return False
+    status = status_http(erro)
+    if status is not None:
+        return status in STATUS_TRANSITORIOS or status >= 500
+    return erro.code in CODIGOS_TRANSITORIOS
+
+def espera_backoff(tentativa: int, erro: Exception = None) -> float:
+    """Segundos a aguardar antes da próxima tentativa (respeita Retry-After)."""
+    espera = random.uniform(0, min(BACKOFF_MAX_SEGUNDOS, BACKOFF_BASE_SEGUNDOS * 2 ** (tentativa - 1)))
+    retry_after = getattr(erro, 'retry_after', None)
+    if retry_after:
+        espera = max(espera, retry_after)
+    return espera
+
+class LimitadorTaxa:
+    """Espaça as requisições de todos os workers para no máximo `por_segundo`."""
+
+    def __init__(self, por_segundo: float = None):
+        self.intervalo = 1.0 / por_segundo if por_segundo else 0.0
+        self.proximo = time.monotonic()
+        self.lock = threading.Lock()
+
+    def aguardar(self):
+        with self.lock:
+            agora = time.monotonic()
+            espera = self.proximo - agora
+            self.proximo = max(agora, self.proximo) + self.intervalo
+        if espera > 0:
+            time.sleep(espera)
+
+    def pausar(self, segundos: float):
+        """Adia todas as próximas requisições (usado quando o servidor responde 429)."""
+        with self.lock:
+            self.proximo = max(self.proximo, time.monotonic() + segundos)
+
+class ClientePostgrest:
+    """Acesso direto ao PostgREST do Supabase para as escritas em massa.
+
+    Um único httpx.Client (thread-safe) é compartilhado pelos workers, com
+    tantas conexões keep-alive quanto a concorrência. Diferente do cliente
+    supabase-py, expõe o status HTTP, o que permite distinguir 429/5xx
+    (repetir) de erros de dados (bisseccionar o lote). Com `metricas`
+    (instrumentacao.Metricas), a latência de cada requisição é registrada,
+    sem contar a espera no limitador de taxa.
+    """
+
+    def __init__(self, url: str, chave: str, schema: str = 'estruturacao', max_conexoes: int = 4,
+                 limitador: LimitadorTaxa = None, timeout: float = 60.0, metricas=None):
+        self.limitador = limitador or LimitadorTaxa()
+        self.metricas = metricas
+        self.http = httpx.Client(
+            base_url=f"{url.rstrip('/')}/rest/v1",
+            headers={
+                'apikey': chave,
+                'Authorization': f"Bearer {chave}",
+                'Content-Profile': schema,
+                'Accept-Profile': schema,
+            },
+            limits=httpx.Limits(max_connections=max_conexoes, max_keepalive_connections=max_conexoes),
+            timeout=timeout,
+        )
+
+    def _post(self, tabela: str, registros: list, prefer: str, params: dict = None, operacao: str = 'insert'):
+        self.limitador.aguardar()
+        with self.metricas.requisicao(operacao) if self.metricas else nullcontext():
+            self._enviar(tabela, registros, prefer, params)
+
+    def _enviar(self, tabela: str, registros: list, prefer: str, params: dict = None):
+        try:
+            resposta = self.http.post(f"/{tabela}", json=registros, params=params,
+                                      headers={'Prefer': prefer})
+        except httpx.TransportError as e:
+            raise ErroTransitorio(f"Falha de rede: {e}") from e
+
+        if resposta.status_code < 400:
+            return
+
+        retry_after = resposta.headers.get('Retry-After')
+        retry_after = float(retry_after) if retry_after and retry_after.isdigit() else None
+        if resposta.status_code in STATUS_TRANSITORIOS:
+            if resposta.status_code == 429:
+                self.limitador.pausar(retry_after or BACKOFF_BASE_SEGUNDOS)
+            raise ErroTransitorio(f"HTTP {resposta.status_code}: {resposta.text[:200]}",
+                                  resposta.status_code, retry_after)
+
+        try:
+            corpo = resposta.json()
+        except ValueError:
+            corpo = {'message': resposta.text, 'code': str(resposta.status_code)}
+        erro = APIError(corpo if isinstance(corpo, dict) else {'message': str(corpo)})
+        erro.status = resposta.status_code
+        raise erro
+
+    def inserir(self, tabela: str, registros: list):
+        self._post(tabela, registros, 'return=minimal')
+
+    def upsert(self, tabela: str, registros: list, on_conflict: str = 'id'):
+        self._post(tabela, registros, 'return=minimal,resolution=merge-duplicates',
+                   params={'on_conflict': on_conflict}, operacao='upsert')
+
+    def fechar(self):
+        self.http.close()
+
+class EscritorParalelo:
+    """Pool limitado de workers que consome lotes de uma fila com capacidade fixa.
+
+    `escrever` bloqueia quando a fila está cheia, o que segura a leitura e a
+    conversão da planilha (backpressure) em vez de acumular lotes na memória.
+    `processar(lote, enviar, acao)` grava um lote e retorna (sucessos, erros).
+    """
+
+    def __init__(self, processar, concorrencia: int = 4, tamanho_lote: int = 500):
+        self.processar = processar
+        self.tamanho_lote = tamanho_lote
+        self.fila = queue.Queue(maxsize=concorrencia * 2)
+        self.lock = threading.Lock()
+        self.total_sucessos = 0
+        self.total_erros = 0
+        self.workers = [
+            threading.Thread(target=self._trabalhar, name=f"escritor-{i}", daemon=True)
+            for i in range(concorrencia)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def _trabalhar(self):
+        while True:
+            tarefa = self.fila.get()
+            if tarefa is None:
+                return
+            lote, enviar, acao = tarefa
+            try:
+                sucessos, erros = self.processar(lote, enviar, acao)
+            except Exception as e:
+                print(f"   [X] Linhas {lote[0][0]}-{lote[-1][0]}: ERRO - {str(e)}")
+                sucessos, erros = 0, len(lote)
+            with self.lock:
+                self.total_sucessos += sucessos
+                self.total_erros += erros
+
+    def escrever(self, itens: list, enviar, acao: str = 'inseridas'):
+        """Enfileira itens (linha, registro) em lotes de `tamanho_lote`."""
+        for inicio in range(0, len(itens), self.tamanho_lote):
+            self.fila.put((itens[inicio:inicio + self.tamanho_lote], enviar, acao))
+
+    def finalizar(self):
+        """Espera todos os lotes e retorna (total_sucessos, total_erros)."""
+        for _ in self.workers:
+            self.fila.put(None)
+        for worker in self.workers:
+            worker.join()
+        return self.total_sucessos, self.total_erros
@@ -0,0 +1,319 @@
+"""
+Exportação da Planilha - estruturacao → Excel/Parquet
+Data: 29 de Janeiro de 2026
+Descrição: Gera a planilha no layout Histórico/Pipe/Pendências (mais Compliance) a partir
+           de estruturacao.operacoes, pendencias e compliance_checks, paginando por chave
+           (keyset, sem OFFSET) e gravando cada página assim que chega, com uso de
+           memória constante; com --desde, só as linhas alteradas a partir da data
+"""
+
+import argparse
+import os
+import sys
+from datetime import date, datetime, timezone
+
+from openpyxl import Workbook
+from supabase import create_client, Client
+
+from leitor_planilha import ABAS_MIGRACAO
+from referencias import buscar_tabelas, gravar_cache, ler_cache
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_DISPONIVEL = True
+except ImportError:
+    PARQUET_DISPONIVEL = False
+
+# Configuração do Supabase
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_KEY")
+
+if not SUPABASE_URL or not SUPABASE_KEY:
+    print("[ERROR] ERRO: Variaveis de ambiente SUPABASE_URL e SUPABASE_SERVICE_KEY nao configuradas!")
+    sys.exit(1)
+
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+TAMANHO_PAGINA = 1000
+
+FORMATOS = ('xlsx', 'parquet')
+
+# Status que ficam na aba Pipe; os demais vão para o Histórico
+STATUS_PIPE = ['Em Estruturação', 'On Hold']
+
+# (cabeçalho, campo, tipo). Os cabeçalhos são os nomes que transformacao.ALIASES_COLUNAS
+# reconhece, para que a planilha exportada possa ser migrada de volta. Tipos de
+# referência (categorias, veiculos, usuarios, analistas) viram o nome da tabela.
+COLUNAS_OPERACAO = [
+    ('Emissão', 'numero_emissao', 'texto'),
+    ('Operação', 'nome_operacao', 'texto'),
+    ('Status', 'status', 'texto'),
+    ('PMO', 'pmo_id', 'usuarios'),
+    ('Categoria', 'categoria_id', 'categorias'),
+    ('Veículo', 'veiculo_id', 'veiculos'),
+    ('Analista Gestão', 'analista_gestao_id', 'analistas'),
+    ('Volume', 'volume', 'numero'),
+    ('CNPJ', 'empresa_cnpj', 'texto'),
+    ('Razão Social', 'empresa_razao_social', 'texto'),
+    ('Data de Entrada no Pipe', 'data_entrada_pipe', 'data_hora'),
+    ('Previsão de Liquidação', 'data_previsao_liquidacao', 'data'),
+    ('Data de Liquidação', 'data_liquidacao', 'data'),
+    ('1ª Data de Pagamento', 'data_primeira_pagamento', 'data'),
+    ('Floating', 'floating', 'booleano'),
+    ('Próximos Passos', 'proximos_passos', 'texto'),
+    ('Alertas', 'alertas', 'texto'),
+    ('Resumo', 'resumo', 'texto'),
+    ('Fee Estruturação', 'fee_estruturacao', 'numero'),
+    ('Fee Gestão', 'fee_gestao', 'numero'),
+    ('Boletagem', 'boletagem', 'texto'),
+    ('DF', 'df', 'texto'),
+    ('Banco', 'banco', 'texto'),
+    ('Agência', 'agencia', 'texto'),
+    ('Conta Bancária', 'conta_bancaria', 'texto'),
+    ('Majoração', 'majoracao', 'numero'),
+    ('Atualizado em', 'atualizado_em', 'data_hora'),
+]
+
+# Pendências: a operação (embutida pelo PostgREST) seguida dos itens do checklist
+COLUNAS_PENDENCIA = [(cabecalho, 'operacao.' + campo, tipo) for cabecalho, campo, tipo in COLUNAS_OPERACAO[:-1]] + [
+    ('Mapa de Liquidação', 'mapa_liquidacao', 'texto'),
+    ('Mapa de Registros', 'mapa_registros', 'texto'),
+    ('LO', 'lo_status', 'texto'),
+    ('Due Diligence', 'due_diligence', 'texto'),
+    ('Envio E-mail Prestadores', 'envio_email_prestadores', 'texto'),
+    ('Passagem de Bastão', 'passagem_bastao', 'texto'),
+    ('Kick Off', 'kick_off', 'texto'),
+    ('Atualizado em', 'atualizado_em', 'data_hora'),
+]
+
+COLUNAS_COMPLIANCE = [
+    ('Emissão', 'operacao.numero_emissao', 'texto'),
+    ('Operação', 'operacao.nome_operacao', 'texto'),
+    ('Nome', 'nome_entidade', 'texto'),
+    ('CPF/CNPJ', 'cnpj', 'texto'),
+    ('Tipo Entidade', 'tipo_entidade', 'texto'),
+    ('Status', 'status', 'texto'),
+    ('Observações', 'observacoes', 'texto'),
+    ('Data Verificação', 'data_verificacao', 'data_hora'),
+    ('Atualizado em', 'atualizado_em', 'data_hora'),
+]
+
+def _abas_exportacao() -> list:
+    """(chave, aba, linha do cabeçalho, tabela, select, filtrar, ordem, colunas), na ordem da planilha."""
+    historico, header_historico, _ = ABAS_MIGRACAO['historico']
+    pipe, header_pipe, _ = ABAS_MIGRACAO['pipe']
+    pendencias, header_pendencias, _ = ABAS_MIGRACAO['pendencias']
+    ordem_operacoes = ('data_entrada_pipe', 'id')
+    return [
+        ('historico', historico, header_historico, 'operacoes', '*',
+         lambda consulta: consulta.not_.in_('status', STATUS_PIPE), ordem_operacoes, COLUNAS_OPERACAO),
+        ('pipe', pipe, header_pipe, 'operacoes', '*',
+         lambda consulta: consulta.in_('status', STATUS_PIPE), ordem_operacoes, COLUNAS_OPERACAO),
+        ('pendencias', pendencias, header_pendencias, 'pendencias', '*, operacao:operacoes(*)',
+         lambda consulta: consulta.eq('resolvida', False), ('id',), COLUNAS_PENDENCIA),
+        ('compliance', 'Compliance', 0, 'compliance_checks', '*, operacao:operacoes(numero_emissao, nome_operacao)',
+         lambda consulta: consulta, ('id',), COLUNAS_COMPLIANCE),
+    ]
+
+def buscar_nomes_referencia() -> dict:
+    """{tipo: {id: nome}} das tabelas de referência (cache local de referencias.py, se válido)."""
+    tabelas = ler_cache()
+    if tabelas is None:
+        tabelas = buscar_tabelas(supabase)
+        gravar_cache(tabelas)
+    return {tipo: {id_: nome for nome, id_ in mapa.items()} for tipo, mapa in tabelas.items()}
+
+def _filtro_keyset(ordem: tuple, ultima: dict) -> str:
+    """Filtro or= do PostgREST para "depois de `ultima`" na ordem (a, b)."""
+    a, b = ordem
+    return f'{a}.gt."{ultima[a]}",and({a}.eq."{ultima[a]}",{b}.gt."{ultima[b]}")'
+
+def paginar(tabela: str, select: str, filtrar, ordem: tuple, desde: str = None,
+            tamanho_pagina: int = TAMANHO_PAGINA):
+    """Gera páginas de `tabela` em `ordem` (colunas não nulas, a última única).
+
+    Cada página continua da última linha da anterior (keyset), então o custo
+    por página não cresce com a posição como no OFFSET, e linhas inseridas
+    durante a exportação não deslocam as páginas seguintes.
+    """
+    ultima = None
+    while True:
+        consulta = filtrar(supabase.schema('estruturacao').table(tabela).select(select))
+        if desde:
+            consulta = consulta.gte('atualizado_em', desde)
+        if ultima is not None:
+            if len(ordem) == 1:
+                consulta = consulta.gt(ordem[0], ultima[ordem[0]])
+            else:
+                # O gte redundante vira condição de índice: o or= sozinho seria só filtro
+                consulta = consulta.gte(ordem[0], ultima[ordem[0]]).or_(_filtro_keyset(ordem, ultima))
+        for coluna in ordem:
+            consulta = consulta.order(coluna)
+        pagina = consulta.limit(tamanho_pagina).execute().data or []
+
+        if pagina:
+            yield pagina
+        if len(pagina) < tamanho_pagina:
+            return
+        ultima = pagina[-1]
+
+def _valor(registro: dict, campo: str):
+    for parte in campo.split('.'):
+        registro = (registro or {}).get(parte)
+    return registro
+
+def converter_valor(valor, tipo: str, nomes: dict):
+    """Valor do PostgREST (JSON) para o tipo da célula: datas viram date/datetime (UTC, sem fuso)."""
+    if valor is None:
+        return None
+    if tipo in nomes:
+        return nomes[tipo].get(valor)
+    if tipo == 'numero':
+        return float(valor)
+    if tipo == 'data':
+        return date.fromisoformat(valor[:10])
+    if tipo == 'data_hora':
+        momento = datetime.fromisoformat(valor)
+        if momento.tzinfo is not None:
+            momento = momento.astimezone(timezone.utc).replace(tzinfo=None)
+        return momento
+    if tipo == 'booleano':
+        return bool(valor)
+    return str(valor)
+
+def converter_pagina(pagina: list, colunas: list, nomes: dict) -> list:
+    return [
+        [converter_valor(_valor(registro, campo), tipo, nomes) for _, campo, tipo in colunas]
+        for registro in pagina
+    ]
+
+TIPOS_PARQUET = {
+    'texto': 'string', 'numero': 'float64', 'data': 'date32',
+    'data_hora': 'timestamp', 'booleano': 'bool',
+}
+
+def _esquema_parquet(colunas: list):
+    tipos = {
+        'string': pa.string(), 'float64': pa.float64(), 'date32': pa.date32(),
+        'timestamp': pa.timestamp('us'), 'bool': pa.bool_(),
+    }
+    return pa.schema([(cabecalho, tipos[TIPOS_PARQUET.get(tipo, 'string')]) for cabecalho, _, tipo in colunas])
+
+class DestinoXlsx:
+    """Workbook em modo write_only: cada linha vai para o arquivo temporário da aba ao ser adicionada."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self.workbook = Workbook(write_only=True)
+        self.aba = None
+
+    def abrir_aba(self, chave: str, nome: str, linha_cabecalho: int, colunas: list):
+        self.aba = self.workbook.create_sheet(nome)
+        # Pipe: o cabeçalho fica na linha 7, como na planilha original
+        for _ in range(linha_cabecalho):
+            self.aba.append([])
+        self.aba.append([cabecalho for cabecalho, _, _ in colunas])
+
+    def escrever(self, linhas: list):
+        for linha in linhas:
+            self.aba.append(linha)
+
+    def fechar_aba(self):
+        self.aba = None
+
+    def finalizar(self) -> list:
+        temporario = self.caminho + '.tmp'
+        self.workbook.save(temporario)
+        os.replace(temporario, self.caminho)
+        return [self.caminho]
+
+class DestinoParquet:
+    """Um arquivo .parquet por aba em `diretorio`; cada página vira um row group."""
+
+    def __init__(self, diretorio: str):
+        self.diretorio = diretorio
+        self.escritor = None
+        self.arquivos = []
+        os.makedirs(diretorio, exist_ok=True)
+
+    def abrir_aba(self, chave: str, nome: str, linha_cabecalho: int, colunas: list):
+        self.caminho = os.path.join(self.diretorio, f"{chave}.parquet")
+        self.esquema = _esquema_parquet(colunas)
+        self.escritor = pq.ParquetWriter(self.caminho + '.tmp', self.esquema)
+
+    def escrever(self, linhas: list):
+        colunas = list(zip(*linhas))
+        self.escritor.write_table(pa.Table.from_arrays(
+            [pa.array(valores, type=campo.type) for valores, campo in zip(colunas, self.esquema)],
+            schema=self.esquema,
+        ))
+
+    def fechar_aba(self):
+        self.escritor.close()
+        os.replace(self.caminho + '.tmp', self.caminho)
+        self.arquivos.append(self.caminho)
+
+    def finalizar(self) -> list:
+        return self.arquivos
+
+def exportar(saida: str, formato: str = 'xlsx', desde: str = None, tamanho_pagina: int = TAMANHO_PAGINA):
+    print("\n" + "="*60)
+    print(">> EXPORTACAO DA PLANILHA")
+    print("="*60)
+
+    # Marca tirada antes da primeira leitura: a próxima exportação incremental parte daqui
+    inicio = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    if desde:
+        print(f"[*] Somente linhas alteradas desde {desde}")
+
+    nomes = buscar_nomes_referencia()
+    destino = DestinoXlsx(saida) if formato == 'xlsx' else DestinoParquet(saida)
+
+    totais = {}
+    for chave, aba, linha_cabecalho, tabela, select, filtrar, ordem, colunas in _abas_exportacao():
+        print(f"\n[*] Exportando aba: {aba}")
+        destino.abrir_aba(chave, aba, linha_cabecalho, colunas)
+        totais[aba] = 0
+        for pagina in paginar(tabela, select, filtrar, ordem, desde, tamanho_pagina):
+            destino.escrever(converter_pagina(pagina, colunas, nomes))
+            totais[aba] += len(pagina)
+        destino.fechar_aba()
+        print(f"   [OK] {totais[aba]} linhas")
+
+    arquivos = destino.finalizar()
+
+    print("\n" + "="*60)
+    for aba, total in totais.items():
+        print(f"[OK] {aba}: {total} linhas")
+    for arquivo in arquivos:
+        print(f"[OK] Gravado: {arquivo}")
+    print(f"[*] Proxima exportacao incremental: --desde {inicio}")
+    print("="*60)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta operacoes, pendencias e compliance para Excel ou Parquet")
+    parser.add_argument("saida", nargs="?", default=None,
+                        help="Arquivo .xlsx ou, com --formato parquet, diretorio dos .parquet "
+                             "(padrao: exportacao-<data>.xlsx / exportacao-<data>/)")
+    parser.add_argument("--formato", choices=FORMATOS, default="xlsx",
+                        help="xlsx no layout da planilha, ou um .parquet por aba (padrao: xlsx)")
+    parser.add_argument("--desde", default=None,
+                        help="Exporta so as linhas com atualizado_em a partir desta data/hora ISO (ex.: 2026-01-29 ou 2026-01-29T10:00:00+00:00)")
+    parser.add_argument("--tamanho-pagina", type=int, default=TAMANHO_PAGINA,
+                        help=f"Linhas por requisicao (padrao: {TAMANHO_PAGINA})")
+    args = parser.parse_args()
+
+    if args.formato == 'parquet' and not PARQUET_DISPONIVEL:
+        print("[ERROR] pyarrow nao instalado: pip install pyarrow")
+        sys.exit(1)
+
+    if args.desde:
+        try:
+            datetime.fromisoformat(args.desde)
+        except ValueError:
+            print(f"[ERROR] Data invalida em --desde: {args.desde}")
+            sys.exit(1)
+
+    saida = args.saida or f"exportacao-{date.today():%Y-%m-%d}" + ('.xlsx' if args.formato == 'xlsx' else '')
+    exportar(saida, args.formato, args.desde, args.tamanho_pagina)
@@ -0,0 +1,363 @@
+"""
+Ingestão em Lote - Várias Planilhas → estruturacao.operacoes
+Data: 29 de Janeiro de 2026
+Descrição: Lê e converte várias planilhas (versões e pipes regionais) em paralelo, um
+           processo por núcleo, resolve as emissões repetidas entre arquivos por uma
+           regra de precedência e grava o resultado consolidado numa única etapa de escrita
+"""
+
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
+
+import migrate_data as migracao
+from conversores import FalhasConversao
+from instrumentacao import caminho_relatorio_padrao
+from leitor_planilha import MOTORES
+from migrate_data import (
+    MAX_REQ_POR_SEGUNDO_PADRAO,
+    SIMILARIDADE_MINIMA,
+    TAMANHO_LOTE_PADRAO,
+    Gravacao,
+    buscar_referencias,
+    criar_resolvedores,
+    finalizar_carga_em_massa,
+    imprimir_relatorio_referencias,
+    iniciar_carga_em_massa,
+    iterar_abas_convertidas,
+    limpar_dados_antigos,
+    metricas,
+    sincronizar_operacoes,
+)
+from transformacao import CAMPO_ENTRADA_ESTIMADA
+from validacao import Validador
+
+EXTENSOES_PLANILHA = ('.xlsx', '.xlsm')
+
+# Regra para a mesma emissão em mais de um arquivo:
+#   arquivo - vale a planilha modificada por último
+#   entrada - vale a linha com a Data de Entrada no Pipe mais recente (empate: arquivo)
+PRECEDENCIAS = ('arquivo', 'entrada')
+
+def listar_planilhas(entradas: list) -> list:
+    """Caminhos absolutos das planilhas em `entradas` (arquivos, diretórios ou globs), sem repetição.
+
+    Arquivos temporários do Excel (~$...) são ignorados.
+    """
+    caminhos = set()
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            candidatos = [os.path.join(entrada, nome) for nome in os.listdir(entrada)]
+        elif glob.has_magic(entrada):
+            candidatos = glob.glob(entrada, recursive=True)
+        else:
+            if not os.path.isfile(entrada):
+                print(f"[X] Arquivo nao encontrado: {entrada}")
+            candidatos = [entrada]
+        for candidato in candidatos:
+            nome = os.path.basename(candidato)
+            if (os.path.isfile(candidato) and nome.lower().endswith(EXTENSOES_PLANILHA)
+                    and not nome.startswith('~$')):
+                caminhos.add(os.path.abspath(candidato))
+    return sorted(caminhos)
+
+def converter_planilha(caminho: str, tabelas: dict, similaridade_minima: float, motor: str, usar_cache: bool) -> dict:
+    """Lê e converte uma planilha; roda num processo do pool.
+
+    As referências chegam como tabelas {nome: id} e os resolvedores são
+    montados no processo. A saída de carregar/converter é capturada para não
+    embaralhar o terminal: ela só aparece se a leitura falhar. Retorna as abas
+    convertidas mais os relatórios de referências e de conversão, que o
+    processo principal soma.
+    """
+    inicio = time.perf_counter()
+    refs = criar_resolvedores(tabelas, similaridade_minima)
+    migracao.falhas_conversao.limpar()
+    saida = io.StringIO()
+    try:
+        with redirect_stdout(saida):
+            abas = dict(iterar_abas_convertidas(caminho, refs, motor, usar_cache))
+    except SystemExit:
+        # carregar_planilha encerra o processo quando não consegue abrir o arquivo
+        linhas = saida.getvalue().strip().splitlines()
+        raise RuntimeError(linhas[-1] if linhas else "falha ao carregar a planilha") from None
+
+    return {
+        'caminho': caminho,
+        'modificado_em': os.path.getmtime(caminho),
+        'abas': abas,
+        'referencias': [resolvedor.relatorio() for resolvedor in refs],
+        'falhas_conversao': migracao.falhas_conversao.resumo(),
+        'segundos': round(time.perf_counter() - inicio, 4),
+    }
+
+def converter_em_paralelo(caminhos: list, refs, similaridade_minima: float, motor: str, usar_cache: bool,
+                          workers: int = None) -> list:
+    """converter_planilha de cada arquivo num ProcessPoolExecutor; resultados na ordem de `caminhos`.
+
+    Levanta RuntimeError se alguma planilha falhar: gravar só parte dos
+    arquivos apagaria (ou deixaria desatualizadas) as emissões do que faltou.
+    """
+    tabelas = {
+        nome: dict(resolvedor.items())
+        for nome, resolvedor in zip(('categorias', 'veiculos', 'usuarios', 'analistas'), refs)
+    }
+    workers = max(1, min(workers or os.cpu_count() or 1, len(caminhos)))
+    print(f"\n[*] Lendo e convertendo {len(caminhos)} planilhas com {workers} processos...")
+
+    resultados = {}
+    falhas = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futuros = {
+            pool.submit(converter_planilha, caminho, tabelas, similaridade_minima, motor, usar_cache): caminho
+            for caminho in caminhos
+        }
+        for concluidos, futuro in enumerate(as_completed(futuros), start=1):
+            caminho = futuros[futuro]
+            nome = os.path.basename(caminho)
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                falhas.append(caminho)
+                print(f"   [X] ({concluidos}/{len(caminhos)}) {nome}: {e}")
+                continue
+            resultados[caminho] = resultado
+            linhas = sum(len(convertida['operacoes']) for convertida in resultado['abas'].values())
+            print(f"   [OK] ({concluidos}/{len(caminhos)}) {nome}: {linhas} linhas em {resultado['segundos']:.1f}s")
+
+    if falhas:
+        raise RuntimeError(f"{len(falhas)} planilhas nao puderam ser lidas: "
+                           f"{', '.join(os.path.basename(caminho) for caminho in falhas)}")
+    return [resultados[caminho] for caminho in caminhos]
+
+def _chave_precedencia(registro: dict, planilha: dict, precedencia: str) -> tuple:
+    arquivo = (planilha['modificado_em'], planilha['caminho'])
+    if precedencia == 'arquivo':
+        return arquivo
+    # Sem data de entrada (nem de liquidação) a transformação usa "agora": não conta como mais recente
+    entrada = '' if registro.get(CAMPO_ENTRADA_ESTIMADA) else registro.get('data_entrada_pipe') or ''
+    return (entrada,) + arquivo
+
+def aplicar_precedencia(planilhas: list, precedencia: str = 'arquivo') -> int:
+    """Deixa cada numero_emissao em uma única planilha, pela regra `precedencia`. Retorna as linhas descartadas.
+
+    Repetições dentro da planilha vencedora continuam lá e caem na validação
+    como em uma migração normal. Linhas sem numero_emissao e erros de
+    conversão não entram na disputa. Com precedencia='entrada', a data de
+    entrada estimada pela conversão (CAMPO_ENTRADA_ESTIMADA) conta como vazia.
+    """
+    vencedores = {}
+    for indice, planilha in enumerate(planilhas):
+        for convertida in planilha['abas'].values():
+            for _, registro in convertida['operacoes']:
+                numero = registro.get('numero_emissao') if isinstance(registro, dict) else None
+                if not numero:
+                    continue
+                chave = _chave_precedencia(registro, planilha, precedencia)
+                if numero not in vencedores or chave > vencedores[numero][0]:
+                    vencedores[numero] = (chave, indice)
+
+    total = 0
+    for indice, planilha in enumerate(planilhas):
+        planilha['descartadas'] = 0
+        for convertida in planilha['abas'].values():
+            mantidas = []
+            for linha, registro in convertida['operacoes']:
+                numero = registro.get('numero_emissao') if isinstance(registro, dict) else None
+                if numero and vencedores[numero][1] != indice:
+                    planilha['descartadas'] += 1
+                    continue
+                mantidas.append((linha, registro))
+            convertida['operacoes'] = mantidas
+        total += planilha['descartadas']
+    return total
+
+def executar_ingestao(entradas: list, precedencia: str = 'arquivo', workers: int = None, limpar_antes=True,
+                      tamanho_lote: int = TAMANHO_LOTE_PADRAO, motor: str = 'auto', sincronizar=False,
+                      remover_ausentes=False, usar_cache=True, concorrencia: int = 1,
+                      max_req_por_segundo: float = MAX_REQ_POR_SEGUNDO_PADRAO, atualizar_referencias=False,
+                      similaridade_minima: float = SIMILARIDADE_MINIMA, arquivo_quarentena: str = None,
+                      permitir_duplicados=False, carga_em_massa=False, arquivo_relatorio: str = None,
+                      arquivo_openmetrics: str = None) -> bool:
+    """Migra várias planilhas como uma só.
+
+    Leitura e conversão rodam em `workers` processos (padrão: um por
+    núcleo); validação e escrita ficam no processo principal, sobre o
+    resultado consolidado, com as mesmas opções de executar_migracao. Não há
+    diário de retomada: ele é por planilha, e a carga consolidada pode
+    ser refeita com --sincronizar. Retorna False se nada foi gravado por
+    falta de planilhas ou falha de leitura.
+    """
+    print("\n" + "="*60)
+    print(">> INGESTAO EM LOTE")
+    print("="*60)
+
+    caminhos = listar_planilhas(entradas)
+    if not caminhos:
+        print("[ERROR] Nenhuma planilha .xlsx/.xlsm encontrada")
+        return False
+
+    metricas.reiniciar({
+        'planilhas': caminhos, 'precedencia': precedencia, 'workers': workers, 'limpar_antes': limpar_antes,
+        'tamanho_lote': tamanho_lote, 'motor': motor, 'sincronizar': sincronizar,
+        'remover_ausentes': remover_ausentes, 'usar_cache': usar_cache, 'concorrencia': concorrencia,
+        'max_req_por_segundo': max_req_por_segundo, 'carga_em_massa': carga_em_massa,
+    })
+
+    with metricas.etapa('referencias'):
+        refs = buscar_referencias(atualizar_referencias, similaridade_minima)
+
+    try:
+        with metricas.etapa('conversao'):
+            planilhas = converter_em_paralelo(caminhos, refs, similaridade_minima, motor, usar_cache, workers)
+    except RuntimeError as e:
+        print(f"[ERROR] {e}")
+        print("   Nada foi gravado; corrija ou retire os arquivos e rode de novo")
+        return False
+
+    falhas_conversao = FalhasConversao()
+    for planilha in planilhas:
+        for resolvedor, relatorio in zip(refs, planilha['referencias']):
+            resolvedor.incorporar(relatorio)
+        falhas_conversao.incorporar(planilha['falhas_conversao'], f"{os.path.basename(planilha['caminho'])}: ")
+
+    descartadas = aplicar_precedencia(planilhas, precedencia)
+    metricas.contar('linhas_sobrepostas', descartadas)
+    print(f"\n[*] Emissoes repetidas entre arquivos (precedencia: {precedencia}): {descartadas} linhas descartadas")
+    for planilha in planilhas:
+        if planilha['descartadas']:
+            print(f"   {os.path.basename(planilha['caminho'])}: {planilha['descartadas']} linhas substituidas")
+
+    if carga_em_massa:
+        iniciar_carga_em_massa()
+
+    status = 'falhou'
+    try:
+        if limpar_antes and not sincronizar:
+            with metricas.etapa('limpeza'):
+                limpar_dados_antigos()
+
+        total_erros = 0
+        itens_sincronizacao = []
+        gravacao = Gravacao(tamanho_lote, concorrencia, max_req_por_segundo)
+        validador = Validador(arquivo_quarentena, permitir_duplicados)
+        validador.definir_precedencia(
+            (f"{os.path.basename(planilha['caminho'])}:{chave}", convertida['operacoes'])
+            for planilha in planilhas for chave, convertida in planilha['abas'].items()
+        )
+
+        # Uma única etapa de escrita para todas as planilhas, na ordem dos arquivos
+        for planilha in planilhas:
+            nome = os.path.basename(planilha['caminho'])
+            for chave, convertida in planilha['abas'].items():
+                print(f"\n[*] {nome} - aba {chave.upper()}: {len(convertida['operacoes'])} linhas")
+                with metricas.etapa('validacao'):
+                    itens = validador.filtrar(f"{nome}:{chave}", convertida['operacoes'])
+                if sincronizar:
+                    itens_sincronizacao.extend(itens)
+                else:
+                    gravacao.inserir(itens)
+
+        validador.fechar()
+        metricas.contar('linhas_quarentena', validador.recusados)
+
+        print("\n[*] Referencias das planilhas:")
+        imprimir_relatorio_referencias(refs)
+        print("\n[*] Numeros e datas:")
+        falhas_conversao.imprimir()
+        print("\n[*] Validacao:")
+        validador.imprimir_resumo()
+
+        if sincronizar:
+            total_erros += sincronizar_operacoes(itens_sincronizacao, gravacao, remover_ausentes,
+                                                 preservar=validador.numeros_recusados)
+
+        total_sucessos, erros_gravacao = gravacao.finalizar()
+        total_erros += erros_gravacao
+        status = 'concluida'
+    finally:
+        if carga_em_massa:
+            with metricas.etapa('finalizacao'):
+                finalizar_carga_em_massa()
+        metricas.contar('valores_nao_convertidos', falhas_conversao.total)
+        arquivos = [
+            {'caminho': planilha['caminho'], 'segundos': planilha['segundos'],
+             'descartadas': planilha.get('descartadas', 0)}
+            for planilha in planilhas
+        ]
+        for gravado in metricas.gravar(arquivo_relatorio or caminho_relatorio_padrao('ingestao'),
+                                       arquivo_openmetrics, status=status, arquivos=arquivos,
+                                       valores_nao_convertidos=falhas_conversao.resumo()):
+            print(f"\n[*] Metricas da execucao em {gravado}")
+
+    # Resumo
+    print("\n" + "="*60)
+    print(">> RESUMO DA INGESTAO")
+    print("="*60)
+    print(f"[*] Planilhas: {len(planilhas)}")
+    print(f"[OK] Sucessos: {total_sucessos}")
+    print(f"[X] Erros: {total_erros}")
+    print(f"[!] Quarentena: {validador.recusados}")
+    print(f"[*] Substituidas por outra planilha: {descartadas}")
+    print(f"[*] Total processado: {total_sucessos + total_erros + validador.recusados + descartadas}")
+    print("\n[*] Tempo por etapa e latencia das requisicoes:")
+    metricas.imprimir_resumo()
+    print("="*60)
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migra varias planilhas Excel de uma vez para o schema estruturacao")
+    parser.add_argument("entradas", nargs="+",
+                        help="Planilhas, diretorios ou globs (ex.: 'pipes/**/*.xlsx', entre aspas)")
+    parser.add_argument("--precedencia", choices=PRECEDENCIAS, default="arquivo",
+                        help="Emissao em mais de um arquivo: vale o arquivo mais recente (arquivo) ou a "
+                             "Data de Entrada no Pipe mais recente (entrada) (padrao: arquivo)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processos lendo e convertendo planilhas (padrao: um por nucleo)")
+    parser.add_argument("--tamanho-lote", type=int, default=TAMANHO_LOTE_PADRAO,
+                        help=f"Linhas por requisicao de insert (padrao: {TAMANHO_LOTE_PADRAO})")
+    parser.add_argument("--motor", choices=MOTORES, default="auto",
+                        help="Leitor do Excel: calamine e mais rapido (padrao: auto)")
+    parser.add_argument("--sincronizar", action="store_true",
+                        help="Grava apenas operacoes novas ou alteradas, sem limpar a tabela")
+    parser.add_argument("--remover-ausentes", action="store_true",
+                        help="Com --sincronizar, remove operacoes que nao estao em nenhuma das planilhas")
+    parser.add_argument("--sem-cache", action="store_true",
+                        help="Ignora o cache local e le/converte as planilhas de novo")
+    parser.add_argument("--concorrencia", type=int, default=1,
+                        help="Workers gravando lotes em paralelo (padrao: 1, sequencial)")
+    parser.add_argument("--max-req-por-segundo", type=float, default=MAX_REQ_POR_SEGUNDO_PADRAO,
+                        help=f"Teto de requisicoes/s somando os workers (padrao: {MAX_REQ_POR_SEGUNDO_PADRAO})")
+    parser.add_argument("--atualizar-referencias", action="store_true",
+                        help="Ignora o cache local e busca categorias/veiculos/usuarios/analistas no banco")
+    parser.add_argument("--similaridade-minima", type=float, default=SIMILARIDADE_MINIMA,
+                        help="Aceita nomes aproximados com similaridade (trigramas) a partir deste valor, ex.: 0.6 "
+                             "(padrao: 0, desativado)")
+    parser.add_argument("--quarentena", default=None,
+                        help="Arquivo das linhas recusadas pela validacao, .jsonl ou .csv (padrao: scripts/quarentena/)")
+    parser.add_argument("--permitir-duplicados", action="store_true",
+                        help="Grava todas as ocorrencias de um numero_emissao da planilha vencedora")
+    parser.add_argument("--carga-em-massa", action="store_true",
+                        help="Suspende os triggers por linha de operacoes e aplica auditoria/pendencias/emissoes por conjunto no fim")
+    parser.add_argument("--relatorio", default=None,
+                        help="Arquivo JSON com tempo por etapa, arquivos, latencia das requisicoes e erros (padrao: scripts/relatorios/)")
+    parser.add_argument("--openmetrics", default=None,
+                        help="Grava tambem as metricas no formato OpenMetrics")
+    args = parser.parse_args()
+
+    ok = executar_ingestao(args.entradas, precedencia=args.precedencia, workers=args.workers,
+                           tamanho_lote=args.tamanho_lote, motor=args.motor, sincronizar=args.sincronizar,
+                           remover_ausentes=args.remover_ausentes, usar_cache=not args.sem_cache,
+                           concorrencia=args.concorrencia, max_req_por_segundo=args.max_req_por_segundo,
+                           atualizar_referencias=args.atualizar_referencias,
+                           similaridade_minima=args.similaridade_minima, arquivo_quarentena=args.quarentena,
+                           permitir_duplicados=args.permitir_duplicados, carga_em_massa=args.carga_em_massa,
+                           arquivo_relatorio=args.relatorio, arquivo_openmetrics=args.openmetrics)
+    if not ok:
+        sys.exit(1)
+    print("\n[*] Ingestao concluida!")
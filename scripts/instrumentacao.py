@@ -0,0 +1,308 @@
+"""
+Instrumentação da Migração
+Descrição: Tempo por etapa, histogramas de latência das requisições ao PostgREST,
+           contadores (retentativas, bissecções, linhas) e uma amostra dos erros,
+           exportados como relatório JSON ou texto OpenMetrics; mais um indicador de
+           progresso com taxa limitada no lugar das linhas impressas por lote/linha
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from escrita_paralela import erro_transitorio
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DIRETORIO_RELATORIOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'relatorios')
+
+# Limites dos buckets (segundos), os mesmos do cliente Prometheus
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Erros de gravação guardados no relatório e impressos no terminal
+MAX_ERROS_RELATORIO = 100
+MAX_ERROS_IMPRESSOS = 20
+
+# Intervalo mínimo entre duas linhas de progresso
+INTERVALO_PROGRESSO_SEGUNDOS = 2.0
+
+PREFIXO_OPENMETRICS = 'migracao'
+
+def pico_rss_mb():
+    """Pico de memória residente do processo atual em MB (None no Windows)."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB; macOS, em bytes
+    return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+class Histograma:
+    """Contagens cumulativas por limite de BUCKETS_SEGUNDOS, com soma e máximo."""
+
+    def __init__(self):
+        self.contagens = [0] * (len(BUCKETS_SEGUNDOS) + 1)  # último: +Inf
+        self.quantidade = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def observar(self, segundos: float):
+        for i, limite in enumerate(BUCKETS_SEGUNDOS):
+            if segundos <= limite:
+                self.contagens[i] += 1
+                break
+        else:
+            self.contagens[-1] += 1
+        self.quantidade += 1
+        self.soma += segundos
+        self.maximo = max(self.maximo, segundos)
+
+    def cumulativos(self) -> list:
+        acumulado, resultado = 0, []
+        for contagem in self.contagens:
+            acumulado += contagem
+            resultado.append(acumulado)
+        return resultado
+
+    def quantil(self, q: float):
+        """Estimativa por interpolação linear dentro do bucket (como histogram_quantile)."""
+        if not self.quantidade:
+            return None
+        alvo = q * self.quantidade
+        anterior_limite, anterior_acumulado = 0.0, 0
+        for limite, acumulado in zip(BUCKETS_SEGUNDOS + (self.maximo,), self.cumulativos()):
+            if acumulado >= alvo:
+                if acumulado == anterior_acumulado:
+                    return limite
+                fracao = (alvo - anterior_acumulado) / (acumulado - anterior_acumulado)
+                return min(self.maximo, anterior_limite + (limite - anterior_limite) * fracao)
+            anterior_limite, anterior_acumulado = limite, acumulado
+        return self.maximo
+
+class Metricas:
+    """Métricas de uma execução; seguro para os workers da escrita concorrente."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self, parametros: dict = None):
+        with self.lock:
+            self.inicio = time.time()
+            self.inicio_relogio = time.perf_counter()
+            self.parametros = parametros or {}
+            self.etapas = {}
+            self.requisicoes = {}
+            self.contadores = {}
+            self.erros = []
+            self.erros_total = 0
+
+    @contextmanager
+    def etapa(self, nome: str):
+        """Soma o tempo do bloco na etapa `nome` (a mesma etapa pode rodar uma vez por aba)."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            segundos = time.perf_counter() - inicio
+            with self.lock:
+                etapa = self.etapas.setdefault(nome, {'segundos': 0.0, 'chamadas': 0})
+                etapa['segundos'] += segundos
+                etapa['chamadas'] += 1
+                etapa['pico_rss_mb'] = pico_rss_mb()
+
+    def registrar_requisicao(self, operacao: str, segundos: float, resultado: str = 'ok'):
+        """resultado: 'ok', 'erro_dados' (4xx do PostgREST) ou 'erro_transitorio' (408/425/429/5xx/rede)."""
+        with self.lock:
+            requisicao = self.requisicoes.get(operacao)
+            if requisicao is None:
+                requisicao = self.requisicoes[operacao] = {'histograma': Histograma(), 'resultados': {}}
+            requisicao['histograma'].observar(segundos)
+            requisicao['resultados'][resultado] = requisicao['resultados'].get(resultado, 0) + 1
+
+    @contextmanager
+    def requisicao(self, operacao: str):
+        """Mede uma chamada ao PostgREST, classificando a exceção pelo status HTTP se houver."""
+        inicio = time.perf_counter()
+        resultado = 'ok'
+        try:
+            yield
+        except Exception as e:
+            resultado = 'erro_transitorio' if erro_transitorio(e) else 'erro_dados'
+            raise
+        finally:
+            self.registrar_requisicao(operacao, time.perf_counter() - inicio, resultado)
+
+    def contar(self, nome: str, quantidade: int = 1):
+        with self.lock:
+            self.contadores[nome] = self.contadores.get(nome, 0) + quantidade
+
+    def registrar_erro(self, linha, numero_emissao, erro):
+        """Guarda uma amostra dos erros de gravação e imprime só os primeiros."""
+        with self.lock:
+            self.erros_total += 1
+            total = self.erros_total
+            if total <= MAX_ERROS_RELATORIO:
+                self.erros.append({'linha': linha, 'numero_emissao': numero_emissao, 'erro': str(erro)})
+        if total <= MAX_ERROS_IMPRESSOS:
+            print(f"   [X] Linha {linha}: {numero_emissao} - ERRO - {str(erro)}")
+        elif total == MAX_ERROS_IMPRESSOS + 1:
+            print(f"   [X] ... demais erros somente no relatorio (primeiros {MAX_ERROS_RELATORIO})")
+
+    def relatorio(self, **extras) -> dict:
+        with self.lock:
+            duracao = time.perf_counter() - self.inicio_relogio
+            requisicoes = {}
+            for operacao, requisicao in sorted(self.requisicoes.items()):
+                histograma = requisicao['histograma']
+                requisicoes[operacao] = {
+                    'quantidade': histograma.quantidade,
+                    'resultados': dict(requisicao['resultados']),
+                    'segundos_total': round(histograma.soma, 4),
+                    'p50': _arredondar(histograma.quantil(0.50)),
+                    'p95': _arredondar(histograma.quantil(0.95)),
+                    'p99': _arredondar(histograma.quantil(0.99)),
+                    'max': _arredondar(histograma.maximo),
+                    'buckets': dict(zip([str(limite) for limite in BUCKETS_SEGUNDOS] + ['+Inf'],
+                                        histograma.cumulativos())),
+                }
+            return {
+                'inicio': datetime.fromtimestamp(self.inicio).isoformat(timespec='seconds'),
+                'duracao_segundos': round(duracao, 4),
+                'pico_rss_mb': pico_rss_mb(),
+                'parametros': self.parametros,
+                **extras,
+                'etapas': {
+                    nome: {**etapa, 'segundos': round(etapa['segundos'], 4)}
+                    for nome, etapa in self.etapas.items()
+                },
+                'requisicoes': requisicoes,
+                'contadores': dict(sorted(self.contadores.items())),
+                'erros_total': self.erros_total,
+                'erros': list(self.erros),
+            }
+
+    def openmetrics(self, **extras) -> str:
+        """Texto OpenMetrics (ex.: para o textfile collector do node_exporter)."""
+        relatorio = self.relatorio(**extras)
+        p = PREFIXO_OPENMETRICS
+        linhas = [
+            f"# TYPE {p}_duracao_segundos gauge",
+            f"{p}_duracao_segundos {relatorio['duracao_segundos']}",
+            f"# TYPE {p}_etapa_segundos gauge",
+            f"# HELP {p}_etapa_segundos Tempo gasto em cada etapa no processo principal.",
+        ]
+        for nome, etapa in relatorio['etapas'].items():
+            linhas.append(f'{p}_etapa_segundos{{etapa="{nome}"}} {etapa["segundos"]}')
+
+        linhas += [
+            f"# TYPE {p}_requisicao_segundos histogram",
+            f"# HELP {p}_requisicao_segundos Latencia das requisicoes ao PostgREST.",
+        ]
+        for operacao, requisicao in relatorio['requisicoes'].items():
+            for limite, acumulado in requisicao['buckets'].items():
+                linhas.append(f'{p}_requisicao_segundos_bucket{{operacao="{operacao}",le="{limite}"}} {acumulado}')
+            linhas.append(f'{p}_requisicao_segundos_count{{operacao="{operacao}"}} {requisicao["quantidade"]}')
+            linhas.append(f'{p}_requisicao_segundos_sum{{operacao="{operacao}"}} {requisicao["segundos_total"]}')
+
+        linhas.append(f"# TYPE {p}_requisicoes counter")
+        for operacao, requisicao in relatorio['requisicoes'].items():
+            for resultado, quantidade in requisicao['resultados'].items():
+                linhas.append(f'{p}_requisicoes_total{{operacao="{operacao}",resultado="{resultado}"}} {quantidade}')
+
+        for nome, valor in relatorio['contadores'].items():
+            linhas.append(f"# TYPE {p}_{nome} counter")
+            linhas.append(f"{p}_{nome}_total {valor}")
+
+        linhas.append("# EOF")
+        return '\n'.join(linhas) + '\n'
+
+    def gravar(self, caminho_json: str = None, caminho_openmetrics: str = None, **extras) -> list:
+        """Grava o relatório JSON (e o OpenMetrics, se pedido). Retorna os caminhos gravados."""
+        gravados = []
+        if caminho_json:
+            _gravar_texto(caminho_json, json.dumps(self.relatorio(**extras), indent=2, ensure_ascii=False, default=str))
+            gravados.append(caminho_json)
+        if caminho_openmetrics:
+            _gravar_texto(caminho_openmetrics, self.openmetrics(**extras))
+            gravados.append(caminho_openmetrics)
+        return gravados
+
+    def imprimir_resumo(self):
+        relatorio = self.relatorio()
+        for nome, etapa in relatorio['etapas'].items():
+            print(f"   {nome:14s} {etapa['segundos']:9.3f}s")
+        for operacao, requisicao in relatorio['requisicoes'].items():
+            print(f"   {operacao:14s} {requisicao['quantidade']:6d} req  p50 {_ms(requisicao['p50'])}  "
+                  f"p95 {_ms(requisicao['p95'])}  max {_ms(requisicao['max'])}")
+        if relatorio['contadores'].get('retentativas'):
+            print(f"   retentativas   {relatorio['contadores']['retentativas']:6d}")
+
+def _arredondar(valor):
+    return round(valor, 4) if valor is not None else None
+
+def _ms(segundos):
+    return f"{segundos * 1000:7.1f}ms" if segundos is not None else "      -"
+
+def _gravar_texto(caminho: str, conteudo: str):
+    """Grava via arquivo temporário: um coletor lendo o arquivo nunca vê a escrita pela metade."""
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        arquivo.write(conteudo)
+    os.replace(temporario, caminho)
+
+def caminho_relatorio_padrao(nome: str = 'migracao') -> str:
+    return os.path.join(DIRETORIO_RELATORIOS, f"{nome}-{datetime.now():%Y%m%d-%H%M%S}.json")
+
+class Progresso:
+    """Uma linha de progresso a cada `intervalo` segundos, em vez de uma por lote ou linha.
+
+    O total pode crescer durante a execução (as abas chegam uma a uma).
+    Seguro para chamadas dos workers da escrita concorrente.
+    """
+
+    def __init__(self, rotulo: str, intervalo: float = INTERVALO_PROGRESSO_SEGUNDOS):
+        self.rotulo = rotulo
+        self.intervalo = intervalo
+        self.lock = threading.Lock()
+        self.total = 0
+        self.feitos = 0
+        self.erros = 0
+        self.inicio = time.perf_counter()
+        self.ultima_impressao = self.inicio
+
+    def adicionar_total(self, quantidade: int):
+        with self.lock:
+            self.total += quantidade
+
+    def avancar(self, quantidade: int = 1, erros: int = 0):
+        with self.lock:
+            self.feitos += quantidade
+            self.erros += erros
+            agora = time.perf_counter()
+            if agora - self.ultima_impressao < self.intervalo:
+                return
+            self.ultima_impressao = agora
+            linha = self._linha(agora)
+        print(linha)
+
+    def _linha(self, agora: float) -> str:
+        decorrido = agora - self.inicio
+        taxa = self.feitos / decorrido if decorrido > 0 else 0
+        total = f"/{self.total} ({self.feitos / self.total:.0%})" if self.total else ''
+        erros = f", {self.erros} erros" if self.erros else ''
+        return f"   [*] {self.rotulo}: {self.feitos}{total} linhas, {taxa:.0f} linhas/s{erros}"
+
+    def finalizar(self):
+        with self.lock:
+            if not self.feitos and not self.erros:
+                return
+            linha = self._linha(time.perf_counter())
+        print(linha)
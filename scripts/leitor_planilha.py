@@ -0,0 +1,71 @@
+"""
+Leitura da Planilha Excel
+Descrição: Abre o workbook uma única vez e lê cada aba a partir do mesmo handle,
+           carregando só as colunas usadas na migração
+"""
+
+import importlib.util
+
+import pandas as pd
+
+from transformacao import ALIASES_COLUNAS
+
+# Abas migradas: chave interna → (nome da aba, linha do cabeçalho, status padrão)
+ABAS_MIGRACAO = {
+    'historico': ('Histórico', 0, 'Liquidada'),        # operações liquidadas
+    'pipe': ('Pipe', 6, 'Em Estruturação'),            # header na linha 6
+    'pendencias': ('Pendências', 0, 'Liquidada'),      # liquidadas com pendências
+}
+
+# Todas as colunas que transformar_aba pode consultar (inclui o fallback da data de entrada)
+COLUNAS_MIGRACAO = frozenset(
+    nome for aliases in ALIASES_COLUNAS.values() for nome in aliases
+) | {'Data de Liquidação'}
+
+# Motores de leitura aceitos por abrir_planilha
+MOTORES = ('auto', 'openpyxl', 'calamine')
+
+def resolver_motor(motor: str = 'auto') -> str:
+    """Escolhe o motor de leitura; 'auto' usa calamine (Rust) quando instalado."""
+    if motor == 'auto':
+        return 'calamine' if importlib.util.find_spec('python_calamine') else 'openpyxl'
+    if motor not in MOTORES:
+        raise ValueError(f"Motor invalido: {motor} (use um de {', '.join(MOTORES)})")
+    return motor
+
+def abrir_planilha(caminho: str, motor: str = 'auto') -> pd.ExcelFile:
+    """Abre o workbook uma vez; as abas são lidas depois com ler_aba.
+
+    O openpyxl já é aberto pelo pandas em modo read_only; o calamine é
+    um leitor somente-leitura mais rápido e com menor pico de memória.
+    """
+    return pd.ExcelFile(caminho, engine=resolver_motor(motor))
+
+def ler_aba(planilha: pd.ExcelFile, aba: str, header: int = 0, somente_migracao: bool = False) -> pd.DataFrame:
+    """Lê uma aba do workbook já aberto.
+
+    Com somente_migracao=True, apenas as colunas de ALIASES_COLUNAS são
+    materializadas (usecols), o que reduz tempo e memória em abas largas.
+    """
+    usecols = (lambda coluna: coluna in COLUNAS_MIGRACAO) if somente_migracao else None
+    return planilha.parse(sheet_name=aba, header=header, usecols=usecols)
+
+def carregar_abas_migracao(planilha: pd.ExcelFile) -> dict:
+    """Lê as abas de ABAS_MIGRACAO presentes no workbook.
+
+    Retorna {chave: {'df': DataFrame, 'status_padrao': str}} e imprime o
+    progresso no mesmo formato do carregar_planilha original.
+    """
+    dados = {}
+    for chave, (aba, header, status_padrao) in ABAS_MIGRACAO.items():
+        rotulo = aba.replace('ó', 'o').replace('ê', 'e')
+        if aba not in planilha.sheet_names:
+            print(f"   [!] Aba '{rotulo}' nao encontrada")
+            continue
+
+        dados[chave] = {
+            'df': ler_aba(planilha, aba, header=header, somente_migracao=True),
+            'status_padrao': status_padrao,
+        }
+        print(f"   [OK] Aba '{rotulo}' carregada com {len(dados[chave]['df'])} linhas (status: {status_padrao})")
+    return dados
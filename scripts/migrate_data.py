@@ -6,9 +6,33 @@ Descrição: Migra dados da planilha Excel para o schema estruturacao no Supabas
 
 import pandas as pd
 from supabase import create_client, Client
-from datetime import datetime
+from postgrest import ReturnMethod
+import argparse
 import os
 import sys
+import time
+
+from collections import Counter
+from functools import partial
+
+from cache_planilha import CACHE_DISPONIVEL, CachePlanilha, limpar_cache
+from conversores import FalhasConversao
+from diario_migracao import DiarioMigracao, filtrar_pendentes
+from escrita_paralela import ClientePostgrest, EscritorParalelo, LimitadorTaxa, erro_transitorio, espera_backoff
+from instrumentacao import Metricas, Progresso, caminho_relatorio_padrao
+from leitor_planilha import MOTORES, abrir_planilha, carregar_abas_migracao
+from perfil_planilha import ler_mapeamento
+from referencias import (
+    SIMILARIDADE_MINIMA,
+    ResolvedorReferencias,
+    buscar_tabelas as buscar_tabelas_referencia,
+    gravar_cache as gravar_cache_referencias,
+    imprimir_relatorio as imprimir_relatorio_referencias,
+    ler_cache as ler_cache_referencias,
+)
+from sincronizacao import buscar_existentes, calcular_diff, deduplicar
+from transformacao import CAMPO_ENTRADA_ESTIMADA, transformar_aba
+from validacao import Validador
 
 # Configuração do Supabase
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
@@ -23,204 +47,92 @@ if not SUPABASE_URL or not SUPABASE_KEY:
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-def carregar_planilha(caminho: str) -> dict:
-    """Carrega todas as abas relevantes da planilha."""
-    print(f"[*] Carregando planilha: {caminho}")
-
-    try:
-        # Tenta carregar diferentes abas
-        abas_disponiveis = pd.ExcelFile(caminho).sheet_names
-        print(f"   Abas encontradas: {abas_disponiveis}")
-
-        dados = {}
-
-        # Carregar Histórico (operações liquidadas)
-        if 'Histórico' in abas_disponiveis:
-            dados['historico'] = {
-                'df': pd.read_excel(caminho, sheet_name='Histórico'),
-                'status_padrao': 'Liquidada'
-            }
-            print(f"   [OK] Aba 'Historico' carregada com {len(dados['historico']['df'])} linhas (status: Liquidada)")
-        else:
-            print(f"   [!] Aba 'Historico' nao encontrada")
-
-        # Carregar Pipe (operações em estruturação) - header na linha 6
-        if 'Pipe' in abas_disponiveis:
-            dados['pipe'] = {
-                'df': pd.read_excel(caminho, sheet_name='Pipe', header=6),
-                'status_padrao': 'Em Estruturação'
-            }
-            print(f"   [OK] Aba 'Pipe' carregada com {len(dados['pipe']['df'])} linhas (status: Em Estruturacao)")
-        else:
-            print(f"   [!] Aba 'Pipe' nao encontrada")
-
-        # Carregar Pendências (operações liquidadas com pendências)
-        if 'Pendências' in abas_disponiveis:
-            dados['pendencias'] = {
-                'df': pd.read_excel(caminho, sheet_name='Pendências'),
-                'status_padrao': 'Liquidada'
-            }
-            print(f"   [OK] Aba 'Pendencias' carregada com {len(dados['pendencias']['df'])} linhas (status: Liquidada)")
-        else:
-            print(f"   [!] Aba 'Pendencias' nao encontrada")
-
-        return dados
-    except Exception as e:
-        print(f"[ERROR] Erro ao carregar planilha: {e}")
-        sys.exit(1)
+# Tempo por etapa, latência das requisições e contadores da execução atual
+# (reiniciadas por executar_migracao; ver scripts/instrumentacao.py)
+metricas = Metricas()
 
-def buscar_referencias():
-    """Busca IDs das tabelas de referência."""
-    print("\n[*] Buscando referencias do banco de dados...")
+# Números e datas da planilha que não puderam ser convertidos na execução atual
+falhas_conversao = FalhasConversao()
 
-    try:
-        # Buscar categorias
-        categorias_res = supabase.table('categorias').select('id, codigo').execute()
-        categorias = {r['codigo']: r['id'] for r in categorias_res.data} if categorias_res.data else {}
-        print(f"   Categorias: {len(categorias)} encontradas")
-
-        # Buscar veículos
-        veiculos_res = supabase.table('veiculos').select('id, sigla').execute()
-        veiculos = {r['sigla']: r['id'] for r in veiculos_res.data} if veiculos_res.data else {}
-        print(f"   Veículos: {len(veiculos)} encontrados")
-
-        # Buscar usuários
-        usuarios_res = supabase.table('user_profiles').select('id, nome').execute()
-        usuarios = {r['nome']: r['id'] for r in usuarios_res.data} if usuarios_res.data else {}
-        print(f"   Usuários: {len(usuarios)} encontrados")
-
-        # Buscar analistas
-        analistas_res = supabase.schema('estruturacao').table('analistas_gestao').select('id, nome').execute()
-        analistas = {r['nome']: r['id'] for r in analistas_res.data} if analistas_res.data else {}
-        print(f"   Analistas: {len(analistas)} encontrados")
-
-        return categorias, veiculos, usuarios, analistas
-    except Exception as e:
-        print(f"[ERROR] Erro ao buscar referencias: {e}")
-        return {}, {}, {}, {}
-
-def converter_data(valor):
-    """Converte diferentes formatos de data para ISO."""
-    if pd.isna(valor):
-        return None
-    if isinstance(valor, datetime):
-        return valor.isoformat()
-    try:
-        return pd.to_datetime(valor).isoformat()
-    except:
-        return None
-
-def mapear_status(status_planilha: str) -> str:
-    """Mapeia status da planilha para o banco."""
-    if pd.isna(status_planilha):
-        return 'Em Estruturação'
-
-    mapeamento = {
-        'Em Estruturação': 'Em Estruturação',
-        'Liquidada': 'Liquidada',
-        'On hold': 'On Hold',
-        'On Hold': 'On Hold',
-        'Abortada': 'Abortada',
-        'Finalizada': 'Finalizada'
-    }
-    return mapeamento.get(str(status_planilha), 'Em Estruturação')
+# Escrita em lotes: cada lote vira um único INSERT multi-linha no PostgREST
+TAMANHO_LOTE_PADRAO = 500
+TENTATIVAS_POR_LOTE = 3
 
-def converter_volume(valor):
-    """Converte volume para float, tratando textos."""
-    if pd.isna(valor):
-        return 0
+# Escrita concorrente (--concorrencia > 1): teto de requisições por segundo somando
+# todos os workers, para não esbarrar no rate limit do Supabase
+MAX_REQ_POR_SEGUNDO_PADRAO = 20
 
-    # Se for número, retornar
-    if isinstance(valor, (int, float)):
-        return float(valor)
+# Remoções usam filtro id=in.(...) na URL, então o lote é menor
+TAMANHO_LOTE_REMOCAO = 100
 
-    # Se for texto, tentar converter
-    valor_str = str(valor).strip()
-    if valor_str in ['Pendente', 'A confirmar', 'Confirmar', 'A definir', '-', '']:
-        return 0
+def carregar_planilha(caminho: str, motor: str = 'auto') -> dict:
+    """Carrega todas as abas relevantes da planilha (workbook aberto uma única vez)."""
+    print(f"[*] Carregando planilha: {caminho}")
 
-    # Tentar converter removendo caracteres especiais
     try:
-        valor_limpo = valor_str.replace(',', '').replace('.', '')
-        if valor_limpo.isdigit():
-            return float(valor_limpo)
-        return 0
-    except:
-        return 0
-
-def migrar_operacao(row, refs, status_padrao='Em Estruturação'):
-    """Converte uma linha da planilha para o formato do banco."""
-    categorias, veiculos, usuarios, analistas = refs
+        with metricas.etapa('leitura'):
+            planilha = abrir_planilha(caminho, motor)
+            print(f"   Abas encontradas: {planilha.sheet_names}")
 
-    # Usar UID ou Emissao como identificador - priorizar Emissão se UID estiver vazio
-    uid = row.get('UID')
-    if pd.isna(uid) or str(uid).strip() == '' or uid == '':
-        uid = row.get('Emissão', row.get('Numero Emissao', ''))
+            return carregar_abas_migracao(planilha)
+    except Exception as e:
+        print(f"[ERROR] Erro ao carregar planilha: {e}")
+        sys.exit(1)
 
-    # Validar se é numero valido
-    numero_emissao = ''
-    if pd.notna(uid) and str(uid).strip() != '':
-        try:
-            # Tentar converter para numero
-            numero_emissao = str(int(float(uid)))
-        except (ValueError, TypeError):
-            # Se não for numero, usar como string mesmo
-            uid_str = str(uid).strip()
-            # Remover caracteres inválidos
-            if uid_str not in ['nan', 'NaT', 'None', '1°', '2°', '3°', 'N.A', 'Confirmar', '-']:
-                numero_emissao = uid_str
-
-    # Pegar data de entrada - usar data de liquidacao se nao tiver
-    data_entrada = converter_data(row.get('Data de Entrada no Pipe', row.get('Data Entrada')))
-    if not data_entrada:
-        # Se nao tem data de entrada, usar data de liquidacao ou data atual
-        data_entrada = converter_data(row.get('Data de Liquidação'))
-        if not data_entrada:
-            data_entrada = datetime.now().isoformat()
-
-    # Nome da operacao - buscar em diferentes colunas
-    nome_op = row.get('Operação', row.get('Nome Operacao', ''))
-    if pd.isna(nome_op) or str(nome_op).strip() == '':
-        nome_op = f"Operação {numero_emissao}"
-
-    # Status: usar da planilha se existir, senão usar status padrão
-    status_row = row.get('Status')
-    if pd.notna(status_row) and str(status_row).strip():
-        status = mapear_status(status_row)
-    else:
-        status = status_padrao
+def _buscar_tabelas_referencia() -> dict:
+    """Lê as quatro tabelas de referência do banco como {nome: id}."""
+    with metricas.requisicao('referencias'):
+        return buscar_tabelas_referencia(supabase)
+
+def criar_resolvedores(tabelas: dict, similaridade_minima: float = SIMILARIDADE_MINIMA):
+    """(categorias, veiculos, usuarios, analistas) a partir das tabelas {nome: id}."""
+    return (
+        ResolvedorReferencias('Categoria', tabelas['categorias'], similaridade_minima),
+        ResolvedorReferencias('Veiculo', tabelas['veiculos'], similaridade_minima),
+        ResolvedorReferencias('PMO', tabelas['usuarios'], similaridade_minima),
+        ResolvedorReferencias('Analista Gestao', tabelas['analistas'], similaridade_minima),
+    )
+
+def buscar_referencias(atualizar=False, similaridade_minima: float = SIMILARIDADE_MINIMA):
+    """Busca IDs das tabelas de referência.
+
+    Usa o cache local (scripts/.cache/referencias.json) enquanto estiver
+    dentro do TTL; com atualizar=True, sempre consulta o banco. Retorna
+    resolvedores que comparam nomes sem diferenciar caixa, acentos e espaços.
+    """
+    print("\n[*] Buscando referencias do banco de dados...")
 
-    # Mapeamento de colunas
-    return {
-        'numero_emissao': numero_emissao,
-        'nome_operacao': str(nome_op),
-        'status': status,
-        'pmo_id': usuarios.get(row.get('PMO')),
-        'analista_gestao_id': analistas.get(row.get('Analista Gestão', row.get('Analista Gestao'))),
-        'categoria_id': categorias.get(row.get('Categoria')),
-        'veiculo_id': veiculos.get(row.get('Veículo', row.get('Veiculo'))),
-        'volume': converter_volume(row.get('Volume')),
-        'empresa_cnpj': str(row.get('CNPJ', '')) if pd.notna(row.get('CNPJ')) else None,
-        'empresa_razao_social': str(row.get('Razão Social', row.get('Razao Social', ''))) if pd.notna(row.get('Razão Social', row.get('Razao Social'))) else None,
-        'data_entrada_pipe': data_entrada,
-        'data_previsao_liquidacao': converter_data(row.get('Previsão de Liquidação', row.get('Previsao Liquidacao'))),
-        'data_liquidacao': converter_data(row.get('Data de Liquidação', row.get('Data Liquidacao'))),
-        'data_primeira_pagamento': converter_data(row.get('1ª Data de Pagamento', row.get('Primeira Data Pagamento'))),
-        'floating': bool(row.get('Floating')) if pd.notna(row.get('Floating')) else False,
-        'proximos_passos': str(row.get('Próximos Passos', row.get('Proximos Passos', ''))) if pd.notna(row.get('Próximos Passos', row.get('Proximos Passos'))) else None,
-        'alertas': str(row.get('Alertas', '')) if pd.notna(row.get('Alertas')) else None,
-        'resumo': str(row.get('Resumo', '')) if pd.notna(row.get('Resumo')) else None,
-        'fee_estruturacao': float(row.get('Fee Estruturação', 0)) if pd.notna(row.get('Fee Estruturação')) and str(row.get('Fee Estruturação')).replace('.','').replace(',','').isdigit() else None,
-        'fee_gestao': None,  # Ignorar Remuneracao por enquanto (e texto)
-        'boletagem': str(row.get('Boletagem', '')) if pd.notna(row.get('Boletagem')) else None,
-    }
+    tabelas = None if atualizar else ler_cache_referencias()
+    if tabelas is not None:
+        print("   (cache local de referencias)")
+    else:
+        try:
+            tabelas = _buscar_tabelas_referencia()
+            gravar_cache_referencias(tabelas)
+        except Exception as e:
+            print(f"[ERROR] Erro ao buscar referencias: {e}")
+            # Sem acesso ao banco, um cache vencido ainda é melhor que nenhum
+            tabelas = ler_cache_referencias(ttl=float('inf'))
+            if tabelas is None:
+                tabelas = {'categorias': {}, 'veiculos': {}, 'usuarios': {}, 'analistas': {}}
+            else:
+                print("   [!] Usando cache local de referencias vencido")
+
+    refs = criar_resolvedores(tabelas, similaridade_minima)
+    categorias, veiculos, usuarios, analistas = refs
+    print(f"   Categorias: {len(categorias)} encontradas")
+    print(f"   Veículos: {len(veiculos)} encontrados")
+    print(f"   Usuários: {len(usuarios)} encontrados")
+    print(f"   Analistas: {len(analistas)} encontrados")
+    return refs
 
 def limpar_dados_antigos():
     """Remove todos os dados existentes da tabela operacoes."""
     print("\n[*] Limpando dados antigos...")
     try:
         # Deletar todos os registros
-        result = supabase.schema('estruturacao').table('operacoes').delete().neq('id', '00000000-0000-0000-0000-000000000000').execute()
+        with metricas.requisicao('delete'):
+            supabase.schema('estruturacao').table('operacoes').delete().neq('id', '00000000-0000-0000-0000-000000000000').execute()
         print("[OK] Dados antigos removidos com sucesso")
         return True
     except Exception as e:
@@ -228,57 +140,458 @@ def limpar_dados_antigos():
         print("   Continuando mesmo assim...")
         return False
 
-def executar_migracao(caminho_planilha: str, limpar_antes=True):
-    """Executa a migração completa."""
-    print("\n" + "="*60)
-    print(">> INICIANDO MIGRACAO DE DADOS")
-    print("="*60)
-
-    # Limpar dados antigos se solicitado
-    if limpar_antes:
-        limpar_dados_antigos()
-
-    # Carregar dados
-    dados = carregar_planilha(caminho_planilha)
-
-    if not dados:
-        print("[ERROR] Nenhuma aba valida encontrada na planilha!")
-        return
-
-    # Buscar referências
-    refs = buscar_referencias()
+def iniciar_carga_em_massa():
+    """Abre a carga em massa: os triggers por linha de operacoes deixam de disparar para o service_role."""
+    carga_id = supabase.schema('estruturacao').rpc('iniciar_carga_em_massa').execute().data
+    print(f"[*] Carga em massa aberta: {carga_id}")
+    return carga_id
 
-    # Contador de sucessos e erros
+def finalizar_carga_em_massa():
+    """Fecha a carga aberta, aplicando auditoria, analistas, pendências e emissoes por conjunto."""
+    print("\n[*] Finalizando carga em massa...")
+    try:
+        resumo = supabase.schema('estruturacao').rpc('finalizar_carga_em_massa').execute().data or {}
+    except Exception as e:
+        print(f"[X] Erro ao finalizar a carga em massa: {e}")
+        print("   Rode o script de novo com --carga-em-massa para retomar e fechar a carga")
+        return None
+    print(f"[OK] Analistas preenchidos: {resumo.get('analistas_preenchidos', 0)}")
+    print(f"[OK] Auditorias inseridas: {resumo.get('auditorias_inseridas', 0)}")
+    print(f"[OK] Pendencias criadas: {resumo.get('pendencias_criadas', 0)}")
+    print(f"[OK] Emissoes sincronizadas: {resumo.get('emissoes_sincronizadas', 0)}")
+    return resumo
+
+def para_banco(registros: list) -> list:
+    """Os registros sem as marcações da conversão que não são colunas (CAMPO_ENTRADA_ESTIMADA)."""
+    return [
+        {campo: valor for campo, valor in registro.items() if campo != CAMPO_ENTRADA_ESTIMADA}
+        for registro in registros
+    ]
+
+def inserir_lote(registros: list):
+    """Insere um lote de operações em uma única requisição ao PostgREST."""
+    with metricas.requisicao('insert'):
+        supabase.schema('estruturacao').table('operacoes').insert(
+            para_banco(registros), returning=ReturnMethod.minimal
+        ).execute()
+
+def atualizar_lote(registros: list):
+    """Atualiza um lote de operações existentes (upsert pela chave primária)."""
+    with metricas.requisicao('upsert'):
+        supabase.schema('estruturacao').table('operacoes').upsert(
+            para_banco(registros), on_conflict='id', returning=ReturnMethod.minimal
+        ).execute()
+
+def _enviar_com_retentativa(registros: list, enviar, tentativas: int):
+    """Envia um lote, repetindo apenas em falhas de rede/servidor (408/425/429/5xx).
+
+    O supabase-py levanta APIError também para 429/5xx; o status (ou o código
+    do PostgREST) decide se o erro é transitório. Erros de dados não são
+    repetidos: o mesmo lote falharia de novo, então o erro sobe direto para a
+    bissecção. A espera entre tentativas é exponencial com jitter e respeita
+    o Retry-After.
+    """
+    for tentativa in range(1, tentativas + 1):
+        try:
+            enviar(registros)
+            return
+        except Exception as e:
+            if not erro_transitorio(e) or tentativa == tentativas:
+                raise
+            metricas.contar('retentativas')
+            time.sleep(espera_backoff(tentativa, e))
+
+def _enviar_com_bisseccao(itens: list, enviar, tentativas: int):
+    """Envia itens (linha, registro); se o lote falhar, divide ao meio até isolar as linhas com erro.
+
+    Só erros de dados são bisseccionados; se as retentativas de um erro
+    transitório se esgotarem, o lote inteiro é dado como falho.
+
+    Retorna (linhas_ok, falhas), onde falhas é uma lista de (linha, registro, erro).
+    """
+    try:
+        _enviar_com_retentativa([registro for _, registro in itens], enviar, tentativas)
+        return [linha for linha, _ in itens], []
+    except Exception as e:
+        if erro_transitorio(e):
+            return [], [(linha, registro, e) for linha, registro in itens]
+        if len(itens) == 1:
+            linha, registro = itens[0]
+            return [], [(linha, registro, e)]
+
+    metricas.contar('bisseccoes')
+    meio = len(itens) // 2
+    ok_esq, falhas_esq = _enviar_com_bisseccao(itens[:meio], enviar, tentativas)
+    ok_dir, falhas_dir = _enviar_com_bisseccao(itens[meio:], enviar, tentativas)
+    return ok_esq + ok_dir, falhas_esq + falhas_dir
+
+def processar_lote(lote: list, enviar, acao: str = 'inseridas', tentativas: int = TENTATIVAS_POR_LOTE,
+                   progresso: Progresso = None):
+    """Grava um lote de (linha, registro) e contabiliza o resultado. Retorna (sucessos, erros).
+
+    O avanço vai para `progresso` (uma linha a cada poucos segundos) e os
+    erros por linha para as métricas da execução.
+    """
+    linhas_ok, falhas = _enviar_com_bisseccao(lote, enviar, tentativas)
+
+    metricas.contar('lotes')
+    metricas.contar(f'linhas_{acao}', len(linhas_ok))
+    for linha, registro, erro in falhas:
+        metricas.registrar_erro(linha, registro['numero_emissao'], erro)
+    if progresso:
+        progresso.avancar(len(linhas_ok), len(falhas))
+
+    return len(linhas_ok), len(falhas)
+
+def inserir_em_lotes(itens: list, enviar=inserir_lote, tamanho_lote: int = TAMANHO_LOTE_PADRAO,
+                     tentativas: int = TENTATIVAS_POR_LOTE, acao: str = 'inseridas', progresso: Progresso = None):
+    """Insere uma lista de (linha, registro) em lotes de `tamanho_lote`.
+
+    Cada lote é enviado em uma requisição, com retentativa em falhas de rede.
+    Um lote rejeitado é bisseccionado para que só as linhas inválidas fiquem
+    de fora, mantendo o relatório de erro por linha.
+
+    Retorna (total_sucessos, total_erros).
+    """
     total_sucessos = 0
     total_erros = 0
 
-    # Migrar cada aba
-    for nome_aba, config in dados.items():
-        df = config['df']
-        status_padrao = config['status_padrao']
-
-        print(f"\n[*] Processando aba: {nome_aba.upper()}")
-        print(f"   Total de linhas: {len(df)}")
-        print(f"   Status padrao: {status_padrao}")
-
-        for idx, row in df.iterrows():
-            try:
-                operacao = migrar_operacao(row, refs, status_padrao)
-
-                # Validar campos obrigatórios
-                if not operacao['numero_emissao'] or operacao['numero_emissao'] == 'nan':
-                    print(f"   [!] Linha {idx+2}: Pulando (sem numero de emissao)")
-                    continue
+    for inicio in range(0, len(itens), tamanho_lote):
+        sucessos, erros = processar_lote(itens[inicio:inicio + tamanho_lote], enviar, acao, tentativas, progresso)
+        total_sucessos += sucessos
+        total_erros += erros
+
+    return total_sucessos, total_erros
+
+def remover_operacoes(ids: list):
+    """Remove operações por id, em lotes."""
+    for inicio in range(0, len(ids), TAMANHO_LOTE_REMOCAO):
+        lote = ids[inicio:inicio + TAMANHO_LOTE_REMOCAO]
+        with metricas.requisicao('delete'):
+            supabase.schema('estruturacao').table('operacoes').delete().in_('id', lote).execute()
+
+class Gravacao:
+    """Destino das escritas de uma execução.
+
+    Com concorrencia=1 grava na hora, em sequência, pelo cliente supabase-py.
+    Com concorrencia>1 os lotes vão para um EscritorParalelo: a leitura e a
+    conversão das próximas abas seguem enquanto os workers gravam, com um
+    pool HTTP compartilhado e limite de requisições por segundo.
+    """
+
+    def __init__(self, tamanho_lote: int = TAMANHO_LOTE_PADRAO, concorrencia: int = 1,
+                 max_req_por_segundo: float = MAX_REQ_POR_SEGUNDO_PADRAO, diario: DiarioMigracao = None):
+        self.tamanho_lote = tamanho_lote
+        self.diario = diario
+        self.total_sucessos = 0
+        self.total_erros = 0
+        self.cliente_http = None
+        self.escritor = None
+        self.progresso = Progresso('escrita')
+        self._inserir, self._atualizar = inserir_lote, atualizar_lote
+
+        if concorrencia > 1:
+            self.cliente_http = ClientePostgrest(SUPABASE_URL, SUPABASE_KEY, max_conexoes=concorrencia,
+                                                 limitador=LimitadorTaxa(max_req_por_segundo), metricas=metricas)
+            self._inserir = lambda registros: self.cliente_http.inserir('operacoes', para_banco(registros))
+            self._atualizar = lambda registros: self.cliente_http.upsert('operacoes', para_banco(registros),
+                                                                         on_conflict='id')
+            self.escritor = EscritorParalelo(partial(processar_lote, progresso=self.progresso),
+                                             concorrencia, tamanho_lote)
+
+    def _gravar(self, itens: list, enviar, acao: str):
+        self.progresso.adicionar_total(len(itens))
+        # Na escrita concorrente, mede só a espera por vaga na fila (backpressure)
+        with metricas.etapa('escrita'):
+            if self.escritor:
+                self.escritor.escrever(itens, enviar, acao)
+                return
+            sucessos, erros = inserir_em_lotes(itens, enviar=enviar, tamanho_lote=self.tamanho_lote, acao=acao,
+                                               progresso=self.progresso)
+        self.total_sucessos += sucessos
+        self.total_erros += erros
+
+    def inserir(self, itens: list, aba: str = None):
+        enviar = self._inserir
+        if self.diario and aba:
+            enviar = self.diario.registrando(aba, itens, enviar)
+        self._gravar(itens, enviar, 'inseridas')
+
+    def atualizar(self, itens: list):
+        self._gravar(itens, self._atualizar, 'atualizadas')
+
+    def finalizar(self):
+        """Espera as escritas pendentes e retorna (total_sucessos, total_erros)."""
+        if self.escritor:
+            with metricas.etapa('escrita'):
+                sucessos, erros = self.escritor.finalizar()
+            self.total_sucessos += sucessos
+            self.total_erros += erros
+            self.cliente_http.fechar()
+        self.progresso.finalizar()
+        return self.total_sucessos, self.total_erros
+
+def sincronizar_operacoes(itens: list, gravacao: Gravacao, remover_ausentes=False, preservar=()):
+    """Grava apenas o que mudou em relação ao banco.
+
+    Baixa as operações existentes uma vez, compara por hash de conteúdo
+    (chave numero_emissao) e envia só inserts de novas e upserts de
+    alteradas. Com remover_ausentes, apaga as operações que não estão mais
+    na planilha. Emissões em `preservar` (linhas em quarentena) ficam como
+    estão no banco. Retorna o número de erros nas remoções; os resultados
+    das gravações são somados em `gravacao`.
+    """
+    print("\n[*] Sincronizando com o banco (somente diferencas)...")
+    itens, repetidos = deduplicar(itens)
+    if repetidos:
+        print(f"   [!] {repetidos} linhas repetidas por numero de emissao (vale a ultima aba)")
+
+    with metricas.etapa('sincronizacao'):
+        existentes = buscar_existentes(supabase)
+    presentes = {registro['numero_emissao'] for _, registro in itens}
+    for numero in set(preservar) - presentes:
+        existentes.pop(numero, None)
+    diff = calcular_diff(itens, existentes)
+    print(f"   Novas: {len(diff['novos'])} | Alteradas: {len(diff['alterados'])} | "
+          f"Inalteradas: {diff['inalterados']} | Ausentes na planilha: {len(diff['ausentes'])}")
+
+    gravacao.inserir(diff['novos'])
+    gravacao.atualizar(diff['alterados'])
+
+    if remover_ausentes and diff['ausentes']:
+        try:
+            remover_operacoes(diff['ausentes'])
+            print(f"   [OK] {len(diff['ausentes'])} operacoes ausentes removidas")
+        except Exception as e:
+            print(f"   [X] Erro ao remover operacoes ausentes: {str(e)}")
+            return 1
+    return 0
+
+def converter_aba(df: pd.DataFrame, refs, status_padrao: str, mapeamento: dict = None) -> dict:
+    """{'status_padrao', 'operacoes': [(linha, operação ou erro)]} de uma aba lida."""
+    operacoes = transformar_aba(df, refs, status_padrao, falhas_conversao, mapeamento)
+    return {
+        'status_padrao': status_padrao,
+        'operacoes': [(idx + 2, operacao) for idx, operacao in zip(df.index, operacoes)],
+    }
 
-                # Inserir no Supabase
-                result = supabase.schema('estruturacao').table('operacoes').insert(operacao).execute()
+def iterar_abas_convertidas(caminho: str, refs, motor: str = 'auto', usar_cache=True, perfil: dict = None):
+    """Lê e converte as abas da planilha, reaproveitando o cache local quando possível.
+
+    Gera (chave, {'status_padrao', 'operacoes': [(linha, operação ou erro)]})
+    à medida que cada aba fica pronta, para que a gravação da primeira comece
+    enquanto as seguintes são convertidas. Com o cache, uma planilha já vista
+    (mesmo hash de arquivo, mesma versão da transformação e mesmas
+    referências) não é lida nem convertida de novo; os relatórios de
+    referências e de conversão gravados com ela são somados a `refs` e a
+    falhas_conversao.
+
+    `perfil` ({chave da aba: mapeamento}, ver perfil_planilha.ler_mapeamento)
+    fixa as colunas e os formatos de cada aba em vez de detectá-los; como o
+    cache de registros não guarda o mapeamento usado, com perfil só as abas
+    lidas são reaproveitadas.
+    """
+    cache = None
+    if usar_cache and CACHE_DISPONIVEL:
+        with metricas.etapa('leitura'):
+            cache = CachePlanilha(caminho)
+            relatorios = cache.ler_relatorios(refs) if perfil is None else None
+            resultado = cache.ler_registros(refs) if relatorios is not None else None
+        if resultado is not None:
+            print(f"[*] Planilha inalterada desde a ultima execucao: usando cache ({caminho})")
+            # Os relatórios que a conversão teria preenchido vêm junto com os registros
+            for resolvedor, relatorio in zip(refs, relatorios['referencias']):
+                resolvedor.incorporar(relatorio)
+            falhas_conversao.incorporar(relatorios['falhas_conversao'])
+            yield from resultado.items()
+            return
+
+    with metricas.etapa('leitura'):
+        dados = cache.ler_abas() if cache else None
+    if dados is not None:
+        print(f"[*] Abas lidas do cache: {list(dados)}")
+    else:
+        dados = carregar_planilha(caminho, motor)
+        if cache and dados:
+            with metricas.etapa('cache'):
+                cache.gravar_abas(dados)
+
+    for chave, config in dados.items():
+        with metricas.etapa('conversao'):
+            convertida = converter_aba(config['df'], refs, config['status_padrao'],
+                                       (perfil or {}).get(chave))
+        if cache and perfil is None:
+            with metricas.etapa('cache'):
+                cache.gravar_registros(refs, {chave: convertida})
+        yield chave, convertida
+
+    if cache and perfil is None and dados:
+        # Estado dos relatórios após todas as abas; resolvedores e falhas_conversao começam vazios na execução
+        cache.gravar_relatorios(refs, {
+            'referencias': [resolvedor.relatorio() for resolvedor in refs],
+            'falhas_conversao': falhas_conversao.resumo(),
+        })
+    if cache and dados:
+        limpar_cache(cache.diretorio_raiz)
+
+def transformar_planilha(caminho: str, refs, motor: str = 'auto', usar_cache=True) -> dict:
+    """Versão não incremental de iterar_abas_convertidas: {chave: aba convertida}."""
+    return dict(iterar_abas_convertidas(caminho, refs, motor, usar_cache))
+
+def executar_migracao(caminho_planilha: str, limpar_antes=True, tamanho_lote: int = TAMANHO_LOTE_PADRAO,
+                      motor: str = 'auto', sincronizar=False, remover_ausentes=False, usar_cache=True,
+                      concorrencia: int = 1, max_req_por_segundo: float = MAX_REQ_POR_SEGUNDO_PADRAO,
+                      atualizar_referencias=False, similaridade_minima: float = SIMILARIDADE_MINIMA,
+                      arquivo_quarentena: str = None, permitir_duplicados=False, carga_em_massa=False,
+                      retomar=False, arquivo_relatorio: str = None, arquivo_openmetrics: str = None,
+                      arquivo_perfil: str = None):
+    """Executa a migração completa.
+
+    Com sincronizar=True a tabela não é limpa: só linhas novas ou
+    alteradas são gravadas (ver sincronizar_operacoes). Com concorrencia>1
+    os lotes são gravados em paralelo (ver Gravacao). Linhas recusadas pela
+    validação não chegam ao banco e vão para `arquivo_quarentena`
+    (JSONL, ou CSV pela extensão; padrão em scripts/quarentena/).
+    Com carga_em_massa=True auditoria, pendências, analistas e sincronização
+    com emissoes são feitos por conjunto no fim, e não linha a linha.
+    Fora da sincronização, cada lote gravado entra no diário da planilha;
+    com retomar=True uma execução interrompida continua de onde parou,
+    sem limpar a tabela e sem regravar o que já está no banco.
+    Tempo por etapa, latência das requisições e erros de gravação vão para
+    `arquivo_relatorio` (JSON; padrão em scripts/relatorios/) e, se pedido,
+    para `arquivo_openmetrics`. Com `arquivo_perfil` (gerado por
+    check_excel.py --perfil) as colunas e os formatos de números e datas
+    vêm do perfil, sem detecção por coluna.
+    """
+    metricas.reiniciar({
+        'planilha': os.path.abspath(caminho_planilha), 'limpar_antes': limpar_antes,
+        'tamanho_lote': tamanho_lote, 'motor': motor, 'sincronizar': sincronizar,
+        'remover_ausentes': remover_ausentes, 'usar_cache': usar_cache, 'concorrencia': concorrencia,
+        'max_req_por_segundo': max_req_por_segundo, 'carga_em_massa': carga_em_massa, 'retomar': retomar,
+        'perfil': arquivo_perfil,
+    })
+    falhas_conversao.limpar()
+    print("\n" + "="*60)
+    print(">> INICIANDO MIGRACAO DE DADOS")
+    print("="*60)
 
-                print(f"   [OK] Linha {idx+2}: {operacao['numero_emissao']} - {operacao['nome_operacao']} ({operacao['status']})")
-                total_sucessos += 1
+    perfil = ler_mapeamento(arquivo_perfil, caminho_planilha) if arquivo_perfil else None
+    if perfil is not None:
+        print(f"[*] Colunas e formatos de numeros/datas do perfil: {arquivo_perfil}")
 
-            except Exception as e:
-                print(f"   [X] Linha {idx+2}: ERRO - {str(e)}")
-                total_erros += 1
+    # A sincronização já compara com o banco e grava só o que falta: não precisa de diário
+    diario = estado = None
+    if sincronizar:
+        if retomar:
+            print("[!] --sincronizar ja grava so as diferencas; --retomar ignorado")
+    else:
+        diario = DiarioMigracao(caminho_planilha)
+        if retomar:
+            estado = diario.retomar()
+            if estado is None:
+                return
+            if limpar_antes and not estado['limpeza']:
+                print("[!] A execucao interrompida nao chegou a limpar a tabela: recomecando do inicio")
+                estado = None
+        if estado is None:
+            diario.iniciar()
+
+    # Com carga em massa os triggers por linha ficam suspensos até finalizar_carga_em_massa
+    if carga_em_massa:
+        iniciar_carga_em_massa()
+
+    status = 'falhou'
+    try:
+        # Limpar dados antigos se solicitado (a retomada continua sobre o que já foi gravado)
+        if limpar_antes and not sincronizar and estado is None:
+            with metricas.etapa('limpeza'):
+                if limpar_dados_antigos():
+                    diario.registrar_limpeza()
+
+        # Ocorrências no banco além das do diário: lote gravado cuja confirmação se perdeu
+        ja_gravadas = 0
+        if estado is not None:
+            print(f"\n[*] Retomando a execucao de {estado['iniciada_em']}: "
+                  f"{sum(estado['gravados'].values())} linhas ja gravadas em {estado['lotes']} lotes")
+            with metricas.etapa('sincronizacao'):
+                no_banco = Counter({numero: len(linhas) for numero, linhas in buscar_existentes(supabase).items()})
+            no_banco -= Counter(numero for _, numero in estado['gravados'].elements())
+
+        # Buscar referências
+        with metricas.etapa('referencias'):
+            refs = buscar_referencias(atualizar_referencias, similaridade_minima)
+
+        # Erros de conversão e linhas inválidas vão para a quarentena; as gravações são contadas em Gravacao
+        total_erros = 0
+        itens_sincronizacao = []
+        abas_processadas = 0
+        gravacao = Gravacao(tamanho_lote, concorrencia, max_req_por_segundo, diario)
+        validador = Validador(arquivo_quarentena, permitir_duplicados)
+
+        # Carregar, converter, validar e migrar cada aba
+        abas = iterar_abas_convertidas(caminho_planilha, refs, motor, usar_cache, perfil)
+        if not permitir_duplicados:
+            # A cópia que vale de cada emissão (a da última aba) só se sabe com todas as abas convertidas
+            abas = list(abas)
+            validador.definir_precedencia((chave, config['operacoes']) for chave, config in abas)
+        for nome_aba, config in abas:
+            abas_processadas += 1
+            operacoes = config['operacoes']
+            status_padrao = config['status_padrao']
+
+            print(f"\n[*] Processando aba: {nome_aba.upper()}")
+            print(f"   Total de linhas: {len(operacoes)}")
+            print(f"   Status padrao: {status_padrao}")
+
+            with metricas.etapa('validacao'):
+                itens = validador.filtrar(nome_aba, operacoes)
+
+            if sincronizar:
+                itens_sincronizacao.extend(itens)
+                continue
+
+            if estado is not None:
+                itens, pulados = filtrar_pendentes(nome_aba, itens, estado['gravados'], no_banco)
+                ja_gravadas += pulados
+                metricas.contar('linhas_ja_gravadas', pulados)
+                print(f"   Ja gravadas antes da interrupcao: {pulados}")
+
+            # Inserir no Supabase em lotes
+            gravacao.inserir(itens, nome_aba)
+
+        validador.fechar()
+        metricas.contar('linhas_quarentena', validador.recusados)
+
+        if abas_processadas:
+            print("\n[*] Referencias da planilha:")
+            imprimir_relatorio_referencias(refs)
+            print("\n[*] Numeros e datas:")
+            falhas_conversao.imprimir()
+            print("\n[*] Validacao:")
+            validador.imprimir_resumo()
+
+        if sincronizar and abas_processadas:
+            total_erros += sincronizar_operacoes(itens_sincronizacao, gravacao, remover_ausentes,
+                                                 preservar=validador.numeros_recusados)
+
+        total_sucessos, erros_gravacao = gravacao.finalizar()
+        total_erros += erros_gravacao
+        if diario and abas_processadas:
+            diario.concluir(erros_gravacao)
+        status = 'concluida'
+    finally:
+        if carga_em_massa:
+            with metricas.etapa('finalizacao'):
+                finalizar_carga_em_massa()
+        # O relatório sai mesmo quando a carga cai no meio: é quando ele mais importa
+        metricas.contar('valores_nao_convertidos', falhas_conversao.total)
+        for gravado in metricas.gravar(arquivo_relatorio or caminho_relatorio_padrao(), arquivo_openmetrics,
+                                       status=status, valores_nao_convertidos=falhas_conversao.resumo()):
+            print(f"\n[*] Metricas da execucao em {gravado}")
+
+    if not abas_processadas:
+        print("[ERROR] Nenhuma aba valida encontrada na planilha!")
+        return
 
     # Resumo
     print("\n" + "="*60)
@@ -286,17 +599,70 @@ def executar_migracao(caminho_planilha: str, limpar_antes=True):
     print("="*60)
     print(f"[OK] Sucessos: {total_sucessos}")
     print(f"[X] Erros: {total_erros}")
-    print(f"[*] Total processado: {total_sucessos + total_erros}")
+    print(f"[!] Quarentena: {validador.recusados}")
+    if estado is not None:
+        print(f"[*] Ja gravadas antes da interrupcao: {ja_gravadas}")
+    print(f"[*] Total processado: {total_sucessos + total_erros + validador.recusados + ja_gravadas}")
+    print("\n[*] Tempo por etapa e latencia das requisicoes:")
+    metricas.imprimir_resumo()
     print("="*60)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migra a planilha Excel para o schema estruturacao")
+    parser.add_argument("caminho", nargs="?", default="Pipe - Overview (3).xlsx",
+                        help="Caminho da planilha")
+    parser.add_argument("--tamanho-lote", type=int, default=TAMANHO_LOTE_PADRAO,
+                        help=f"Linhas por requisicao de insert (padrao: {TAMANHO_LOTE_PADRAO})")
+    parser.add_argument("--motor", choices=MOTORES, default="auto",
+                        help="Leitor do Excel: calamine e mais rapido (padrao: auto)")
+    parser.add_argument("--sincronizar", action="store_true",
+                        help="Grava apenas operacoes novas ou alteradas, sem limpar a tabela")
+    parser.add_argument("--remover-ausentes", action="store_true",
+                        help="Com --sincronizar, remove operacoes que nao estao mais na planilha")
+    parser.add_argument("--sem-cache", action="store_true",
+                        help="Ignora o cache local e le/converte a planilha de novo")
+    parser.add_argument("--concorrencia", type=int, default=1,
+                        help="Workers gravando lotes em paralelo (padrao: 1, sequencial)")
+    parser.add_argument("--max-req-por-segundo", type=float, default=MAX_REQ_POR_SEGUNDO_PADRAO,
+                        help=f"Teto de requisicoes/s somando os workers (padrao: {MAX_REQ_POR_SEGUNDO_PADRAO})")
+    parser.add_argument("--atualizar-referencias", action="store_true",
+                        help="Ignora o cache local e busca categorias/veiculos/usuarios/analistas no banco")
+    parser.add_argument("--similaridade-minima", type=float, default=SIMILARIDADE_MINIMA,
+                        help="Aceita nomes aproximados com similaridade (trigramas) a partir deste valor, ex.: 0.6 "
+                             "(padrao: 0, desativado)")
+    parser.add_argument("--quarentena", default=None,
+                        help="Arquivo das linhas recusadas pela validacao, .jsonl ou .csv (padrao: scripts/quarentena/)")
+    parser.add_argument("--permitir-duplicados", action="store_true",
+                        help="Grava todas as ocorrencias de um numero_emissao em vez de mandar as repetidas para a quarentena")
+    parser.add_argument("--carga-em-massa", action="store_true",
+                        help="Suspende os triggers por linha de operacoes e aplica auditoria/pendencias/emissoes por conjunto no fim")
+    parser.add_argument("--retomar", "--resume", action="store_true",
+                        help="Continua a ultima execucao interrompida desta planilha, sem limpar a tabela nem regravar linhas")
+    parser.add_argument("--relatorio", default=None,
+                        help="Arquivo JSON com tempo por etapa, latencia das requisicoes e erros (padrao: scripts/relatorios/)")
+    parser.add_argument("--openmetrics", default=None,
+                        help="Grava tambem as metricas no formato OpenMetrics (ex.: textfile collector do node_exporter)")
+    parser.add_argument("--perfil", default=None,
+                        help="Perfil JSON de check_excel.py --perfil: usa as colunas e formatos dele em vez de detecta-los")
+    args = parser.parse_args()
+
     # Caminho da planilha
-    caminho = "Pipe - Overview (3).xlsx"
+    caminho = args.caminho
 
     if not os.path.exists(caminho):
         print(f"[ERROR] Arquivo nao encontrado: {caminho}")
         print(f"   Procurando em: {os.getcwd()}")
         sys.exit(1)
 
-    executar_migracao(caminho)
+    executar_migracao(caminho, tamanho_lote=args.tamanho_lote, motor=args.motor,
+                      sincronizar=args.sincronizar, remover_ausentes=args.remover_ausentes,
+                      usar_cache=not args.sem_cache, concorrencia=args.concorrencia,
+                      max_req_por_segundo=args.max_req_por_segundo,
+                      atualizar_referencias=args.atualizar_referencias,
+                      similaridade_minima=args.similaridade_minima,
+                      arquivo_quarentena=args.quarentena,
+                      permitir_duplicados=args.permitir_duplicados,
+                      carga_em_massa=args.carga_em_massa, retomar=args.retomar,
+                      arquivo_relatorio=args.relatorio, arquivo_openmetrics=args.openmetrics,
+                      arquivo_perfil=args.perfil)
     print("\n[*] Migracao concluida!")
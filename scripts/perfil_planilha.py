@@ -0,0 +1,332 @@
+"""
+Perfil da Planilha - Tipos, Formatos e Cardinalidade por Coluna
+Descrição: Percorre cada aba em blocos de linhas (openpyxl read_only, memória constante),
+           infere o tipo e o formato de cada coluna, estima os valores distintos com
+           HyperLogLog e aponta as colunas que os conversores da migração não vão
+           conseguir interpretar; o JSON gerado serve de mapeamento para migrate_data
+"""
+
+import hashlib
+import json
+import math
+import os
+from collections import Counter
+from datetime import date, datetime, time as hora
+
+from openpyxl import load_workbook
+
+from cache_planilha import hash_arquivo
+from conversores import (
+    AMOSTRA_DETECCAO,
+    TEXTOS_SEM_VALOR,
+    detectar_formato_data,
+    detectar_formato_numero,
+    interpretar_data,
+    interpretar_numero,
+    valor_data,
+    valor_numerico,
+)
+from leitor_planilha import ABAS_MIGRACAO
+from transformacao import ALIASES_COLUNAS, VERSAO_TRANSFORMACAO
+
+# Linhas lidas por vez de cada aba
+TAMANHO_BLOCO = 5000
+
+# Fração dos valores preenchidos que define o tipo da coluna; abaixo disso ela é 'misto'
+LIMIAR_TIPO = 0.9
+
+# Registradores do HyperLogLog = 2^PRECISAO (4096: ~1,6% de erro, 4 KB por coluna)
+PRECISAO_HLL = 12
+
+# Exemplos guardados por coluna (valores e falhas de conversão)
+MAX_EXEMPLOS = 5
+
+# Campos da migração e o conversor que migrar_operacao aplica em cada um
+CONVERSORES_CAMPO = {
+    'volume': ('numero', valor_numerico),
+    'fee_estruturacao': ('numero', valor_numerico),
+    'data_entrada': ('data', valor_data),
+    'previsao_liquidacao': ('data', valor_data),
+    'data_liquidacao': ('data', valor_data),
+    'primeira_pagamento': ('data', valor_data),
+}
+
+class HyperLogLog:
+    """Estimativa de valores distintos em memória fixa (2^precisao registradores de 1 byte)."""
+
+    def __init__(self, precisao: int = PRECISAO_HLL):
+        self.precisao = precisao
+        self.m = 1 << precisao
+        self.registradores = bytearray(self.m)
+
+    def adicionar(self, valor):
+        chave = f"{type(valor).__name__}:{valor}".encode('utf-8')
+        h = int.from_bytes(hashlib.blake2b(chave, digest_size=8).digest(), 'big')
+        indice = h >> (64 - self.precisao)
+        resto = h & ((1 << (64 - self.precisao)) - 1)
+        # Posição do primeiro bit 1 nos bits restantes (1 = bit mais alto)
+        rank = (64 - self.precisao) - resto.bit_length() + 1
+        if rank > self.registradores[indice]:
+            self.registradores[indice] = rank
+
+    def estimativa(self) -> int:
+        m = self.m
+        alfa = 0.7213 / (1 + 1.079 / m)
+        bruta = alfa * m * m / sum(2.0 ** -r for r in self.registradores)
+        zeros = self.registradores.count(0)
+        if bruta <= 2.5 * m and zeros:
+            # Poucos valores: contagem linear é mais precisa
+            return round(m * math.log(m / zeros))
+        return round(bruta)
+
+def _categoria(valor) -> str:
+    """Tipo de uma célula preenchida: numero, booleano, data, moeda, numero_texto, data_texto, sem_valor ou texto."""
+    if isinstance(valor, bool):
+        return 'booleano'
+    if isinstance(valor, (int, float)):
+        return 'numero'
+    if isinstance(valor, (datetime, date, hora)):
+        return 'data'
+    texto = str(valor).strip()
+    if texto.casefold() in TEXTOS_SEM_VALOR:
+        return 'sem_valor'
+    try:
+        interpretar_numero(texto)
+        return 'moeda' if '$' in texto else 'numero_texto'
+    except ValueError:
+        pass
+    try:
+        interpretar_data(texto)
+        return 'data_texto'
+    except ValueError:
+        return 'texto'
+
+class PerfilColuna:
+    """Estatísticas de uma coluna, atualizadas bloco a bloco."""
+
+    def __init__(self, nome: str, campo: str = None):
+        self.nome = nome
+        self.campo = campo
+        self.linhas = 0
+        self.vazios = 0
+        self.categorias = Counter()
+        self.distintos = HyperLogLog()
+        self.exemplos = []
+        # Primeiros textos distintos, a mesma amostra que converter_numeros/converter_datas usam
+        self.textos = {}
+        self.falhas = 0
+        self.exemplos_falha = []
+        self.conversor = CONVERSORES_CAMPO.get(campo, (None, None))[1]
+
+    def atualizar(self, valores, primeira_linha: int):
+        for deslocamento, valor in enumerate(valores):
+            self.linhas += 1
+            if valor is None or (isinstance(valor, str) and not valor.strip()):
+                self.vazios += 1
+                continue
+
+            categoria = _categoria(valor)
+            self.categorias[categoria] += 1
+            self.distintos.adicionar(valor)
+            if len(self.exemplos) < MAX_EXEMPLOS and valor not in self.exemplos:
+                self.exemplos.append(valor)
+
+            if isinstance(valor, str) and categoria != 'sem_valor' and len(self.textos) < AMOSTRA_DETECCAO:
+                self.textos.setdefault(valor.strip(), None)
+
+            if self.conversor is not None:
+                try:
+                    self.conversor(valor)
+                except ValueError:
+                    self.falhas += 1
+                    if len(self.exemplos_falha) < MAX_EXEMPLOS:
+                        self.exemplos_falha.append({'linha': primeira_linha + deslocamento, 'valor': str(valor)})
+
+    def tipo(self) -> str:
+        preenchidos = sum(quantidade for categoria, quantidade in self.categorias.items() if categoria != 'sem_valor')
+        if not preenchidos:
+            return 'vazio'
+        categoria, quantidade = self.categorias.most_common(1)[0]
+        if categoria == 'sem_valor':
+            categoria, quantidade = self.categorias.most_common(2)[1]
+        return categoria if quantidade >= LIMIAR_TIPO * preenchidos else 'misto'
+
+    def resumo(self) -> dict:
+        return {
+            'campo': self.campo,
+            'tipo': self.tipo(),
+            'tipos': dict(self.categorias.most_common()),
+            'linhas': self.linhas,
+            'vazios': self.vazios,
+            'distintos_aprox': self.distintos.estimativa() if self.linhas > self.vazios else 0,
+            'formato_numero': (detectar_formato_numero(self.textos)
+                               if self.categorias['moeda'] or self.categorias['numero_texto'] else None),
+            'formato_data': detectar_formato_data(self.textos),
+            'falhas_conversao': self.falhas,
+            'exemplos_falha': self.exemplos_falha,
+            'exemplos': [str(exemplo) for exemplo in self.exemplos],
+        }
+
+def _nomes_colunas(cabecalho) -> list:
+    """Nomes como o pandas daria: 'Unnamed: i' para células vazias e sufixo .N para repetidos."""
+    nomes, vistos = [], Counter()
+    for i, celula in enumerate(cabecalho):
+        nome = f"Unnamed: {i}" if celula is None or str(celula).strip() == '' else str(celula)
+        if vistos[nome]:
+            nomes.append(f"{nome}.{vistos[nome]}")
+        else:
+            nomes.append(nome)
+        vistos[nome] += 1
+    return nomes
+
+def _campos(nomes: list) -> dict:
+    """nome da coluna → campo da migração, pela mesma regra de resolver_colunas."""
+    presentes = set(nomes)
+    campos = {}
+    for campo, aliases in ALIASES_COLUNAS.items():
+        coluna = next((nome for nome in aliases if nome in presentes), None)
+        if coluna is not None:
+            campos[coluna] = campo
+    return campos
+
+def perfilar_aba(planilha, aba: str, header: int = 0, amostra: int = None,
+                 tamanho_bloco: int = TAMANHO_BLOCO) -> dict:
+    """Perfil de uma aba lida em blocos de `tamanho_bloco` linhas; com `amostra`, só as primeiras linhas de dados.
+
+    Linhas totalmente vazias são ignoradas (o pandas também descarta as do fim).
+    """
+    linhas = planilha[aba].iter_rows(min_row=header + 1, values_only=True)
+    cabecalho = next(linhas, None)
+    if cabecalho is None:
+        return {'linha_cabecalho': header + 1, 'linhas': 0, 'amostrada': False, 'colunas': {}}
+
+    nomes = _nomes_colunas(cabecalho)
+    campos = _campos(nomes)
+    perfis = [PerfilColuna(nome, campos.get(nome)) for nome in nomes]
+
+    lidas = 0
+    amostrada = False
+    bloco, primeira_linha = [], None
+    # Número da linha no Excel (a do cabeçalho é header + 1)
+    for numero_linha, linha in enumerate(linhas, start=header + 2):
+        if all(valor is None for valor in linha):
+            continue
+        if amostra is not None and lidas >= amostra:
+            amostrada = True
+            break
+        if primeira_linha is None:
+            primeira_linha = numero_linha
+        bloco.append((numero_linha, linha))
+        lidas += 1
+        if len(bloco) >= tamanho_bloco:
+            _processar_bloco(perfis, bloco)
+            bloco = []
+    if bloco:
+        _processar_bloco(perfis, bloco)
+
+    colunas = {}
+    for perfil in perfis:
+        # Colunas sem cabeçalho e sem valor são só a formatação do Excel se estendendo
+        if perfil.nome.startswith('Unnamed: ') and perfil.linhas == perfil.vazios:
+            continue
+        colunas[perfil.nome] = perfil.resumo()
+    return {'linha_cabecalho': header + 1, 'linhas': lidas, 'amostrada': amostrada, 'colunas': colunas}
+
+def _processar_bloco(perfis: list, bloco: list):
+    """Atualiza cada coluna com os valores do bloco; linhas não contíguas (vazias puladas) ficam por linha."""
+    numeros = [numero for numero, _ in bloco]
+    contiguo = numeros[-1] - numeros[0] == len(numeros) - 1
+    for indice, perfil in enumerate(perfis):
+        valores = [linha[indice] if indice < len(linha) else None for _, linha in bloco]
+        if contiguo:
+            perfil.atualizar(valores, numeros[0])
+        else:
+            for numero, valor in zip(numeros, valores):
+                perfil.atualizar((valor,), numero)
+
+def mapeamento_migracao(colunas: dict) -> dict:
+    """{campo: {'coluna', 'formato'}} dos campos da migração presentes em `colunas` (perfil de uma aba)."""
+    mapeamento = {}
+    for nome, coluna in colunas.items():
+        campo = coluna['campo']
+        if campo is None:
+            continue
+        tipo_conversor = CONVERSORES_CAMPO.get(campo, (None,))[0]
+        formato = None
+        if tipo_conversor == 'numero':
+            formato = coluna['formato_numero']
+        elif tipo_conversor == 'data':
+            formato = coluna['formato_data']
+        mapeamento[campo] = {'coluna': nome, 'formato': formato}
+    return mapeamento
+
+def perfilar_planilha(caminho: str, amostra: int = None, tamanho_bloco: int = TAMANHO_BLOCO,
+                      somente_migracao: bool = False) -> dict:
+    """Perfil de todas as abas (ou só das de ABAS_MIGRACAO), com o mapeamento reaproveitável pela migração."""
+    planilha = load_workbook(caminho, read_only=True, data_only=True)
+    cabecalhos = {aba: header for aba, header, _ in ABAS_MIGRACAO.values()}
+    chaves = {aba: chave for chave, (aba, _, _) in ABAS_MIGRACAO.items()}
+    try:
+        abas = {}
+        mapeamento = {}
+        for aba in planilha.sheetnames:
+            if somente_migracao and aba not in chaves:
+                continue
+            perfil = perfilar_aba(planilha, aba, cabecalhos.get(aba, 0), amostra, tamanho_bloco)
+            perfil['chave'] = chaves.get(aba)
+            abas[aba] = perfil
+            if aba in chaves:
+                mapeamento[chaves[aba]] = mapeamento_migracao(perfil['colunas'])
+    finally:
+        planilha.close()
+
+    return {
+        'arquivo': os.path.abspath(caminho),
+        'hash': hash_arquivo(caminho),
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'versao_transformacao': VERSAO_TRANSFORMACAO,
+        'amostra': amostra,
+        'abas': abas,
+        'mapeamento': mapeamento,
+    }
+
+def gravar_perfil(perfil: dict, caminho: str):
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        json.dump(perfil, arquivo, indent=2, ensure_ascii=False, default=str)
+
+def ler_mapeamento(caminho_perfil: str, caminho_planilha: str):
+    """Mapeamento {chave da aba: {campo: {'coluna', 'formato'}}} de um perfil, ou None (com o motivo impresso).
+
+    O perfil só vale para o mesmo arquivo (hash) e a mesma versão da
+    transformação. Perfis amostrados também valem: o formato vem das
+    primeiras linhas, as mesmas que a detecção por coluna consultaria.
+    """
+    try:
+        with open(caminho_perfil, encoding='utf-8') as arquivo:
+            perfil = json.load(arquivo)
+    except (OSError, ValueError) as e:
+        print(f"[!] Perfil ignorado: nao foi possivel ler {caminho_perfil} ({e})")
+        return None
+    if perfil.get('hash') != hash_arquivo(caminho_planilha):
+        print("[!] Perfil ignorado: gerado para outra versao da planilha (rode check_excel.py --perfil de novo)")
+        return None
+    if perfil.get('versao_transformacao') != VERSAO_TRANSFORMACAO:
+        print("[!] Perfil ignorado: gerado para outra versao da transformacao")
+        return None
+    return perfil.get('mapeamento') or {}
+
+def imprimir_perfil(perfil: dict):
+    for aba, dados in perfil['abas'].items():
+        amostra = f" (amostra: primeiras {perfil['amostra']})" if dados['amostrada'] else ''
+        print(f"\n📊 ABA: {aba} — {dados['linhas']} linhas{amostra}, cabeçalho na linha {dados['linha_cabecalho']}")
+        for nome, coluna in dados['colunas'].items():
+            preenchidos = coluna['linhas'] - coluna['vazios']
+            formato = coluna['formato_numero'] or coluna['formato_data'] or ''
+            campo = f"→ {coluna['campo']}" if coluna['campo'] else ''
+            print(f"   {nome[:34]:34s} {coluna['tipo']:12s} {preenchidos:6d} preench. "
+                  f"~{coluna['distintos_aprox']:<6d} distintos {formato:10s} {campo}")
+            if coluna['falhas_conversao']:
+                exemplos = ', '.join(f"L{falha['linha']} {falha['valor']!r}" for falha in coluna['exemplos_falha'][:3])
+                print(f"      ⚠️  {coluna['falhas_conversao']} valores que o conversor de {coluna['campo']} "
+                      f"nao interpreta (ex.: {exemplos})")
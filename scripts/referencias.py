@@ -0,0 +1,173 @@
+"""
+Resolução de Referências
+Descrição: Índices normalizados (caixa, acentos e espaços) para categorias, veículos,
+           usuários e analistas, com fallback por similaridade de trigramas, cache
+           local com validade e relatório dos nomes não resolvidos
+"""
+
+import json
+import os
+import time
+import unicodedata
+from collections import Counter
+
+import pandas as pd
+
+ARQUIVO_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'referencias.json')
+
+# Validade do cache local de referências
+TTL_SEGUNDOS = 3600
+
+# Similaridade de Jaccard mínima entre trigramas para aceitar um nome aproximado.
+# 0 (padrão) desativa o fallback: um nome aproximado errado vira FK errada sem
+# aviso; ative com --similaridade-minima (ex.: 0.6) e confira o relatório
+SIMILARIDADE_MINIMA = 0.0
+
+# Se o segundo candidato ficar a menos disso do primeiro, o nome não é resolvido
+# (ex.: 'Eduard' entre 'Eduardo' e 'Eduarda')
+MARGEM_SIMILARIDADE = 0.05
+
+def normalizar_nome(valor):
+    """Chave de comparação: sem acentos, casefold e espaços colapsados. None se vazio."""
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    texto = unicodedata.normalize('NFKD', str(valor))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = ' '.join(texto.casefold().split())
+    return texto or None
+
+def trigramas(texto: str) -> frozenset:
+    preenchido = f"  {texto} "
+    return frozenset(preenchido[i:i + 3] for i in range(len(preenchido) - 2))
+
+def similaridade(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+class ResolvedorReferencias:
+    """Mapa nome → id tolerante a diferenças de grafia.
+
+    Expõe get() como um dict, então pode substituir os mapas exatos em
+    migrar_operacao/transformar_aba. Cada valor distinto da planilha é
+    resolvido uma única vez (memo), então a busca por similaridade, que
+    percorre os nomes conhecidos, não pesa por célula.
+    """
+
+    def __init__(self, rotulo: str, nomes: dict, similaridade_minima: float = SIMILARIDADE_MINIMA):
+        self.rotulo = rotulo
+        self.nomes = dict(nomes)
+        self.similaridade_minima = similaridade_minima
+        self.indice = {}
+        self.ambiguos = set()
+        for nome, id_ in self.nomes.items():
+            chave = normalizar_nome(nome)
+            if chave is None:
+                continue
+            if chave in self.indice and self.indice[chave] != id_:
+                self.ambiguos.add(chave)
+                continue
+            self.indice[chave] = id_
+        self.trigramas = {chave: trigramas(chave) for chave in self.indice}
+        self.memo = {}
+        self.nao_resolvidos = Counter()
+        self.aproximados = {}
+
+    def _resolver(self, chave: str):
+        id_ = self.indice.get(chave)
+        if id_ is not None or not self.similaridade_minima:
+            return id_, None
+
+        alvo = trigramas(chave)
+        melhor, pontuacao, segunda = None, 0.0, 0.0
+        for candidato, grams in self.trigramas.items():
+            atual = similaridade(alvo, grams)
+            if atual > pontuacao:
+                melhor, pontuacao, segunda = candidato, atual, pontuacao
+            elif atual > segunda:
+                segunda = atual
+        if melhor is None or pontuacao < self.similaridade_minima:
+            return None, None
+        if pontuacao - segunda < MARGEM_SIMILARIDADE:
+            # Empate (ou quase) entre dois nomes conhecidos: melhor sem FK do que com a errada
+            return None, None
+        return self.indice[melhor], melhor
+
+    def get(self, valor, padrao=None):
+        chave = normalizar_nome(valor)
+        if chave is None:
+            return padrao
+
+        if chave not in self.memo:
+            id_, aproximado = self._resolver(chave)
+            self.memo[chave] = id_
+            if aproximado is not None:
+                self.aproximados[str(valor).strip()] = aproximado
+
+        id_ = self.memo[chave]
+        if id_ is None:
+            self.nao_resolvidos[str(valor).strip()] += 1
+            return padrao
+        return id_
+
+    def items(self):
+        """Pares nome → id de origem (usados na impressão digital do cache da planilha)."""
+        return self.nomes.items()
+
+    def __len__(self):
+        return len(self.nomes)
+
+    def relatorio(self) -> dict:
+        return {
+            'nao_resolvidos': dict(self.nao_resolvidos.most_common()),
+            'aproximados': dict(self.aproximados),
+            'ambiguos': sorted(self.ambiguos),
+        }
+
+    def incorporar(self, relatorio: dict):
+        """Soma o relatorio() de outro resolvedor das mesmas tabelas (ex.: de um processo do pool)."""
+        self.nao_resolvidos.update(relatorio['nao_resolvidos'])
+        self.aproximados.update(relatorio['aproximados'])
+
+def buscar_tabelas(cliente) -> dict:
+    """Lê as quatro tabelas de referência do banco como {nome: id}."""
+    # Buscar categorias
+    categorias_res = cliente.table('categorias').select('id, codigo').execute()
+    # Buscar veículos
+    veiculos_res = cliente.table('veiculos').select('id, sigla').execute()
+    # Buscar usuários
+    usuarios_res = cliente.table('user_profiles').select('id, nome').execute()
+    # Buscar analistas
+    analistas_res = cliente.schema('estruturacao').table('analistas_gestao').select('id, nome').execute()
+
+    return {
+        'categorias': {r['codigo']: r['id'] for r in categorias_res.data or []},
+        'veiculos': {r['sigla']: r['id'] for r in veiculos_res.data or []},
+        'usuarios': {r['nome']: r['id'] for r in usuarios_res.data or []},
+        'analistas': {r['nome']: r['id'] for r in analistas_res.data or []},
+    }
+
+def ler_cache(caminho: str = ARQUIVO_CACHE, ttl: float = TTL_SEGUNDOS):
+    """Tabelas de referência salvas há menos de `ttl` segundos, ou None."""
+    try:
+        with open(caminho, encoding='utf-8') as arquivo:
+            conteudo = json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+    if time.time() - conteudo.get('buscado_em', 0) > ttl:
+        return None
+    return conteudo['tabelas']
+
+def gravar_cache(tabelas: dict, caminho: str = ARQUIVO_CACHE):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        json.dump({'buscado_em': time.time(), 'tabelas': tabelas}, arquivo, ensure_ascii=False)
+
+def imprimir_relatorio(resolvedores):
+    """Lista nomes da planilha sem correspondência (viram FK NULL) e os aceitos por similaridade."""
+    for resolvedor in resolvedores:
+        relatorio = resolvedor.relatorio()
+        for nome, quantidade in relatorio['nao_resolvidos'].items():
+            print(f"   [!] {resolvedor.rotulo} sem correspondencia: '{nome}' ({quantidade} linhas)")
+        for nome, encontrado in relatorio['aproximados'].items():
+            print(f"   [~] {resolvedor.rotulo} aproximado: '{nome}' -> '{encontrado}'")
+        for chave in relatorio['ambiguos']:
+            print(f"   [!] {resolvedor.rotulo} ambiguo no banco: '{chave}' (mais de um id)")
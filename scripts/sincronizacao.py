@@ -0,0 +1,131 @@
+"""
+Sincronização Incremental - Planilha → estruturacao.operacoes
+Descrição: Compara os registros da planilha com o que já está no banco (hash de conteúdo
+           por numero_emissao) e envia apenas linhas novas ou alteradas
+"""
+
+import hashlib
+import json
+
+from transformacao import CAMPO_ENTRADA_ESTIMADA
+
+# Página usada para baixar as operações existentes (keyset por id)
+TAMANHO_PAGINA = 1000
+
+# Campos gravados pela migração (mesmas chaves de migrar_operacao/transformar_aba)
+CAMPOS_SINCRONIZADOS = (
+    'numero_emissao', 'nome_operacao', 'status', 'pmo_id', 'analista_gestao_id',
+    'categoria_id', 'veiculo_id', 'volume', 'empresa_cnpj', 'empresa_razao_social',
+    'data_entrada_pipe', 'data_previsao_liquidacao', 'data_liquidacao',
+    'data_primeira_pagamento', 'floating', 'proximos_passos', 'alertas', 'resumo',
+    'fee_estruturacao', 'fee_gestao', 'boletagem',
+)
+
+# Colunas date/timestamptz: comparadas pelo dia (o banco devolve '2024-01-02' ou
+# '2024-01-02T00:00:00+00:00' para o que a planilha gera como '2024-01-02T00:00:00')
+CAMPOS_DATA = ('data_entrada_pipe', 'data_previsao_liquidacao', 'data_liquidacao', 'data_primeira_pagamento')
+
+# Casas decimais das colunas numeric da tabela
+CASAS_DECIMAIS = {'volume': 2, 'fee_estruturacao': 4, 'fee_gestao': 4}
+
+def _normalizar(campo: str, valor):
+    """Leva o valor à forma em que o banco o armazena."""
+    if valor is None:
+        return None
+    if campo in CAMPOS_DATA:
+        return str(valor)[:10]
+    if campo in CASAS_DECIMAIS:
+        return round(float(valor), CASAS_DECIMAIS[campo])
+    if campo == 'floating':
+        return bool(valor)
+    return valor
+
+def hash_conteudo(registro: dict) -> str:
+    """Hash estável do conteúdo sincronizado de uma operação."""
+    normalizado = {campo: _normalizar(campo, registro.get(campo)) for campo in CAMPOS_SINCRONIZADOS}
+    conteudo = json.dumps(normalizado, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+def buscar_existentes(cliente) -> dict:
+    """Baixa as operações do banco uma vez, paginando por id.
+
+    Retorna {numero_emissao: [(id, hash, data_entrada_pipe), ...]}; a lista
+    cobre emissões que cargas antigas (delete-and-reload) gravaram mais de
+    uma vez.
+    """
+    existentes = {}
+    ultimo_id = None
+    colunas = ', '.join(('id',) + CAMPOS_SINCRONIZADOS)
+
+    while True:
+        consulta = cliente.schema('estruturacao').table('operacoes').select(colunas).order('id').limit(TAMANHO_PAGINA)
+        if ultimo_id is not None:
+            consulta = consulta.gt('id', ultimo_id)
+        pagina = consulta.execute().data or []
+
+        for linha in pagina:
+            existentes.setdefault(linha['numero_emissao'], []).append(
+                (linha['id'], hash_conteudo(linha), linha['data_entrada_pipe'])
+            )
+
+        if len(pagina) < TAMANHO_PAGINA:
+            return existentes
+        ultimo_id = pagina[-1]['id']
+
+def deduplicar(itens: list):
+    """Mantém uma operação por numero_emissao; a última ocorrência (ordem das abas) prevalece.
+
+    Recebe e devolve listas de (linha, registro). Também retorna quantas
+    linhas foram descartadas por repetição.
+    """
+    por_numero = {}
+    for linha, registro in itens:
+        por_numero[registro['numero_emissao']] = (linha, registro)
+    return list(por_numero.values()), len(itens) - len(por_numero)
+
+def calcular_diff(itens: list, existentes: dict) -> dict:
+    """Separa os registros da planilha em novos, alterados e inalterados.
+
+    itens deve estar deduplicado por numero_emissao. Registros alterados
+    recebem o 'id' da linha existente para o upsert. 'ausentes' são ids do
+    banco sem correspondente na planilha, incluindo cópias repetidas da
+    mesma emissão. Quando a data de entrada é estimada (o "agora" da
+    conversão, ver CAMPO_ENTRADA_ESTIMADA), vale a que já está no banco: ela
+    não conta como alteração nem é sobrescrita.
+    """
+    novos, alterados, ausentes = [], [], []
+    inalterados = 0
+    numeros_planilha = set()
+
+    for linha, registro in itens:
+        numero = registro['numero_emissao']
+        numeros_planilha.add(numero)
+        linhas_banco = existentes.get(numero)
+        if not linhas_banco:
+            novos.append((linha, registro))
+            continue
+
+        estimada = registro.get(CAMPO_ENTRADA_ESTIMADA)
+        hash_novo = None if estimada else hash_conteudo(registro)
+
+        def bate(hash_banco, entrada_banco):
+            if estimada:
+                return hash_banco == hash_conteudo({**registro, 'data_entrada_pipe': entrada_banco})
+            return hash_banco == hash_novo
+
+        # Mantém a cópia que já bate com a planilha; senão atualiza a primeira
+        mantido = next((id_ for id_, h, entrada in linhas_banco if bate(h, entrada)), None)
+        if mantido is not None:
+            inalterados += 1
+        else:
+            mantido, _, entrada_banco = linhas_banco[0]
+            if estimada:
+                registro = {**registro, 'data_entrada_pipe': entrada_banco}
+            alterados.append((linha, {'id': mantido, **registro}))
+        ausentes.extend(id_ for id_, _, _ in linhas_banco if id_ != mantido)
+
+    for numero, linhas_banco in existentes.items():
+        if numero not in numeros_planilha:
+            ausentes.extend(id_ for id_, _, _ in linhas_banco)
+
+    return {'novos': novos, 'alterados': alterados, 'inalterados': inalterados, 'ausentes': ausentes}
@@ -0,0 +1,359 @@
+"""
+Transformação de Dados - Planilha → estruturacao.operacoes
+Descrição: Conversões de valores da planilha e montagem dos registros de operações,
+           linha a linha (migrar_operacao) ou por aba inteira (transformar_aba)
+"""
+
+import pandas as pd
+from datetime import datetime
+
+from conversores import converter_datas, converter_numeros, valor_data, valor_numerico
+
+# Incrementar sempre que a conversão mudar: invalida o cache local de registros
+# (2: números no formato brasileiro e datas com o dia antes do mês;
+#  3: marcação da data de entrada estimada)
+VERSAO_TRANSFORMACAO = 3
+
+# Chave do registro que marca data_entrada_pipe preenchida com o "agora" da
+# conversão (linha sem data de entrada nem de liquidação). Não é coluna de
+# operacoes: sai do registro antes da gravação
+CAMPO_ENTRADA_ESTIMADA = '_data_entrada_estimada'
+
+# Aliases de colunas: o primeiro nome presente na aba é usado (mesma regra do
+# row.get(a, row.get(b)) de migrar_operacao)
+ALIASES_COLUNAS = {
+    'uid': ('UID',),
+    'emissao': ('Emissão', 'Numero Emissao'),
+    'data_entrada': ('Data de Entrada no Pipe', 'Data Entrada'),
+    'operacao': ('Operação', 'Nome Operacao'),
+    'status': ('Status',),
+    'pmo': ('PMO',),
+    'analista_gestao': ('Analista Gestão', 'Analista Gestao'),
+    'categoria': ('Categoria',),
+    'veiculo': ('Veículo', 'Veiculo'),
+    'volume': ('Volume',),
+    'cnpj': ('CNPJ',),
+    'razao_social': ('Razão Social', 'Razao Social'),
+    'previsao_liquidacao': ('Previsão de Liquidação', 'Previsao Liquidacao'),
+    'data_liquidacao': ('Data de Liquidação', 'Data Liquidacao'),
+    'primeira_pagamento': ('1ª Data de Pagamento', 'Primeira Data Pagamento'),
+    'floating': ('Floating',),
+    'proximos_passos': ('Próximos Passos', 'Proximos Passos'),
+    'alertas': ('Alertas',),
+    'resumo': ('Resumo',),
+    'fee_estruturacao': ('Fee Estruturação',),
+    'boletagem': ('Boletagem',),
+}
+
+# Valores de UID/Emissão que não identificam uma emissão
+UIDS_INVALIDOS = ['nan', 'NaT', 'None', '1°', '2°', '3°', 'N.A', 'Confirmar', '-']
+
+def converter_data(valor):
+    """Converte datas (datetime, data serial do Excel ou texto como "05/03/2024") para ISO."""
+    try:
+        return valor_data(valor)
+    except ValueError:
+        return None
+
+def mapear_status(status_planilha: str) -> str:
+    """Mapeia status da planilha para o banco."""
+    if pd.isna(status_planilha):
+        return 'Em Estruturação'
+
+    mapeamento = {
+        'Em Estruturação': 'Em Estruturação',
+        'Liquidada': 'Liquidada',
+        'On hold': 'On Hold',
+        'On Hold': 'On Hold',
+        'Abortada': 'Abortada',
+        'Finalizada': 'Finalizada'
+    }
+    return mapeamento.get(str(status_planilha), 'Em Estruturação')
+
+def converter_volume(valor):
+    """Converte volume para float; textos como "1.234,56" ou "R$ 2,5 mi" (ver conversores).
+
+    Vazios, textos sem valor (TEXTOS_SEM_VALOR) e textos que não são número viram 0.
+    """
+    try:
+        volume = valor_numerico(valor)
+    except ValueError:
+        return 0
+    return volume if volume is not None else 0
+
+def converter_numero_emissao(uid) -> str:
+    """Normaliza o UID/Emissão: inteiros viram texto sem casas decimais."""
+    if pd.notna(uid) and str(uid).strip() != '':
+        try:
+            # Tentar converter para numero
+            return str(int(float(uid)))
+        except (ValueError, TypeError):
+            # Se não for numero, usar como string mesmo
+            uid_str = str(uid).strip()
+            # Remover caracteres inválidos
+            if uid_str not in UIDS_INVALIDOS:
+                return uid_str
+    return ''
+
+def converter_fee(valor):
+    """Converte o fee de estruturação ("1,5" inclusive); textos não numéricos viram None."""
+    try:
+        return valor_numerico(valor)
+    except ValueError:
+        return None
+
+def migrar_operacao(row, refs, status_padrao='Em Estruturação'):
+    """Converte uma linha da planilha para o formato do banco."""
+    categorias, veiculos, usuarios, analistas = refs
+
+    # Usar UID ou Emissao como identificador - priorizar Emissão se UID estiver vazio
+    uid = row.get('UID')
+    if pd.isna(uid) or str(uid).strip() == '' or uid == '':
+        uid = row.get('Emissão', row.get('Numero Emissao', ''))
+
+    # Validar se é numero valido
+    numero_emissao = converter_numero_emissao(uid)
+
+    # Pegar data de entrada - usar data de liquidacao se nao tiver
+    data_entrada = converter_data(row.get('Data de Entrada no Pipe', row.get('Data Entrada')))
+    entrada_estimada = False
+    if not data_entrada:
+        # Se nao tem data de entrada, usar data de liquidacao ou data atual
+        data_entrada = converter_data(row.get('Data de Liquidação'))
+        if not data_entrada:
+            data_entrada = datetime.now().isoformat()
+            entrada_estimada = True
+
+    # Nome da operacao - buscar em diferentes colunas
+    nome_op = row.get('Operação', row.get('Nome Operacao', ''))
+    if pd.isna(nome_op) or str(nome_op).strip() == '':
+        nome_op = f"Operação {numero_emissao}"
+
+    # Status: usar da planilha se existir, senão usar status padrão
+    status_row = row.get('Status')
+    if pd.notna(status_row) and str(status_row).strip():
+        status = mapear_status(status_row)
+    else:
+        status = status_padrao
+
+    # Mapeamento de colunas
+    return {
+        'numero_emissao': numero_emissao,
+        'nome_operacao': str(nome_op),
+        'status': status,
+        'pmo_id': usuarios.get(row.get('PMO')),
+        'analista_gestao_id': analistas.get(row.get('Analista Gestão', row.get('Analista Gestao'))),
+        'categoria_id': categorias.get(row.get('Categoria')),
+        'veiculo_id': veiculos.get(row.get('Veículo', row.get('Veiculo'))),
+        'volume': converter_volume(row.get('Volume')),
+        'empresa_cnpj': str(row.get('CNPJ', '')) if pd.notna(row.get('CNPJ')) else None,
+        'empresa_razao_social': str(row.get('Razão Social', row.get('Razao Social', ''))) if pd.notna(row.get('Razão Social', row.get('Razao Social'))) else None,
+        'data_entrada_pipe': data_entrada,
+        'data_previsao_liquidacao': converter_data(row.get('Previsão de Liquidação', row.get('Previsao Liquidacao'))),
+        'data_liquidacao': converter_data(row.get('Data de Liquidação', row.get('Data Liquidacao'))),
+        'data_primeira_pagamento': converter_data(row.get('1ª Data de Pagamento', row.get('Primeira Data Pagamento'))),
+        'floating': bool(row.get('Floating')) if pd.notna(row.get('Floating')) else False,
+        'proximos_passos': str(row.get('Próximos Passos', row.get('Proximos Passos', ''))) if pd.notna(row.get('Próximos Passos', row.get('Proximos Passos'))) else None,
+        'alertas': str(row.get('Alertas', '')) if pd.notna(row.get('Alertas')) else None,
+        'resumo': str(row.get('Resumo', '')) if pd.notna(row.get('Resumo')) else None,
+        'fee_estruturacao': converter_fee(row.get('Fee Estruturação')),
+        'fee_gestao': None,  # Ignorar Remuneracao por enquanto (e texto)
+        'boletagem': str(row.get('Boletagem', '')) if pd.notna(row.get('Boletagem')) else None,
+        CAMPO_ENTRADA_ESTIMADA: entrada_estimada,
+    }
+
+# =====================================================
+# Transformação vetorizada (aba inteira)
+# =====================================================
+
+class _Falha:
+    """Marca um valor cuja conversão levantou exceção (a linha inteira falha)."""
+    __slots__ = ('erro',)
+
+    def __init__(self, erro: Exception):
+        self.erro = erro
+
+def resolver_colunas(colunas) -> dict:
+    """Resolve os aliases uma vez por aba: campo → nome da coluna presente (ou None)."""
+    presentes = set(colunas)
+    return {
+        campo: next((nome for nome in aliases if nome in presentes), None)
+        for campo, aliases in ALIASES_COLUNAS.items()
+    }
+
+def _aplicar_memo(valores: list, func) -> list:
+    """Aplica `func` uma vez por valor distinto; linhas repetidas reaproveitam o resultado.
+
+    A chave inclui o tipo para não misturar 1, 1.0 e True, que têm o mesmo hash
+    mas podem gerar saídas diferentes (ex.: str()).
+    """
+    cache = {}
+    resultado = []
+    for valor in valores:
+        chave = (type(valor), valor)
+        try:
+            convertido = cache[chave]
+        except KeyError:
+            try:
+                convertido = func(valor)
+            except Exception as e:
+                convertido = _Falha(e)
+            cache[chave] = convertido
+        except TypeError:
+            # Valor não-hashable: converte sem memoizar
+            try:
+                convertido = func(valor)
+            except Exception as e:
+                convertido = _Falha(e)
+        resultado.append(convertido)
+    return resultado
+
+def _texto_ou_none(valor):
+    return str(valor) if pd.notna(valor) else None
+
+def _floating(valor):
+    return bool(valor) if pd.notna(valor) else False
+
+def _coluna(df: pd.DataFrame, nome, padrao=None) -> pd.Series:
+    """Coluna da aba ou uma série constante, equivalente ao row.get(nome, padrao)."""
+    if nome is None:
+        return pd.Series([padrao] * len(df), index=df.index, dtype=object)
+    return df[nome]
+
+def _datas_iso(serie: pd.Series, linhas: list = None, falhas=None, formato: str = None) -> list:
+    """converter_data para uma coluna inteira."""
+    if pd.api.types.is_datetime64_dtype(serie.dtype):
+        validos = serie.dropna()
+        if (validos.dt.microsecond == 0).all() and (validos.dt.nanosecond == 0).all():
+            # Caminho vetorizado: mesmo formato de Timestamp.isoformat() sem fração
+            iso = serie.dt.strftime('%Y-%m-%dT%H:%M:%S')
+            return iso.astype(object).where(serie.notna(), None).tolist()
+    # Colunas mistas: o formato dos textos é detectado uma vez para a coluna
+    return converter_datas(serie.tolist(), serie.name, linhas, falhas, formato)
+
+def _textos(serie: pd.Series) -> list:
+    """str(valor) ou None para uma coluna inteira."""
+    if isinstance(serie.dtype, pd.StringDtype):
+        return serie.astype(object).where(serie.notna(), None).tolist()
+    return _aplicar_memo(serie.tolist(), _texto_ou_none)
+
+def _numeros(serie: pd.Series, linhas: list = None, falhas=None, formato: str = None) -> list:
+    """valor_numerico para uma coluna inteira (None para vazios e textos inválidos)."""
+    if pd.api.types.is_numeric_dtype(serie.dtype):
+        numeros = pd.to_numeric(serie).astype(float)
+        return numeros.astype(object).where(numeros.notna(), None).tolist()
+    # O formato de milhar/decimal é detectado uma vez para a coluna
+    return converter_numeros(serie.tolist(), serie.name, linhas, falhas, formato)
+
+def _volumes(serie: pd.Series, linhas: list = None, falhas=None, formato: str = None) -> list:
+    """converter_volume para uma coluna inteira."""
+    return [0 if volume is None else volume for volume in _numeros(serie, linhas, falhas, formato)]
+
+def _floatings(serie: pd.Series) -> list:
+    if serie.dtype == bool:
+        return serie.tolist()
+    return _aplicar_memo(serie.tolist(), _floating)
+
+def _referencias(serie: pd.Series, mapa) -> list:
+    # Sem memo aqui: get() é O(1) e o ResolvedorReferencias conta as linhas não resolvidas
+    return [mapa.get(valor) for valor in serie.tolist()]
+
+def transformar_aba(df: pd.DataFrame, refs, status_padrao='Em Estruturação', falhas=None,
+                    mapeamento: dict = None) -> list:
+    """Converte uma aba inteira para registros de operações.
+
+    Equivalente a aplicar migrar_operacao em cada linha, mas resolve os aliases
+    de coluna uma vez por aba e converte coluna a coluna. Retorna um item por
+    linha do DataFrame, na mesma ordem: o dicionário da operação ou, se a
+    conversão da linha falhar, a exceção correspondente.
+
+    Números e datas em texto têm o formato detectado por coluna (migrar_operacao
+    decide valor a valor, preferindo o brasileiro); os que não forem
+    interpretados vão para `falhas` (conversores.FalhasConversao) com a linha
+    da planilha.
+
+    `mapeamento` ({campo: {'coluna', 'formato'}}, o de perfil_planilha) fixa a
+    coluna e o formato de cada campo e dispensa a detecção; campos cuja coluna
+    não estiver na aba continuam resolvidos pelos aliases.
+    """
+    categorias, veiculos, usuarios, analistas = refs
+    colunas = resolver_colunas(df.columns)
+    formatos = {}
+    for campo, item in (mapeamento or {}).items():
+        if campo in colunas and item.get('coluna') in df.columns:
+            colunas[campo] = item['coluna']
+            formatos[campo] = item.get('formato')
+    n = len(df)
+    if n == 0:
+        return []
+    linhas = [idx + 2 for idx in df.index]
+
+    # numero_emissao: UID, ou Emissão quando o UID estiver vazio
+    uid = _coluna(df, colunas['uid']).astype(object)
+    uid_vazio = uid.isna() | (uid.astype(str).str.strip() == '')
+    emissao = _coluna(df, colunas['emissao'], '').astype(object)
+    numeros = _aplicar_memo(uid.where(~uid_vazio, emissao).tolist(), converter_numero_emissao)
+
+    # data_entrada_pipe: entrada → liquidação → agora
+    agora = datetime.now().isoformat()
+    entradas = _datas_iso(_coluna(df, colunas['data_entrada']), linhas, falhas, formatos.get('data_entrada'))
+    liquidacoes_fallback = _datas_iso(_coluna(df, 'Data de Liquidação' if 'Data de Liquidação' in df.columns else None))
+    estimadas = [not (entrada or liquidacao) for entrada, liquidacao in zip(entradas, liquidacoes_fallback)]
+    entradas = [
+        entrada or liquidacao or agora
+        for entrada, liquidacao in zip(entradas, liquidacoes_fallback)
+    ]
+
+    # nome_operacao
+    nomes_brutos = _coluna(df, colunas['operacao'], '')
+    nomes = _aplicar_memo(nomes_brutos.tolist(),
+                          lambda v: None if pd.isna(v) or str(v).strip() == '' else str(v))
+    nomes = [
+        nome if nome is not None else f"Operação {numero}"
+        for nome, numero in zip(nomes, numeros)
+    ]
+
+    # status
+    statuses = _aplicar_memo(
+        _coluna(df, colunas['status']).tolist(),
+        lambda v: mapear_status(v) if pd.notna(v) and str(v).strip() else status_padrao,
+    )
+
+    campos = {
+        'numero_emissao': numeros,
+        'nome_operacao': nomes,
+        'status': statuses,
+        'pmo_id': _referencias(_coluna(df, colunas['pmo']), usuarios),
+        'analista_gestao_id': _referencias(_coluna(df, colunas['analista_gestao']), analistas),
+        'categoria_id': _referencias(_coluna(df, colunas['categoria']), categorias),
+        'veiculo_id': _referencias(_coluna(df, colunas['veiculo']), veiculos),
+        'volume': _volumes(_coluna(df, colunas['volume']), linhas, falhas, formatos.get('volume')),
+        'empresa_cnpj': _textos(_coluna(df, colunas['cnpj'])),
+        'empresa_razao_social': _textos(_coluna(df, colunas['razao_social'])),
+        'data_entrada_pipe': entradas,
+        'data_previsao_liquidacao': _datas_iso(_coluna(df, colunas['previsao_liquidacao']), linhas, falhas,
+                                               formatos.get('previsao_liquidacao')),
+        'data_liquidacao': _datas_iso(_coluna(df, colunas['data_liquidacao']), linhas, falhas,
+                                      formatos.get('data_liquidacao')),
+        'data_primeira_pagamento': _datas_iso(_coluna(df, colunas['primeira_pagamento']), linhas, falhas,
+                                              formatos.get('primeira_pagamento')),
+        'floating': _floatings(_coluna(df, colunas['floating'])),
+        'proximos_passos': _textos(_coluna(df, colunas['proximos_passos'])),
+        'alertas': _textos(_coluna(df, colunas['alertas'])),
+        'resumo': _textos(_coluna(df, colunas['resumo'])),
+        'fee_estruturacao': _numeros(_coluna(df, colunas['fee_estruturacao']), linhas, falhas,
+                                     formatos.get('fee_estruturacao')),
+        'fee_gestao': [None] * n,  # Ignorar Remuneracao por enquanto (e texto)
+        'boletagem': _textos(_coluna(df, colunas['boletagem'])),
+        CAMPO_ENTRADA_ESTIMADA: estimadas,
+    }
+
+    nomes_campos = list(campos)
+    registros = []
+    for valores in zip(*campos.values()):
+        falha = next((v for v in valores if isinstance(v, _Falha)), None)
+        if falha is not None:
+            registros.append(falha.erro)
+        else:
+            registros.append(dict(zip(nomes_campos, valores)))
+    return registros
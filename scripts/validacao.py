@@ -0,0 +1,213 @@
+"""
+Validação e Quarentena - Operações convertidas → gravação
+Descrição: Confere cada operação antes de qualquer escrita no banco (campos obrigatórios,
+           CNPJ, datas, números e numero_emissao repetido) e grava as linhas recusadas,
+           com os motivos, num arquivo de quarentena JSONL ou CSV
+"""
+
+import csv
+import json
+import math
+import os
+import re
+import time
+from collections import Counter
+
+DIRETORIO_QUARENTENA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'quarentena')
+
+# Valores aceitos pelo CHECK de estruturacao.operacoes.status
+STATUS_VALIDOS = ('Em Estruturação', 'Liquidada', 'On Hold', 'Abortada', 'Finalizada')
+
+# Maior valor absoluto que cabe em numeric(18,2) e numeric(10,4)
+LIMITE_VOLUME = 10 ** 16
+LIMITE_FEE = 10 ** 6
+
+# Campos vindos da planilha que são NOT NULL no banco
+CAMPOS_OBRIGATORIOS = ('numero_emissao', 'nome_operacao', 'status', 'data_entrada_pipe')
+
+COLUNAS_CSV = ('aba', 'linha', 'numero_emissao', 'motivos', 'registro')
+
+def caminho_quarentena_padrao(formato: str = 'jsonl') -> str:
+    """scripts/quarentena/migracao-<data e hora>.<formato>"""
+    return os.path.join(DIRETORIO_QUARENTENA, f"migracao-{time.strftime('%Y%m%d-%H%M%S')}.{formato}")
+
+def cnpj_valido(cnpj: str) -> bool:
+    """14 dígitos (pontuação ignorada) com os dois dígitos verificadores corretos."""
+    digitos = re.sub(r'\D', '', str(cnpj))
+    if len(digitos) != 14 or digitos == digitos[0] * 14:
+        return False
+
+    numeros = [int(d) for d in digitos]
+    for posicao in (12, 13):
+        pesos = list(range(posicao - 7, 1, -1)) + list(range(9, 1, -1))
+        resto = sum(n * p for n, p in zip(numeros, pesos)) % 11
+        if numeros[posicao] != (0 if resto < 2 else 11 - resto):
+            return False
+    return True
+
+def _numero_invalido(valor, limite) -> str:
+    """Motivo se o valor não for um número finito dentro do limite da coluna, senão None."""
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        return f"nao numerico ({valor!r})"
+    if not math.isfinite(valor):
+        return f"nao finito ({valor!r})"
+    if abs(valor) >= limite:
+        return f"fora do limite da coluna ({valor!r})"
+    return None
+
+def validar_operacao(operacao: dict) -> list:
+    """Motivos de recusa de uma operação convertida (lista vazia = válida).
+
+    Não cobre repetição de numero_emissao, que depende das linhas
+    anteriores (ver Validador).
+    """
+    motivos = []
+
+    for campo in CAMPOS_OBRIGATORIOS:
+        valor = operacao.get(campo)
+        if valor is None or str(valor).strip() in ('', 'nan'):
+            motivos.append(f"{campo} ausente")
+
+    status = operacao.get('status')
+    if status is not None and status not in STATUS_VALIDOS:
+        motivos.append(f"status invalido ({status!r})")
+
+    cnpj = operacao.get('empresa_cnpj')
+    if cnpj is not None and not cnpj_valido(cnpj):
+        motivos.append(f"CNPJ invalido ({cnpj!r})")
+
+    # Datas ISO (AAAA-MM-DD...) comparadas pelo dia
+    entrada, liquidacao = operacao.get('data_entrada_pipe'), operacao.get('data_liquidacao')
+    if entrada and liquidacao and str(liquidacao)[:10] < str(entrada)[:10]:
+        motivos.append(f"data_liquidacao anterior a data_entrada_pipe ({str(liquidacao)[:10]} < {str(entrada)[:10]})")
+
+    motivo = _numero_invalido(operacao.get('volume'), LIMITE_VOLUME)
+    if motivo:
+        motivos.append(f"volume {motivo}")
+    elif operacao['volume'] < 0:
+        motivos.append(f"volume negativo ({operacao['volume']!r})")
+
+    for campo in ('fee_estruturacao', 'fee_gestao'):
+        if operacao.get(campo) is not None:
+            motivo = _numero_invalido(operacao[campo], LIMITE_FEE)
+            if motivo:
+                motivos.append(f"{campo} {motivo}")
+
+    return motivos
+
+class Validador:
+    """Filtra as operações de cada aba antes da gravação.
+
+    As linhas recusadas são escritas na quarentena assim que encontradas
+    (o arquivo só é criado na primeira recusa). De cada numero_emissao
+    segue para o banco só a última ocorrência válida, com a mesma
+    precedência de sincronizacao.deduplicar (vale a última aba e, na
+    mesma aba, a última linha); as outras cópias vão para a quarentena, a
+    menos que permitir_duplicados=True. Para a precedência valer entre
+    abas, passe todas a definir_precedencia antes de filtrar; sem isso só
+    as repetições dentro de cada aba são recusadas.
+
+    Uso:
+        with Validador(caminho) as validador:
+            validador.definir_precedencia([('historico', historico), ('pipe', pipe)])
+            itens = validador.filtrar('pipe', pipe)
+    """
+
+    def __init__(self, caminho: str = None, permitir_duplicados: bool = False):
+        self.caminho = caminho or caminho_quarentena_padrao()
+        self.formato = 'csv' if self.caminho.lower().endswith('.csv') else 'jsonl'
+        self.permitir_duplicados = permitir_duplicados
+        self.vencedores = None
+        self.numeros_recusados = set()
+        self.recusados = 0
+        self.motivos = Counter()
+        self._arquivo = None
+        self._csv = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def _gravar(self, aba: str, linha: int, numero, motivos: list, registro):
+        if self._arquivo is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.caminho)), exist_ok=True)
+            self._arquivo = open(self.caminho, 'w', encoding='utf-8', newline='')
+            if self.formato == 'csv':
+                self._csv = csv.writer(self._arquivo)
+                self._csv.writerow(COLUNAS_CSV)
+
+        if self.formato == 'csv':
+            self._csv.writerow([aba, linha, numero or '', '; '.join(motivos),
+                                json.dumps(registro, ensure_ascii=False, default=str) if registro else ''])
+        else:
+            self._arquivo.write(json.dumps({
+                'aba': aba, 'linha': linha, 'numero_emissao': numero or None,
+                'motivos': motivos, 'registro': registro,
+            }, ensure_ascii=False, default=str) + '\n')
+        self._arquivo.flush()
+
+    def recusar(self, aba: str, linha: int, motivos: list, registro: dict = None):
+        numero = (registro or {}).get('numero_emissao')
+        self.recusados += 1
+        if numero:
+            self.numeros_recusados.add(numero)
+        # Conta pelo tipo do motivo, sem os valores entre parênteses
+        self.motivos.update(motivo.split(' (')[0] for motivo in motivos)
+        self._gravar(aba, linha, numero, motivos, registro)
+
+    @staticmethod
+    def _ultimas_validas(abas) -> dict:
+        """{numero_emissao: (aba, linha)} da última ocorrência válida, na ordem de `abas`."""
+        vencedores = {}
+        for aba, operacoes in abas:
+            for linha, operacao in operacoes:
+                if isinstance(operacao, Exception) or not operacao.get('numero_emissao'):
+                    continue
+                if not validar_operacao(operacao):
+                    vencedores[operacao['numero_emissao']] = (aba, linha)
+        return vencedores
+
+    def definir_precedencia(self, abas):
+        """Recebe [(aba, [(linha, operação ou erro)])] na ordem em que serão filtradas."""
+        self.vencedores = self._ultimas_validas(abas)
+
+    def filtrar(self, aba: str, operacoes: list) -> list:
+        """Recebe [(linha, operação ou erro de conversão)] e devolve só os (linha, operação) válidos."""
+        vencedores = None
+        if not self.permitir_duplicados:
+            vencedores = self.vencedores if self.vencedores is not None else self._ultimas_validas([(aba, operacoes)])
+
+        validos = []
+        for linha, operacao in operacoes:
+            if isinstance(operacao, Exception):
+                self.recusar(aba, linha, [f"erro de conversao ({operacao})"])
+                continue
+
+            motivos = validar_operacao(operacao)
+            numero = operacao.get('numero_emissao')
+            vencedor = vencedores.get(numero) if numero and vencedores is not None and not motivos else None
+            if vencedor and vencedor != (aba, linha):
+                aba_vencedora, linha_vencedora = vencedor
+                motivos.append(f"numero_emissao repetido (vale a ultima ocorrencia: aba {aba_vencedora}, "
+                               f"linha {linha_vencedora})")
+
+            if motivos:
+                self.recusar(aba, linha, motivos, operacao)
+            else:
+                validos.append((linha, operacao))
+        return validos
+
+    def fechar(self):
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+
+    def imprimir_resumo(self):
+        if not self.recusados:
+            print("   [OK] Nenhuma linha em quarentena")
+            return
+        print(f"   [!] {self.recusados} linhas em quarentena: {self.caminho}")
+        for motivo, quantidade in self.motivos.most_common():
+            print(f"       {motivo}: {quantidade}")
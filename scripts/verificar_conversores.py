@@ -0,0 +1,217 @@
+"""
+Verifica as propriedades de conversores.py com valores gerados aleatoriamente
+Uso: python verificar_conversores.py [--casos N] [--semente S]
+
+Cada propriedade é checada em N casos; a semente impressa reproduz uma falha.
+"""
+import argparse
+import random
+import string
+import sys
+from datetime import datetime, timedelta
+
+from conversores import (
+    FORMATO_BR,
+    FORMATO_US,
+    ORIGEM_EXCEL,
+    FalhasConversao,
+    converter_datas,
+    converter_numeros,
+    data_serial_excel,
+    detectar_formato_data,
+    detectar_formato_numero,
+    interpretar_data,
+    interpretar_numero,
+    valor_numerico,
+)
+
+CASOS_PADRAO = 2000
+
+# Limite de contraexemplos impressos por propriedade
+MAX_FALHAS_EXIBIDAS = 5
+
+def formatar_numero(valor: float, formato: str, milhar=True, casas=2, moeda=False) -> str:
+    """Texto de `valor` como a planilha escreveria ("R$ 1.234,56" / "1,234.56")."""
+    texto = f"{abs(valor):,.{casas}f}" if milhar else f"{abs(valor):.{casas}f}"
+    if formato == FORMATO_BR:
+        texto = texto.replace(',', '_').replace('.', ',').replace('_', '.')
+    if moeda:
+        texto = f"R$ {texto}"
+    return f"-{texto}" if valor < 0 else texto
+
+def _numero_aleatorio(rng: random.Random, casas: int) -> float:
+    return round(rng.choice([1, -1]) * rng.uniform(0, 10 ** rng.randint(0, 10)), casas)
+
+def _data_aleatoria(rng: random.Random, inicio=datetime(1950, 1, 1), fim=datetime(2099, 12, 31)) -> datetime:
+    return inicio + timedelta(days=rng.randint(0, (fim - inicio).days))
+
+# =====================================================
+# Propriedades: cada uma recebe o gerador e devolve None ou a descrição do contraexemplo
+# =====================================================
+
+def ida_e_volta_numero(rng):
+    """Um número formatado em BR ou US é lido de volta com o formato da coluna."""
+    formato = rng.choice([FORMATO_BR, FORMATO_US])
+    casas = rng.randint(1, 4)
+    valor = _numero_aleatorio(rng, casas)
+    texto = formatar_numero(valor, formato, milhar=rng.random() < 0.5, casas=casas, moeda=rng.random() < 0.3)
+    lido = interpretar_numero(texto, formato)
+    if abs(lido - valor) > 1e-9 * max(1.0, abs(valor)):
+        return f"{texto!r} ({formato}) -> {lido}, esperado {valor}"
+
+def sem_ambiguidade_independe_do_formato(rng):
+    """Texto com os dois separadores (ou decimal que não tem 3 casas) dá o mesmo número com qualquer formato."""
+    formato = rng.choice([FORMATO_BR, FORMATO_US])
+    casas = rng.choice([1, 2, 4])
+    valor = round(rng.uniform(1000, 1e9), casas)
+    texto = formatar_numero(valor, formato, milhar=True, casas=casas)
+    lidos = {interpretar_numero(texto, FORMATO_BR), interpretar_numero(texto, FORMATO_US), interpretar_numero(texto)}
+    if len(lidos) != 1 or abs(lidos.pop() - valor) > 1e-9 * valor:
+        return f"{texto!r}: leituras diferentes conforme o formato"
+
+def escala_brasileira(rng):
+    """"1.234,56" nunca é lido como 123456 (o erro da versão que tirava todos os separadores)."""
+    reais, centavos = rng.randint(1000, 999_999_999), rng.randint(1, 99)
+    texto = formatar_numero(reais + centavos / 100, FORMATO_BR, casas=2)
+    lido = interpretar_numero(texto)
+    if abs(lido - (reais + centavos / 100)) > 1e-6:
+        return f"{texto!r} -> {lido}"
+
+def deteccao_da_coluna(rng):
+    """A coluna fica no formato em que foi escrita quando ao menos um texto não é ambíguo."""
+    formato = rng.choice([FORMATO_BR, FORMATO_US])
+    textos = [formatar_numero(rng.randint(1000, 999_999), formato, casas=0) for _ in range(rng.randint(0, 20))]
+    textos.append(formatar_numero(round(rng.uniform(0, 1e6), 2), formato, casas=2))
+    rng.shuffle(textos)
+    detectado = detectar_formato_numero(textos)
+    if detectado != formato:
+        return f"{textos[:5]}... escrita em {formato}, detectada {detectado}"
+
+def coluna_igual_a_valor_a_valor(rng):
+    """converter_numeros = valor_numerico com o formato detectado, e a falha de cada valor é registrada."""
+    alfabeto = '0123456789.,R$ -mik'
+    valores = []
+    for _ in range(rng.randint(1, 30)):
+        sorteio = rng.random()
+        if sorteio < 0.4:
+            valores.append(formatar_numero(_numero_aleatorio(rng, 2), rng.choice([FORMATO_BR, FORMATO_US]), casas=2))
+        elif sorteio < 0.7:
+            valores.append(''.join(rng.choice(alfabeto) for _ in range(rng.randint(0, 8))))
+        elif sorteio < 0.85:
+            valores.append(rng.choice([None, float('nan'), 'Pendente', 3, 2.5]))
+        else:
+            valores.append(rng.choice(valores) if valores else None)
+
+    falhas = FalhasConversao()
+    obtidos = converter_numeros(valores, 'Volume', list(range(len(valores))), falhas)
+    formato = detectar_formato_numero(v for v in valores if isinstance(v, str))
+    esperados, erros = [], 0
+    for valor in valores:
+        try:
+            esperados.append(valor_numerico(valor, formato))
+        except ValueError:
+            esperados.append(None)
+            erros += 1
+    iguais = all(a == b or (a != a and b != b) for a, b in zip(obtidos, esperados))
+    if not iguais or falhas.total != erros:
+        return f"{valores}: coluna {obtidos}, valor a valor {esperados}, falhas {falhas.total}/{erros}"
+
+def lixo_so_levanta_value_error(rng):
+    """Qualquer texto vira float, None ou ValueError: nenhuma outra exceção escapa."""
+    texto = ''.join(rng.choice(string.printable + 'çãé') for _ in range(rng.randint(0, 12)))
+    for formato in (None, FORMATO_BR, FORMATO_US):
+        try:
+            lido = interpretar_numero(texto, formato)
+        except ValueError:
+            continue
+        except Exception as e:
+            return f"{texto!r}: {type(e).__name__}: {e}"
+        if lido is not None and not isinstance(lido, float):
+            return f"{texto!r} -> {lido!r}"
+    try:
+        interpretar_data(texto)
+    except ValueError:
+        pass
+    except Exception as e:
+        return f"data {texto!r}: {type(e).__name__}: {e}"
+
+def ida_e_volta_data(rng):
+    """Uma data escrita em qualquer formato aceito é lida de volta (dia antes do mês)."""
+    formato = rng.choice(['%d/%m/%Y', '%d/%m/%y', '%Y-%m-%d', '%d-%m-%Y', '%d.%m.%Y', '%Y-%m-%dT%H:%M:%S'])
+    inicio = datetime(2000, 1, 1) if formato == '%d/%m/%y' else datetime(1950, 1, 1)
+    fim = datetime(2068, 12, 31) if formato == '%d/%m/%y' else datetime(2099, 12, 31)
+    data = _data_aleatoria(rng, inicio, fim)
+    if 'H' in formato:
+        data = data.replace(hour=rng.randint(0, 23), minute=rng.randint(0, 59), second=rng.randint(0, 59))
+    texto = data.strftime(formato)
+    lida = interpretar_data(texto)
+    if lida != data:
+        return f"{texto!r} -> {lida}, esperado {data}"
+
+def deteccao_de_datas_americanas(rng):
+    """Coluna com algum dia > 12 na segunda posição é lida como mês/dia; sem isso, como dia/mês."""
+    datas = [_data_aleatoria(rng) for _ in range(rng.randint(1, 15))]
+    datas.append(_data_aleatoria(rng).replace(day=rng.randint(13, 28)))
+    textos = [data.strftime('%m/%d/%Y') for data in datas]
+    obtidos = converter_datas(textos)
+    esperados = [data.isoformat() for data in datas]
+    if detectar_formato_data(textos) != '%m/%d/%Y' or obtidos != esperados:
+        return f"{textos[:5]}...: {obtidos[:5]}..."
+
+def ida_e_volta_serial_excel(rng):
+    """Número de dias desde 30/12/1899 volta à mesma data."""
+    data = _data_aleatoria(rng)
+    serial = (data - ORIGEM_EXCEL).days
+    if data_serial_excel(serial) != data:
+        return f"{serial} -> {data_serial_excel(serial)}, esperado {data}"
+
+PROPRIEDADES = [
+    ida_e_volta_numero,
+    sem_ambiguidade_independe_do_formato,
+    escala_brasileira,
+    deteccao_da_coluna,
+    coluna_igual_a_valor_a_valor,
+    lixo_so_levanta_value_error,
+    ida_e_volta_data,
+    deteccao_de_datas_americanas,
+    ida_e_volta_serial_excel,
+]
+
+def verificar(casos: int = CASOS_PADRAO, semente: int = None) -> bool:
+    semente = semente if semente is not None else random.randrange(2 ** 32)
+    print("=" * 60)
+    print(f" PROPRIEDADES DOS CONVERSORES ({casos} casos, semente {semente})")
+    print("=" * 60)
+
+    total_falhas = 0
+    for propriedade in PROPRIEDADES:
+        rng = random.Random(f"{semente}-{propriedade.__name__}")
+        falhas = []
+        for _ in range(casos):
+            try:
+                contraexemplo = propriedade(rng)
+            except Exception as e:
+                contraexemplo = f"{type(e).__name__}: {e}"
+            if contraexemplo:
+                falhas.append(contraexemplo)
+        if falhas:
+            total_falhas += len(falhas)
+            print(f"   [X] {propriedade.__name__}: {len(falhas)} falhas")
+            for contraexemplo in falhas[:MAX_FALHAS_EXIBIDAS]:
+                print(f"       {contraexemplo}")
+        else:
+            print(f"   [OK] {propriedade.__name__}")
+
+    print("=" * 60)
+    print("[OK] Todas as propriedades valem" if total_falhas == 0
+          else f"[X] {total_falhas} falhas; reproduza com --semente {semente}")
+    return total_falhas == 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verifica as propriedades de conversores.py")
+    parser.add_argument("--casos", type=int, default=CASOS_PADRAO,
+                        help=f"Casos gerados por propriedade (padrao: {CASOS_PADRAO})")
+    parser.add_argument("--semente", type=int, default=None,
+                        help="Semente do gerador, para reproduzir uma falha")
+    args = parser.parse_args()
+    sys.exit(0 if verificar(args.casos, args.semente) else 1)
@@ -16,32 +16,61 @@ print("="*70)
 print(" RESUMO FINAL DA MIGRACAO")
 print("="*70)
 
-# Contar total
-result = supabase.schema('estruturacao').table('operacoes').select('id', count='exact').execute()
-print(f"\n[*] Total de operacoes migradas: {result.count}")
+# Totais materializados no banco: uma chamada em vez de um count='exact' por status
+# (ver supabase/migrations/20260129140000_create_resumo_pipeline.sql).
+# Idade máxima 0: atualiza o resumo se houver alteração ainda não refletida
+resumo = supabase.schema('estruturacao').rpc('resumo_pipeline', {'p_idade_maxima_segundos': 0}).execute().data or {}
+
+def formatar_volume(valor):
+    return f"R$ {float(valor):,.2f}" if valor else "N/A"
+
+total = resumo.get('total') or {'quantidade': 0, 'volume_total': 0}
+print(f"\n[*] Total de operacoes migradas: {total['quantidade']} ({formatar_volume(total['volume_total'])})")
+print(f"    Resumo atualizado em: {resumo.get('atualizado_em')}")
 
 # Contar por status
 print(f"\n[*] Operacoes por status:")
-for status in ['Em Estruturação', 'Liquidada', 'On Hold', 'Abortada', 'Finalizada']:
-    result = supabase.schema('estruturacao').table('operacoes').select('id', count='exact').eq('status', status).execute()
-    if result.count > 0:
-        print(f"    {status}: {result.count}")
+for linha in resumo.get('por_status', []):
+    print(f"    {linha['status'] or 'Sem status'}: {linha['quantidade']} - {formatar_volume(linha['volume_total'])}")
+
+print(f"\n[*] Operacoes por categoria:")
+for linha in resumo.get('por_categoria', []):
+    print(f"    {linha['categoria_nome'] or 'Sem categoria'}: {linha['quantidade']} - {formatar_volume(linha['volume_total'])}")
+
+print(f"\n[*] Operacoes por veiculo:")
+for linha in resumo.get('por_veiculo', []):
+    print(f"    {linha['veiculo_nome'] or 'Sem veiculo'}: {linha['quantidade']} - {formatar_volume(linha['volume_total'])}")
+
+print(f"\n[*] Operacoes por PMO:")
+for linha in resumo.get('por_pmo', []):
+    print(f"    {linha['nome'] or 'Sem PMO'}: {linha['quantidade']} ({linha['em_estruturacao']} em estruturacao)")
+
+print(f"\n[*] Operacoes por analista de gestao:")
+for linha in resumo.get('por_analista', []):
+    print(f"    {linha['nome'] or 'Sem analista'}: {linha['quantidade']} ({linha['em_estruturacao']} em estruturacao)")
+
+pendencias = resumo.get('pendencias_abertas') or {}
+print(f"\n[*] Pendencias abertas: {pendencias.get('operacoes', 0)} operacoes, {pendencias.get('itens', 0)} itens")
+for linha in pendencias.get('maiores', []):
+    print(f"    [{linha['numero_emissao']}] {linha['nome_operacao']:40s} - {linha['itens_pendentes']} itens")
+
+print(f"\n[*] Proximas liquidacoes:")
+for linha in resumo.get('proximas_liquidacoes', []):
+    print(f"    {linha['data_previsao_liquidacao']} [{linha['numero_emissao']}] {linha['nome_operacao']:40s} - {formatar_volume(linha['volume'])}")
 
 # Mostrar algumas operações em estruturação
 print(f"\n[*] Algumas operacoes EM ESTRUTURACAO:")
 result = supabase.schema('estruturacao').table('operacoes').select('numero_emissao, nome_operacao, volume').eq('status', 'Em Estruturação').limit(10).execute()
 
 for op in result.data:
-    volume_formatado = f"R$ {op['volume']:,.2f}" if op['volume'] else "N/A"
-    print(f"    [{op['numero_emissao']}] {op['nome_operacao']:40s} - {volume_formatado}")
+    print(f"    [{op['numero_emissao']}] {op['nome_operacao']:40s} - {formatar_volume(op['volume'])}")
 
 # Mostrar algumas operações liquidadas
 print(f"\n[*] Algumas operacoes LIQUIDADAS:")
 result = supabase.schema('estruturacao').table('operacoes').select('numero_emissao, nome_operacao, volume').eq('status', 'Liquidada').order('numero_emissao').limit(10).execute()
 
 for op in result.data:
-    volume_formatado = f"R$ {op['volume']:,.2f}" if op['volume'] else "N/A"
-    print(f"    [{op['numero_emissao']}] {op['nome_operacao']:40s} - {volume_formatado}")
+    print(f"    [{op['numero_emissao']}] {op['nome_operacao']:40s} - {formatar_volume(op['volume'])}")
 
 print("\n" + "="*70)
 print(" MIGRACAO CONCLUIDA COM SUCESSO!")
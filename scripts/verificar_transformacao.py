@@ -0,0 +1,104 @@
+"""
+Verifica a equivalência entre migrar_operacao (linha a linha) e transformar_aba (aba inteira)
+Uso: python verificar_transformacao.py [caminho_planilha]
+"""
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+from transformacao import CAMPO_ENTRADA_ESTIMADA, migrar_operacao, transformar_aba
+
+ABAS = [('Histórico', 0, 'Liquidada'), ('Pipe', 6, 'Em Estruturação'), ('Pendências', 0, 'Liquidada')]
+
+# Referências fictícias: cobrem acertos e faltas nos quatro mapas
+REFS = (
+    {'CRI': 'cat-cri', 'CRA': 'cat-cra', 'DEB': 'cat-deb'},
+    {'PS': 'vei-ps', 'VE': 'vei-ve'},
+    {'Ana': 'usr-ana', 'Bruno': 'usr-bruno'},
+    {'Carla': 'ana-carla'},
+)
+
+# Limite de divergências impressas por aba
+MAX_DIVERGENCIAS_EXIBIDAS = 10
+
+def _aba_casos_limite() -> pd.DataFrame:
+    """Valores problemáticos vistos (ou temidos) nas planilhas."""
+    return pd.DataFrame({
+        'UID': [1.0, None, '', ' 7 ', 'N.A', 'abc', float('inf'), 3, True, None],
+        'Emissão': [None, 12, 'EM-01', None, None, None, None, None, None, 'nan'],
+        'Operação': ['Op A', None, '  ', 5, 'Op E', 'Op F', 'Op G', 'Op H', 'Op I', 'Op J'],
+        'Status': ['On hold', None, 'Liquidada', ' ', 'Outro', 3, None, 'Abortada', None, 'Finalizada'],
+        'PMO': ['Ana', 'Bruno', 'Zé', None, 'Ana', 'Ana', 'Ana', 1, 'Ana', 'Ana'],
+        'Categoria': ['CRI', 'CRA', None, 'DEB', 'X', 'CRI', 'CRI', 'CRI', 'CRI', 'CRI'],
+        'Veículo': ['PS', None, 'VE', 'PS', 'PS', 'PS', 'PS', 'PS', 'PS', 'PS'],
+        'Analista Gestão': ['Carla', None, 'Carla', 'Outro', None, None, None, None, None, None],
+        'Volume': [1000, '1.234,56', 'Pendente', None, 2.5, 'R$ 10', '-', '10.000', 0, True],
+        'Data de Entrada no Pipe': [datetime(2024, 1, 2), None, '2024-03-05', '05/03/2024', 'xx', None, None, None, 45000, pd.NaT],
+        'Data de Liquidação': [None, datetime(2023, 5, 6, 7, 8, 9, 10), None, None, None, None, '2022-01-01', None, None, None],
+        'Floating': [None, 'Sim', True, False, 0, 1, None, None, None, 'Não'],
+        'Fee Estruturação': [None, 1.5, '2', '1,5', 'x', 2.5e-05, None, None, None, 3],
+        'Alertas': [None, 'a', 1, 2.0, None, None, None, None, None, None],
+    })
+
+def _via_linhas(df, refs, status_padrao):
+    resultado = []
+    for _, row in df.iterrows():
+        try:
+            resultado.append(migrar_operacao(row, refs, status_padrao))
+        except Exception as e:
+            resultado.append(e)
+    return resultado
+
+def _comparar(nome, df, status_padrao) -> int:
+    # data_entrada_pipe cai para datetime.now() quando não há data: os dois
+    # caminhos chamam now() em instantes diferentes, então o valor marcado
+    # como estimado conta como "agora"
+    esperado = _via_linhas(df, REFS, status_padrao)
+    obtido = transformar_aba(df, REFS, status_padrao)
+
+    def normalizar(registro):
+        if isinstance(registro, dict) and registro[CAMPO_ENTRADA_ESTIMADA]:
+            return {**registro, 'data_entrada_pipe': 'agora'}
+        return registro
+
+    divergencias = 0
+    if len(esperado) != len(obtido):
+        print(f"   [X] {nome}: {len(esperado)} linhas esperadas, {len(obtido)} obtidas")
+        return 1
+
+    for pos, (a, b) in enumerate(zip(esperado, obtido)):
+        if isinstance(a, Exception) or isinstance(b, Exception):
+            iguais = type(a) is type(b)
+        else:
+            iguais = normalizar(a) == normalizar(b)
+        if not iguais:
+            divergencias += 1
+            if divergencias <= MAX_DIVERGENCIAS_EXIBIDAS:
+                print(f"   [X] {nome} linha {pos + 2}:\n       esperado={a}\n       obtido  ={b}")
+
+    if divergencias == 0:
+        print(f"   [OK] {nome}: {len(obtido)} linhas identicas")
+    return divergencias
+
+def verificar(caminho: str = None) -> bool:
+    print("=" * 60)
+    print(" EQUIVALENCIA migrar_operacao x transformar_aba")
+    print("=" * 60)
+
+    divergencias = _comparar('casos limite', _aba_casos_limite(), 'Em Estruturação')
+
+    if caminho:
+        planilha = pd.ExcelFile(caminho)
+        for aba, header, status_padrao in ABAS:
+            if aba in planilha.sheet_names:
+                df = planilha.parse(aba, header=header)
+                divergencias += _comparar(aba, df, status_padrao)
+
+    print("=" * 60)
+    print("[OK] Equivalentes" if divergencias == 0 else f"[X] {divergencias} divergencias")
+    return divergencias == 0
+
+if __name__ == "__main__":
+    caminho = sys.argv[1] if len(sys.argv) > 1 else None
+    sys.exit(0 if verificar(caminho) else 1)
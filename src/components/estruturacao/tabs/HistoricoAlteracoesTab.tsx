@@ -268,7 +268,7 @@ function HistoryItem({ row }: { row: AuditRow }) {
 
 export function HistoricoAlteracoesTab({ idEmissao }: { idEmissao: string }) {
   // Precisamos do id_custos_emissao para conseguir correlacionar alterações de custos_linhas.
-  const { data: custosEmissao } = useQuery({
+  const { data: custosEmissao, isFetched: custosEmissaoCarregado } = useQuery({
     queryKey: ['custos_emissao_for_audit', idEmissao],
     queryFn: async () => {
       const { data, error } = await supabase
@@ -285,18 +285,28 @@ export function HistoricoAlteracoesTab({ idEmissao }: { idEmissao: string }) {
   const idCustosEmissao = custosEmissao?.id ?? null;
 
   const { data, isLoading, error } = useQuery({
-    queryKey: ['audit', idEmissao],
+    queryKey: ['audit', idEmissao, idCustosEmissao],
     queryFn: async () => {
+      // Busca pelos índices de record_id (a própria emissão e seu custos_emissao) e de
+      // chaves_emissao (id_emissao/id_emissao_comercial/id_custos_emissao gravados em cada
+      // diff), em vez das últimas 300 alterações do banco inteiro. Filhos já apagados
+      // (séries, linhas de custo) continuam aparecendo pelas chaves.
+      const ids = [idEmissao, idCustosEmissao].filter(Boolean) as string[];
+      const filtro = [`record_id.in.(${ids.join(',')})`, ...ids.map((id) => `chaves_emissao.cs.{${id}}`)].join(',');
+
       // A tabela existe no banco, mas não está tipada no supabase/types.ts; usar cast seguro.
+      // Em UPDATE, old_data/new_data trazem só as colunas alteradas (mais id_emissao,
+      // id_custos_emissao, numero etc. para correlação e título).
       const { data: rows, error } = await (supabase as any)
         .from('historico_alteracoes')
         .select('*')
+        .or(filtro)
         .order('changed_at', { ascending: false })
         .limit(300);
       if (error) throw error;
       return rows as AuditRow[];
     },
-    enabled: !!idEmissao,
+    enabled: !!idEmissao && custosEmissaoCarregado,
   });
 
   // Baseline: não mostrar eventos "de criação" (setup inicial) — só mudanças pós-criação da emissão.
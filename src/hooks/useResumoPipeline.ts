@@ -0,0 +1,77 @@
+import { useQuery } from '@tanstack/react-query';
+import { supabase } from '@/integrations/supabase/client';
+
+export interface ResumoAgregado {
+  quantidade: number;
+  volume_total: number;
+}
+
+export interface ResumoPorStatus extends ResumoAgregado {
+  status: string | null;
+}
+
+export interface ResumoPorCategoria extends ResumoAgregado {
+  categoria_id: string | null;
+  categoria_nome: string | null;
+}
+
+export interface ResumoPorVeiculo extends ResumoAgregado {
+  veiculo_id: string | null;
+  veiculo_nome: string | null;
+}
+
+export interface ResumoPorResponsavel extends ResumoAgregado {
+  nome: string | null;
+  em_estruturacao: number;
+}
+
+export interface PendenciaAberta {
+  operacao_id: string;
+  numero_emissao: string;
+  nome_operacao: string;
+  pendencias: number;
+  itens_pendentes: number;
+  aberta_desde: string;
+}
+
+export interface ProximaLiquidacao {
+  operacao_id: string;
+  numero_emissao: string;
+  nome_operacao: string;
+  status: string;
+  volume: number;
+  data_previsao_liquidacao: string;
+}
+
+export interface ResumoPipeline {
+  /** Quando as materialized views foram atualizadas pela última vez */
+  atualizado_em: string;
+  /** Há alterações em operacoes/pendencias ainda não refletidas no resumo */
+  alteracoes_pendentes: boolean;
+  total: ResumoAgregado & { em_estruturacao: number };
+  por_status: ResumoPorStatus[];
+  por_categoria: ResumoPorCategoria[];
+  por_status_categoria: (ResumoPorStatus & ResumoPorCategoria)[];
+  por_veiculo: ResumoPorVeiculo[];
+  por_pmo: (ResumoPorResponsavel & { pmo_id: string | null })[];
+  por_analista: (ResumoPorResponsavel & { analista_gestao_id: string | null })[];
+  pendencias_abertas: { operacoes: number; itens: number; maiores: PendenciaAberta[] };
+  proximas_liquidacoes: ProximaLiquidacao[];
+}
+
+// Uma chamada à RPC estruturacao.resumo_pipeline, que lê os agregados
+// materializados (atualizados só quando operacoes/pendencias mudam).
+
+export function useResumoPipeline() {
+  return useQuery({
+    queryKey: ['resumo-pipeline'],
+    queryFn: async (): Promise<ResumoPipeline> => {
+      const { data, error } = await supabase
+        .schema('estruturacao')
+        .rpc('resumo_pipeline');
+
+      if (error) throw error;
+      return data as unknown as ResumoPipeline;
+    },
+  });
+}
@@ -1,6 +1,6 @@
 import { Navigation } from '@/components/layout/Navigation';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
-import { useEmissoes } from '@/hooks/useEmissoes';
+import { useResumoPipeline } from '@/hooks/useResumoPipeline';
 import { formatCurrencyCompact, formatNumber, formatPercent } from '@/utils/formatters';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, PieChart, Pie, Cell } from 'recharts';
 import { TrendingUp, DollarSign, AlertTriangle, CheckCircle, Loader2 } from 'lucide-react';
@@ -9,34 +9,32 @@ import { useMemo } from 'react';
 const COLORS = ['#3b82f6', '#10b981', '#f59e0b', '#ef4444', '#8b5cf6', '#ec4899'];
 
 const Dashboard = () => {
-  const { data: emissoes, isLoading } = useEmissoes();
+  const { data: resumo, isLoading } = useResumoPipeline();
 
   const metrics = useMemo(() => ({
-    total_emissoes: emissoes?.length || 0,
-    valor_total_emitido: emissoes?.reduce((acc, e) => acc + (e.volume || 0), 0) || 0,
-    pendencias_abertas: 0,
+    total_emissoes: Number(resumo?.total?.quantidade) || 0,
+    valor_total_emitido: Number(resumo?.total?.volume_total) || 0,
+    pendencias_abertas: Number(resumo?.pendencias_abertas?.operacoes) || 0,
     taxa_conclusao_sla: 0,
-  }), [emissoes]);
+  }), [resumo]);
 
+  // Agregados vêm prontos da RPC resumo_pipeline (materializados no banco)
   const tipoData = useMemo(() => {
-    return (emissoes || []).reduce((acc, e) => {
-      const tipo = e.categoria || 'Outros';
+    return (resumo?.por_categoria || []).reduce((acc, c) => {
+      const tipo = c.categoria_nome || 'Outros';
       const existing = acc.find(x => x.name === tipo);
-      if (existing) existing.value++;
-      else acc.push({ name: tipo, value: 1 });
+      if (existing) existing.value += Number(c.quantidade);
+      else acc.push({ name: tipo, value: Number(c.quantidade) });
       return acc;
     }, [] as { name: string; value: number }[]);
-  }, [emissoes]);
+  }, [resumo]);
 
   const statusData = useMemo(() => {
-    return (emissoes || []).reduce((acc, e) => {
-      const status = e.status || 'desconhecido';
-      const existing = acc.find(x => x.name === status);
-      if (existing) existing.value++;
-      else acc.push({ name: status, value: 1 });
-      return acc;
-    }, [] as { name: string; value: number }[]);
-  }, [emissoes]);
+    return (resumo?.por_status || []).map(s => ({
+      name: s.status || 'desconhecido',
+      value: Number(s.quantidade),
+    }));
+  }, [resumo]);
 
   // Stats memoizado para evitar recriação a cada render
   const stats = useMemo(() => [
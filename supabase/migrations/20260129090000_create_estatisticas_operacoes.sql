@@ -0,0 +1,65 @@
+-- =====================================================
+-- Estatísticas agregadas de operações (uma chamada, uma varredura)
+-- Data: 29/01/2026
+-- =====================================================
+-- Substitui as várias contagens count='exact' (uma por status) feitas pelo
+-- scripts/verificar_migracao.py e a agregação em memória do Dashboard.
+-- Cada linha traz o recorte em "agrupamento":
+--   'total'     -> totais gerais (status/categoria/veiculo nulos)
+--   'status'    -> por status
+--   'categoria' -> por categoria_id (nome via get_base_custos_categorias)
+--   'veiculo'   -> por veiculo_id (nome via get_base_custos_veiculos)
+-- SECURITY INVOKER: as políticas de RLS de estruturacao.operacoes continuam valendo.
+
+CREATE OR REPLACE FUNCTION estruturacao.estatisticas_operacoes()
+RETURNS TABLE (
+    agrupamento text,
+    status text,
+    categoria_id uuid,
+    categoria_nome text,
+    veiculo_id uuid,
+    veiculo_nome text,
+    quantidade bigint,
+    volume_total numeric
+)
+LANGUAGE sql
+STABLE
+SET search_path = estruturacao, public
+AS $$
+    WITH agregado AS (
+        SELECT
+            o.status,
+            o.categoria_id,
+            o.veiculo_id,
+            COUNT(*) AS quantidade,
+            COALESCE(SUM(o.volume), 0) AS volume_total,
+            -- bits: status=4, categoria_id=2, veiculo_id=1 (1 = coluna fora do agrupamento)
+            GROUPING(o.status, o.categoria_id, o.veiculo_id) AS nivel
+        FROM estruturacao.operacoes o
+        GROUP BY GROUPING SETS ((), (o.status), (o.categoria_id), (o.veiculo_id))
+    )
+    SELECT
+        CASE a.nivel
+            WHEN 7 THEN 'total'
+            WHEN 3 THEN 'status'
+            WHEN 5 THEN 'categoria'
+            WHEN 6 THEN 'veiculo'
+        END AS agrupamento,
+        a.status,
+        a.categoria_id,
+        COALESCE(c.codigo, c.nome) AS categoria_nome,
+        a.veiculo_id,
+        v.nome AS veiculo_nome,
+        a.quantidade,
+        a.volume_total
+    FROM agregado a
+    -- base_custos só é acessível pelas funções SECURITY DEFINER get_base_custos_*
+    LEFT JOIN public.get_base_custos_categorias() c ON c.id = a.categoria_id AND a.nivel = 5
+    LEFT JOIN public.get_base_custos_veiculos() v ON v.id = a.veiculo_id AND a.nivel = 6
+    ORDER BY a.nivel DESC, a.quantidade DESC;
+$$;
+
+GRANT EXECUTE ON FUNCTION estruturacao.estatisticas_operacoes() TO anon, authenticated, service_role;
+
+-- Recarregar schema do PostgREST
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,261 @@
+-- =====================================================
+-- Carga em massa de operações (triggers por linha adiados)
+-- Data: 29/01/2026
+-- =====================================================
+-- Cada linha gravada em estruturacao.operacoes dispara, por linha:
+--   trigger_preencher_analistas       -> preencher_analistas_hierarquia()
+--   audit_operacoes                   -> log_alteracao()
+--   trigger_criar_pendencias          -> criar_pendencias_ao_liquidar()
+--   trigger_sync_operacao_to_emissao  -> public.sync_operacao_to_emissao()
+-- Numa recarga completa isso multiplica as escritas no servidor.
+--
+-- Com uma carga em massa aberta (iniciar_carga_em_massa), esses triggers
+-- deixam de disparar para requisições com role service_role (o script de
+-- migração). Usuários do app continuam com o comportamento normal.
+-- finalizar_carga_em_massa faz, de uma vez e em SQL por conjunto, o que
+-- os triggers fariam para as linhas gravadas desde o início da carga.
+--
+-- A carga aberta fica numa tabela, e não numa variável de sessão, porque
+-- cada requisição do PostgREST é uma transação separada.
+--
+-- UPDATE e DELETE durante a carga continuam auditados, mas por comando
+-- (transition tables), porque o estado anterior não pode ser recuperado
+-- depois. O INSERT é auditado no fim, já com os analistas preenchidos.
+
+-- 1. Registro das cargas
+CREATE TABLE IF NOT EXISTS estruturacao.cargas_em_massa (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    iniciada_em timestamptz NOT NULL DEFAULT now(),
+    finalizada_em timestamptz,
+    resumo jsonb
+);
+
+-- No máximo uma carga aberta por vez
+CREATE UNIQUE INDEX IF NOT EXISTS ux_cargas_em_massa_aberta
+    ON estruturacao.cargas_em_massa ((true)) WHERE finalizada_em IS NULL;
+
+-- Sem políticas: acesso só pelas funções abaixo e por service_role
+ALTER TABLE estruturacao.cargas_em_massa ENABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE estruturacao.cargas_em_massa IS 'Cargas em massa do script de migração; enquanto uma está aberta os triggers por linha de operacoes não disparam para service_role';
+
+-- 2. Condição usada no WHEN dos triggers
+CREATE OR REPLACE FUNCTION estruturacao.carga_em_massa_ativa()
+RETURNS boolean
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = estruturacao, public
+AS $$
+    SELECT COALESCE(auth.role() = 'service_role', false)
+       AND EXISTS (SELECT 1 FROM estruturacao.cargas_em_massa WHERE finalizada_em IS NULL);
+$$;
+
+-- 3. Triggers por linha só disparam fora da carga
+DROP TRIGGER IF EXISTS trigger_preencher_analistas ON estruturacao.operacoes;
+CREATE TRIGGER trigger_preencher_analistas
+    BEFORE INSERT OR UPDATE ON estruturacao.operacoes
+    FOR EACH ROW
+    WHEN (NOT estruturacao.carga_em_massa_ativa())
+    EXECUTE FUNCTION preencher_analistas_hierarquia();
+
+DROP TRIGGER IF EXISTS audit_operacoes ON estruturacao.operacoes;
+CREATE TRIGGER audit_operacoes
+    AFTER INSERT OR UPDATE OR DELETE ON estruturacao.operacoes
+    FOR EACH ROW
+    WHEN (NOT estruturacao.carga_em_massa_ativa())
+    EXECUTE FUNCTION log_alteracao();
+
+DROP TRIGGER IF EXISTS trigger_criar_pendencias ON estruturacao.operacoes;
+CREATE TRIGGER trigger_criar_pendencias
+    AFTER INSERT OR UPDATE ON estruturacao.operacoes
+    FOR EACH ROW
+    WHEN (NOT estruturacao.carga_em_massa_ativa())
+    EXECUTE FUNCTION criar_pendencias_ao_liquidar();
+
+DROP TRIGGER IF EXISTS trigger_sync_operacao_to_emissao ON estruturacao.operacoes;
+CREATE TRIGGER trigger_sync_operacao_to_emissao
+    AFTER UPDATE OF numero_emissao, nome_operacao, volume, empresa_cnpj, categoria_id, veiculo_id, tipo_oferta_id, atualizado_em
+    ON estruturacao.operacoes
+    FOR EACH ROW
+    WHEN (NOT estruturacao.carga_em_massa_ativa())
+    EXECUTE FUNCTION public.sync_operacao_to_emissao();
+
+-- 4. Auditoria por comando de UPDATE/DELETE durante a carga
+CREATE OR REPLACE FUNCTION estruturacao.auditar_operacoes_em_massa()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public, estruturacao
+AS $$
+BEGIN
+    -- Fora da carga (ou durante o próprio finalizar) o trigger por linha já audita
+    IF NOT estruturacao.carga_em_massa_ativa()
+       OR current_setting('app.carga_em_massa', true) = 'finalizando' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'UPDATE' THEN
+        INSERT INTO public.historico_alteracoes (schema_name, table_name, record_id, old_data, new_data, action, changed_by)
+        SELECT TG_TABLE_SCHEMA, TG_TABLE_NAME, n.id::text, to_jsonb(a), to_jsonb(n), 'UPDATE', auth.uid()
+        FROM novas n
+        JOIN antigas a ON a.id = n.id;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO public.historico_alteracoes (schema_name, table_name, record_id, old_data, action, changed_by)
+        SELECT TG_TABLE_SCHEMA, TG_TABLE_NAME, a.id::text, to_jsonb(a), 'DELETE', auth.uid()
+        FROM antigas a;
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS audit_operacoes_em_massa_update ON estruturacao.operacoes;
+CREATE TRIGGER audit_operacoes_em_massa_update
+    AFTER UPDATE ON estruturacao.operacoes
+    REFERENCING OLD TABLE AS antigas NEW TABLE AS novas
+    FOR EACH STATEMENT EXECUTE FUNCTION estruturacao.auditar_operacoes_em_massa();
+
+DROP TRIGGER IF EXISTS audit_operacoes_em_massa_delete ON estruturacao.operacoes;
+CREATE TRIGGER audit_operacoes_em_massa_delete
+    AFTER DELETE ON estruturacao.operacoes
+    REFERENCING OLD TABLE AS antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION estruturacao.auditar_operacoes_em_massa();
+
+-- 5. Abrir a carga (reaproveita uma carga aberta por uma execução interrompida)
+CREATE OR REPLACE FUNCTION estruturacao.iniciar_carga_em_massa()
+RETURNS uuid
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = estruturacao, public
+AS $$
+DECLARE
+    v_id uuid;
+BEGIN
+    IF COALESCE(auth.role(), '') <> 'service_role' THEN
+        RAISE EXCEPTION 'Carga em massa disponivel apenas para service_role';
+    END IF;
+
+    SELECT id INTO v_id FROM estruturacao.cargas_em_massa WHERE finalizada_em IS NULL;
+    IF v_id IS NULL THEN
+        INSERT INTO estruturacao.cargas_em_massa DEFAULT VALUES RETURNING id INTO v_id;
+    END IF;
+
+    RETURN v_id;
+END;
+$$;
+
+-- 6. Fechar a carga: passada por conjunto sobre as linhas gravadas desde iniciada_em
+CREATE OR REPLACE FUNCTION estruturacao.finalizar_carga_em_massa()
+RETURNS jsonb
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = estruturacao, public
+AS $$
+DECLARE
+    v_carga estruturacao.cargas_em_massa%ROWTYPE;
+    v_analistas integer;
+    v_auditadas integer;
+    v_pendencias integer;
+    v_emissoes integer;
+    v_resumo jsonb;
+BEGIN
+    IF COALESCE(auth.role(), '') <> 'service_role' THEN
+        RAISE EXCEPTION 'Carga em massa disponivel apenas para service_role';
+    END IF;
+
+    SELECT * INTO v_carga FROM estruturacao.cargas_em_massa
+    WHERE finalizada_em IS NULL
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Nenhuma carga em massa aberta';
+    END IF;
+
+    -- A carga continua aberta até o fim: os UPDATEs abaixo não disparam os
+    -- triggers por linha, e este flag evita a auditoria por comando
+    PERFORM set_config('app.carga_em_massa', 'finalizando', true);
+
+    -- preencher_analistas_hierarquia: linhas novas sempre; alteradas só se faltar analista
+    UPDATE estruturacao.operacoes o
+    SET analista_financeiro_id = h.analista_financeiro_id,
+        analista_contabil_id = h.analista_contabil_id
+    FROM estruturacao.hierarquia_analistas h
+    WHERE h.analista_gestao_id = o.analista_gestao_id
+      AND (o.criado_em >= v_carga.iniciada_em
+           OR (o.atualizado_em >= v_carga.iniciada_em
+               AND (o.analista_financeiro_id IS NULL OR o.analista_contabil_id IS NULL)))
+      AND (o.analista_financeiro_id IS DISTINCT FROM h.analista_financeiro_id
+           OR o.analista_contabil_id IS DISTINCT FROM h.analista_contabil_id);
+    GET DIAGNOSTICS v_analistas = ROW_COUNT;
+
+    -- log_alteracao dos INSERTs (linhas gravadas por usuários no meio da carga já foram auditadas)
+    INSERT INTO public.historico_alteracoes (schema_name, table_name, record_id, new_data, action, changed_by, changed_at)
+    SELECT 'estruturacao', 'operacoes', o.id::text, to_jsonb(o), 'INSERT', auth.uid(), o.criado_em
+    FROM estruturacao.operacoes o
+    WHERE o.criado_em >= v_carga.iniciada_em
+      AND NOT EXISTS (
+          SELECT 1 FROM public.historico_alteracoes h
+          WHERE h.table_name = 'operacoes'
+            AND h.changed_at >= v_carga.iniciada_em
+            AND h.schema_name = 'estruturacao'
+            AND h.record_id = o.id::text
+            AND h.action = 'INSERT'
+      );
+    GET DIAGNOSTICS v_auditadas = ROW_COUNT;
+
+    -- criar_pendencias_ao_liquidar
+    INSERT INTO estruturacao.pendencias (operacao_id)
+    SELECT o.id
+    FROM estruturacao.operacoes o
+    WHERE o.status = 'Liquidada'
+      AND (o.criado_em >= v_carga.iniciada_em OR o.atualizado_em >= v_carga.iniciada_em)
+      AND NOT EXISTS (SELECT 1 FROM estruturacao.pendencias p WHERE p.operacao_id = o.id);
+    GET DIAGNOSTICS v_pendencias = ROW_COUNT;
+
+    -- sync_operacao_to_emissao (só UPDATE, como o trigger; last-write-wins por atualizado_em)
+    PERFORM public._sync_set_flag('operacao');
+
+    UPDATE public.emissoes e
+    SET numero_emissao = o.numero_emissao,
+        nome_operacao = o.nome_operacao,
+        volume = o.volume,
+        empresa_cnpj = o.empresa_cnpj,
+        categoria = o.categoria_id,
+        veiculo = o.veiculo_id,
+        tipo_oferta = o.tipo_oferta_id,
+        atualizado_em = COALESCE(o.atualizado_em, now())
+    FROM estruturacao.operacoes o
+    WHERE e.id = o.id_emissao_comercial
+      AND o.criado_em < v_carga.iniciada_em
+      AND o.atualizado_em >= v_carga.iniciada_em
+      AND (e.atualizado_em IS NULL OR COALESCE(o.atualizado_em, now()) >= e.atualizado_em);
+    GET DIAGNOSTICS v_emissoes = ROW_COUNT;
+
+    v_resumo := jsonb_build_object(
+        'carga_id', v_carga.id,
+        'iniciada_em', v_carga.iniciada_em,
+        'analistas_preenchidos', v_analistas,
+        'auditorias_inseridas', v_auditadas,
+        'pendencias_criadas', v_pendencias,
+        'emissoes_sincronizadas', v_emissoes
+    );
+
+    UPDATE estruturacao.cargas_em_massa
+    SET finalizada_em = now(), resumo = v_resumo
+    WHERE id = v_carga.id;
+
+    RETURN v_resumo;
+END;
+$$;
+
+-- Só o script de migração (service_role) abre e fecha cargas;
+-- carga_em_massa_ativa fica com o EXECUTE padrão porque roda no WHEN dos triggers
+REVOKE ALL ON FUNCTION estruturacao.iniciar_carga_em_massa() FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION estruturacao.finalizar_carga_em_massa() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION estruturacao.iniciar_carga_em_massa() TO service_role;
+GRANT EXECUTE ON FUNCTION estruturacao.finalizar_carga_em_massa() TO service_role;
+GRANT SELECT ON estruturacao.cargas_em_massa TO service_role;
+
+-- Recarregar schema do PostgREST
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,84 @@
+-- =====================================================
+-- volume_total de public.emissoes recalculado por comando, não por linha
+-- Data: 29/01/2026
+-- =====================================================
+-- A versão anterior (20260126204100) era FOR EACH ROW: gravar 20 séries de
+-- uma emissão refazia 20 vezes o SUM de todas as séries e fazia 20 UPDATEs
+-- em public.emissoes (cada um disparando os triggers de emissoes).
+-- Agora um trigger por evento, com transition tables, junta as emissões
+-- afetadas pelo comando e recalcula cada uma uma única vez.
+--
+-- Diferenças em relação à versão por linha:
+--   * UPDATE que troca id_emissao recalcula a emissão de origem e a de destino
+--     (antes o trigger era UPDATE OF valor_emissao e não via essa troca);
+--   * emissões cujo total não mudou não recebem UPDATE.
+-- Regressão: supabase/tests/database/volume_total_series.test.sql
+
+CREATE OR REPLACE FUNCTION public.sync_volume_total_from_series()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_emissoes uuid[];
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    SELECT array_agg(DISTINCT n.id_emissao) INTO v_emissoes
+    FROM novas n
+    WHERE n.id_emissao IS NOT NULL;
+  ELSIF TG_OP = 'DELETE' THEN
+    SELECT array_agg(DISTINCT a.id_emissao) INTO v_emissoes
+    FROM antigas a
+    WHERE a.id_emissao IS NOT NULL;
+  ELSE
+    -- Transition tables não aceitam UPDATE OF coluna: o filtro fica aqui
+    SELECT array_agg(DISTINCT x.id_emissao) INTO v_emissoes
+    FROM antigas a
+    JOIN novas n ON n.id = a.id
+    CROSS JOIN LATERAL (VALUES (a.id_emissao), (n.id_emissao)) AS x(id_emissao)
+    WHERE x.id_emissao IS NOT NULL
+      AND (a.valor_emissao IS DISTINCT FROM n.valor_emissao
+           OR a.id_emissao IS DISTINCT FROM n.id_emissao);
+  END IF;
+
+  IF v_emissoes IS NULL THEN
+    RETURN NULL;
+  END IF;
+
+  UPDATE public.emissoes e
+  SET volume_total = t.total,
+      atualizado_em = now()
+  FROM (
+    SELECT u.id, COALESCE(SUM(COALESCE(s.valor_emissao, 0)), 0) AS total
+    FROM unnest(v_emissoes) AS u(id)
+    LEFT JOIN public.series s ON s.id_emissao = u.id
+    GROUP BY u.id
+  ) t
+  WHERE e.id = t.id
+    AND e.volume_total IS DISTINCT FROM t.total;
+
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trigger_sync_volume_total_from_series ON public.series;
+
+DROP TRIGGER IF EXISTS trigger_sync_volume_total_from_series_insert ON public.series;
+CREATE TRIGGER trigger_sync_volume_total_from_series_insert
+AFTER INSERT ON public.series
+REFERENCING NEW TABLE AS novas
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.sync_volume_total_from_series();
+
+DROP TRIGGER IF EXISTS trigger_sync_volume_total_from_series_update ON public.series;
+CREATE TRIGGER trigger_sync_volume_total_from_series_update
+AFTER UPDATE ON public.series
+REFERENCING OLD TABLE AS antigas NEW TABLE AS novas
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.sync_volume_total_from_series();
+
+DROP TRIGGER IF EXISTS trigger_sync_volume_total_from_series_delete ON public.series;
+CREATE TRIGGER trigger_sync_volume_total_from_series_delete
+AFTER DELETE ON public.series
+REFERENCING OLD TABLE AS antigas
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.sync_volume_total_from_series();
@@ -0,0 +1,257 @@
+-- =====================================================
+-- Auditoria compacta e particionada por mês
+-- Data: 29/01/2026
+-- =====================================================
+-- public.historico_alteracoes guardava o registro inteiro em old_data e
+-- new_data a cada alteração, tinha só o índice (table_name, changed_at) e
+-- dobrava de tamanho a cada recarga da migração.
+--
+-- 1. Só o que mudou: um trigger BEFORE INSERT na própria tabela reduz cada
+--    linha gravada (por log_alteracao ou pela carga em massa):
+--      INSERT -> new_data sem colunas nulas
+--      DELETE -> old_data sem colunas nulas
+--      UPDATE -> old_data/new_data só com as colunas alteradas, mais as
+--                colunas de contexto usadas pela aba de histórico (iguais
+--                nos dois lados, então não aparecem como alteração);
+--                UPDATE que só mexe em atualizado_em/updated_at não é gravado
+-- 2. Particionada por mês em changed_at. As partições ficam no schema
+--    auditoria, fora do PostgREST; a leitura continua pela tabela pai, com
+--    as mesmas políticas de RLS. Uma partição padrão recebe o que cair fora
+--    dos meses criados, e garantir_particoes_auditoria move essas linhas
+--    quando cria o mês.
+-- 3. Índice (record_id, changed_at) para o histórico de um registro.
+-- 4. Retenção: listar_particoes_auditoria / remover_particao_auditoria,
+--    usadas por scripts/arquivar_auditoria.py depois de exportar o mês.
+
+CREATE SCHEMA IF NOT EXISTS auditoria;
+COMMENT ON SCHEMA auditoria IS 'Partições mensais de public.historico_alteracoes (acesso só pela tabela pai)';
+
+-- 1. Diferença entre duas versões de um registro
+CREATE OR REPLACE FUNCTION public.diff_auditoria(p_antigo jsonb, p_novo jsonb, OUT antigo jsonb, OUT novo jsonb)
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT
+        jsonb_object_agg(c.chave, p_antigo -> c.chave) FILTER (WHERE p_antigo ? c.chave),
+        jsonb_object_agg(c.chave, p_novo -> c.chave) FILTER (WHERE p_novo ? c.chave)
+    FROM jsonb_object_keys(COALESCE(p_antigo, '{}') || COALESCE(p_novo, '{}')) AS c(chave)
+    WHERE (p_antigo -> c.chave) IS DISTINCT FROM (p_novo -> c.chave)
+       -- Contexto: correlação com a emissão e título exibidos em HistoricoAlteracoesTab
+       OR c.chave IN ('id_emissao', 'id_emissao_comercial', 'id_custos_emissao', 'operacao_id',
+                      'numero', 'numero_emissao', 'nome_operacao', 'papel', 'tipo', 'prestador')
+    HAVING bool_or((p_antigo -> c.chave) IS DISTINCT FROM (p_novo -> c.chave)
+                   AND c.chave NOT IN ('atualizado_em', 'updated_at'));
+$$;
+
+COMMENT ON FUNCTION public.diff_auditoria(jsonb, jsonb) IS 'Colunas alteradas entre duas versões (mais as de contexto); NULL se só mudaram timestamps';
+
+CREATE OR REPLACE FUNCTION public.compactar_historico_alteracoes()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_diff record;
+BEGIN
+    IF NEW.action = 'UPDATE' THEN
+        SELECT * INTO v_diff FROM public.diff_auditoria(NEW.old_data, NEW.new_data);
+        IF v_diff.novo IS NULL THEN
+            RETURN NULL;
+        END IF;
+        NEW.old_data := v_diff.antigo;
+        NEW.new_data := v_diff.novo;
+    ELSE
+        NEW.old_data := jsonb_strip_nulls(NEW.old_data);
+        NEW.new_data := jsonb_strip_nulls(NEW.new_data);
+    END IF;
+
+    RETURN NEW;
+END;
+$$;
+
+-- 2. Nova tabela particionada (a antiga vira _legado até a cópia)
+ALTER TABLE public.historico_alteracoes RENAME TO historico_alteracoes_legado;
+-- Os índices não acompanham o nome da tabela e colidiriam com os da nova
+ALTER INDEX IF EXISTS public.historico_alteracoes_pkey RENAME TO historico_alteracoes_legado_pkey;
+ALTER INDEX IF EXISTS public.idx_audit_table RENAME TO idx_audit_table_legado;
+
+CREATE TABLE public.historico_alteracoes (
+    id bigint NOT NULL DEFAULT nextval('public.historico_alteracoes_id_seq'),
+    schema_name text NOT NULL,
+    table_name text NOT NULL,
+    record_id text NOT NULL,
+    old_data jsonb,
+    new_data jsonb,
+    action text NOT NULL CHECK (action IN ('INSERT', 'UPDATE', 'DELETE')),
+    changed_by uuid REFERENCES auth.users(id),
+    changed_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (id, changed_at)
+) PARTITION BY RANGE (changed_at);
+
+ALTER SEQUENCE public.historico_alteracoes_id_seq OWNED BY public.historico_alteracoes.id;
+
+CREATE TABLE auditoria.historico_alteracoes_padrao
+    PARTITION OF public.historico_alteracoes DEFAULT;
+
+CREATE INDEX idx_audit_table ON public.historico_alteracoes(table_name, changed_at);
+CREATE INDEX idx_audit_record ON public.historico_alteracoes(record_id, changed_at DESC);
+
+CREATE TRIGGER compactar_historico_alteracoes
+    BEFORE INSERT ON public.historico_alteracoes
+    FOR EACH ROW EXECUTE FUNCTION public.compactar_historico_alteracoes();
+
+COMMENT ON TABLE public.historico_alteracoes IS 'Auditoria (só colunas alteradas), particionada por mês em auditoria.historico_alteracoes_AAAA_MM';
+
+-- 3. Partições mensais
+CREATE OR REPLACE FUNCTION public.garantir_particoes_auditoria(p_meses_a_frente integer DEFAULT 3)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public, auditoria
+AS $$
+DECLARE
+    v_mes_atual date := date_trunc('month', now())::date;
+    v_primeiro date;
+    v_inicio date;
+    v_fim date;
+    v_nome text;
+    v_criadas integer := 0;
+BEGIN
+    -- Do mês mais antigo parado na partição padrão (ou do atual) até p_meses_a_frente
+    SELECT LEAST(v_mes_atual, COALESCE(date_trunc('month', min(changed_at))::date, v_mes_atual))
+    INTO v_primeiro
+    FROM auditoria.historico_alteracoes_padrao;
+
+    FOR v_inicio IN
+        SELECT generate_series(v_primeiro, v_mes_atual + make_interval(months => p_meses_a_frente), interval '1 month')::date
+    LOOP
+        v_nome := 'historico_alteracoes_' || to_char(v_inicio, 'YYYY_MM');
+        CONTINUE WHEN to_regclass('auditoria.' || v_nome) IS NOT NULL;
+        v_fim := (v_inicio + interval '1 month')::date;
+
+        -- O ATTACH falha se a partição padrão tiver linhas do mês: elas vão antes para a nova tabela
+        EXECUTE format('CREATE TABLE auditoria.%I (LIKE public.historico_alteracoes INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_nome);
+        EXECUTE format(
+            'WITH movidas AS (DELETE FROM auditoria.historico_alteracoes_padrao WHERE changed_at >= %L AND changed_at < %L RETURNING *) '
+            'INSERT INTO auditoria.%I SELECT * FROM movidas',
+            v_inicio, v_fim, v_nome);
+        EXECUTE format('ALTER TABLE public.historico_alteracoes ATTACH PARTITION auditoria.%I FOR VALUES FROM (%L) TO (%L)',
+            v_nome, v_inicio, v_fim);
+        v_criadas := v_criadas + 1;
+    END LOOP;
+
+    RETURN v_criadas;
+END;
+$$;
+
+-- 4. Cópia do histórico existente (já compactado pelo trigger) e remoção da tabela antiga
+INSERT INTO public.historico_alteracoes (id, schema_name, table_name, record_id, old_data, new_data, action, changed_by, changed_at)
+SELECT id, schema_name, table_name, record_id, old_data, new_data, action, changed_by, COALESCE(changed_at, now())
+FROM public.historico_alteracoes_legado;
+
+DROP TABLE public.historico_alteracoes_legado;
+
+SELECT public.garantir_particoes_auditoria(3);
+
+-- 5. Retenção
+CREATE OR REPLACE FUNCTION public.listar_particoes_auditoria()
+RETURNS TABLE (
+    particao text,
+    inicio timestamptz,
+    fim timestamptz,
+    linhas_estimadas bigint,
+    tamanho_bytes bigint
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public, auditoria
+AS $$
+    SELECT
+        c.relname::text,
+        (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'FROM \(''([^'']+)''\)'))[1]::timestamptz,
+        (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'TO \(''([^'']+)''\)'))[1]::timestamptz,
+        GREATEST(c.reltuples, 0)::bigint,
+        pg_total_relation_size(c.oid)
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'public.historico_alteracoes'::regclass
+    ORDER BY 2 NULLS LAST;
+$$;
+
+-- Remove um mês já exportado. p_linhas_exportadas precisa bater com a contagem
+-- atual da partição, para não descartar linhas que chegaram depois da exportação.
+CREATE OR REPLACE FUNCTION public.remover_particao_auditoria(p_particao text, p_linhas_exportadas bigint)
+RETURNS bigint
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public, auditoria
+AS $$
+DECLARE
+    v_fim timestamptz;
+    v_linhas bigint;
+BEGIN
+    SELECT p.fim INTO v_fim
+    FROM public.listar_particoes_auditoria() p
+    WHERE p.particao = p_particao;
+
+    IF v_fim IS NULL THEN
+        RAISE EXCEPTION 'Particao mensal de auditoria nao encontrada: %', p_particao;
+    END IF;
+
+    IF v_fim > date_trunc('month', now()) THEN
+        RAISE EXCEPTION 'Particao % ainda recebe alteracoes (mes atual ou futuro)', p_particao;
+    END IF;
+
+    EXECUTE format('SELECT count(*) FROM auditoria.%I', p_particao) INTO v_linhas;
+    IF v_linhas <> p_linhas_exportadas THEN
+        RAISE EXCEPTION 'Particao % tem % linhas, mas % foram exportadas', p_particao, v_linhas, p_linhas_exportadas;
+    END IF;
+
+    EXECUTE format('ALTER TABLE public.historico_alteracoes DETACH PARTITION auditoria.%I', p_particao);
+    EXECUTE format('DROP TABLE auditoria.%I', p_particao);
+
+    RETURN v_linhas;
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.garantir_particoes_auditoria(integer) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.listar_particoes_auditoria() FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.remover_particao_auditoria(text, bigint) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.garantir_particoes_auditoria(integer) TO service_role;
+GRANT EXECUTE ON FUNCTION public.listar_particoes_auditoria() TO service_role;
+GRANT EXECUTE ON FUNCTION public.remover_particao_auditoria(text, bigint) TO service_role;
+
+-- Meses futuros criados todo dia 1, se o pg_cron estiver habilitado
+-- (sem ele, scripts/arquivar_auditoria.py chama garantir_particoes_auditoria)
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule('garantir-particoes-auditoria', '0 3 1 * *',
+                              'SELECT public.garantir_particoes_auditoria(3)');
+    END IF;
+END
+$$;
+
+-- 6. RLS e grants (as políticas da tabela antiga foram junto com ela)
+ALTER TABLE public.historico_alteracoes ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "admin_view_audit_log" ON public.historico_alteracoes
+    FOR SELECT USING (public.is_admin());
+
+CREATE POLICY "gestor_estruturacao_view_audit" ON public.historico_alteracoes
+    FOR SELECT USING (
+        public.is_gestor_estruturacao() AND (
+            schema_name = 'estruturacao'
+            OR (schema_name = 'public' AND table_name IN ('series'))
+        )
+    );
+
+CREATE POLICY "dev_anon_select_audit" ON public.historico_alteracoes
+    FOR SELECT TO anon USING (public.allow_anon());
+
+GRANT SELECT ON TABLE public.historico_alteracoes TO anon, authenticated;
+GRANT ALL ON TABLE public.historico_alteracoes TO service_role;
+REVOKE ALL ON SCHEMA auditoria FROM PUBLIC, anon, authenticated;
+
+-- Recarregar schema do PostgREST
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,31 @@
+-- =====================================================
+-- Índices para os filtros, joins e ordenações do pipeline
+-- Data: 29/01/2026
+-- =====================================================
+-- estruturacao.operacoes só tinha índices em status e pmo_id.
+-- Conferência: scripts/verificar_indices.py (EXPLAIN das consultas do app
+-- num Postgres local com volume realista).
+--
+-- Já cobertos, sem índice novo:
+--   operacoes.id_emissao_comercial -> UNIQUE (usado pelo ON CONFLICT do sync)
+--   series.id_emissao              -> idx_series_id_emissao e series_id_emissao_numero_uniq
+
+-- Lista de operações por status ordenada por criado_em (useOperacoesEstruturacao);
+-- substitui idx_operacoes_status, que é prefixo deste
+CREATE INDEX IF NOT EXISTS idx_operacoes_status_criado_em
+    ON estruturacao.operacoes(status, criado_em DESC);
+DROP INDEX IF EXISTS estruturacao.idx_operacoes_status;
+
+-- Busca e ordenação por número da emissão (verificar_migracao.py, sincronização)
+CREATE INDEX IF NOT EXISTS idx_operacoes_numero_emissao
+    ON estruturacao.operacoes(numero_emissao);
+
+-- Joins com base_custos e analistas
+CREATE INDEX IF NOT EXISTS idx_operacoes_categoria ON estruturacao.operacoes(categoria_id);
+CREATE INDEX IF NOT EXISTS idx_operacoes_veiculo ON estruturacao.operacoes(veiculo_id);
+CREATE INDEX IF NOT EXISTS idx_operacoes_analista_gestao ON estruturacao.operacoes(analista_gestao_id);
+
+-- idx_series_emissao_id (20260124090500) foi criado sobre emissao_id; com o
+-- rename para id_emissao (20260126131000) ficou idêntico a idx_series_id_emissao
+DROP INDEX IF EXISTS public.idx_series_emissao_id;
+CREATE INDEX IF NOT EXISTS idx_series_id_emissao ON public.series(id_emissao);
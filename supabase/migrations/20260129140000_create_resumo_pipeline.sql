@@ -0,0 +1,327 @@
+-- =====================================================
+-- Resumo do pipeline materializado (Dashboard e verificar_migracao)
+-- Data: 29/01/2026
+-- =====================================================
+-- Substitui estatisticas_operacoes (20260129090000), que agregava
+-- estruturacao.operacoes inteira a cada leitura, com custo crescendo junto com
+-- as Liquidadas acumuladas; a função é removida no fim desta migration.
+-- Aqui os agregados ficam em materialized views, atualizadas só quando
+-- operacoes/pendencias mudaram:
+--   * um trigger por comando em operacoes e pendencias registra a alteração
+--     em resumo_pipeline_alteracoes (INSERT, sem disputa de lock entre escritas);
+--   * atualizar_resumo_pipeline() consome as alterações já confirmadas e faz
+--     REFRESH CONCURRENTLY (leituras não bloqueiam); roda a cada minuto pelo
+--     pg_cron, se habilitado;
+--   * resumo_pipeline() lê as views e só atualiza se houver alteração pendente
+--     e o resumo for mais velho que p_idade_maxima_segundos.
+-- Próximas liquidações não são materializadas (dependem da data de hoje):
+-- saem de um índice parcial, sem varrer o histórico.
+
+-- 1. Agregados por status, categoria, veículo, PMO e analista
+CREATE MATERIALIZED VIEW IF NOT EXISTS estruturacao.mv_resumo_pipeline AS
+WITH agregado AS (
+    SELECT
+        o.status,
+        o.categoria_id,
+        o.veiculo_id,
+        o.pmo_id,
+        o.analista_gestao_id,
+        COUNT(*) AS quantidade,
+        COUNT(*) FILTER (WHERE o.status = 'Em Estruturação') AS em_estruturacao,
+        COALESCE(SUM(o.volume), 0) AS volume_total,
+        -- bits: status=16, categoria_id=8, veiculo_id=4, pmo_id=2, analista_gestao_id=1 (1 = fora do agrupamento)
+        GROUPING(o.status, o.categoria_id, o.veiculo_id, o.pmo_id, o.analista_gestao_id) AS nivel
+    FROM estruturacao.operacoes o
+    GROUP BY GROUPING SETS (
+        (),
+        (o.status),
+        (o.categoria_id),
+        (o.status, o.categoria_id),
+        (o.veiculo_id),
+        (o.pmo_id),
+        (o.analista_gestao_id)
+    )
+)
+SELECT
+    CASE nivel
+        WHEN 31 THEN 'total'
+        WHEN 15 THEN 'status'
+        WHEN 23 THEN 'categoria'
+        WHEN 7 THEN 'status_categoria'
+        WHEN 27 THEN 'veiculo'
+        WHEN 29 THEN 'pmo'
+        WHEN 30 THEN 'analista'
+    END AS agrupamento,
+    -- Chave única para o REFRESH CONCURRENTLY (as colunas do agrupamento podem ser nulas)
+    concat_ws(':', nivel, status, categoria_id, veiculo_id, pmo_id, analista_gestao_id) AS chave,
+    status,
+    categoria_id,
+    veiculo_id,
+    pmo_id,
+    analista_gestao_id,
+    quantidade,
+    em_estruturacao,
+    volume_total
+FROM agregado;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_resumo_pipeline_chave ON estruturacao.mv_resumo_pipeline(chave);
+CREATE INDEX IF NOT EXISTS idx_mv_resumo_pipeline_agrupamento ON estruturacao.mv_resumo_pipeline(agrupamento);
+
+-- 2. Pendências abertas por operação
+CREATE MATERIALIZED VIEW IF NOT EXISTS estruturacao.mv_pendencias_abertas AS
+SELECT
+    p.operacao_id,
+    COUNT(*) AS pendencias,
+    SUM(
+        (p.mapa_liquidacao <> 'ok')::int + (p.mapa_registros <> 'ok')::int + (p.lo_status <> 'ok')::int
+        + (p.due_diligence <> 'ok')::int + (p.envio_email_prestadores <> 'ok')::int
+        + (p.passagem_bastao <> 'ok')::int + (p.kick_off <> 'ok')::int
+    ) AS itens_pendentes,
+    MIN(p.criado_em) AS aberta_desde
+FROM estruturacao.pendencias p
+WHERE NOT p.resolvida
+GROUP BY p.operacao_id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_pendencias_abertas_operacao ON estruturacao.mv_pendencias_abertas(operacao_id);
+
+-- 3. Próximas liquidações (consulta ao vivo)
+CREATE INDEX IF NOT EXISTS idx_operacoes_previsao_liquidacao
+    ON estruturacao.operacoes(data_previsao_liquidacao)
+    WHERE status IN ('Em Estruturação', 'On Hold');
+
+-- Acesso só pelas funções abaixo
+REVOKE ALL ON estruturacao.mv_resumo_pipeline FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON estruturacao.mv_pendencias_abertas FROM PUBLIC, anon, authenticated;
+
+-- 4. Alterações pendentes e estado da última atualização
+CREATE TABLE IF NOT EXISTS estruturacao.resumo_pipeline_alteracoes (
+    id bigserial PRIMARY KEY,
+    tabela text NOT NULL,
+    registrada_em timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS estruturacao.resumo_pipeline_estado (
+    id boolean PRIMARY KEY DEFAULT true CHECK (id),
+    atualizado_em timestamptz NOT NULL DEFAULT now(),
+    duracao_ms integer
+);
+
+INSERT INTO estruturacao.resumo_pipeline_estado DEFAULT VALUES ON CONFLICT DO NOTHING;
+
+ALTER TABLE estruturacao.resumo_pipeline_alteracoes ENABLE ROW LEVEL SECURITY;
+ALTER TABLE estruturacao.resumo_pipeline_estado ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION estruturacao.registrar_alteracao_resumo_pipeline()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = estruturacao, public
+AS $$
+BEGIN
+    INSERT INTO estruturacao.resumo_pipeline_alteracoes (tabela) VALUES (TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS resumo_pipeline_operacoes ON estruturacao.operacoes;
+CREATE TRIGGER resumo_pipeline_operacoes
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON estruturacao.operacoes
+    FOR EACH STATEMENT EXECUTE FUNCTION estruturacao.registrar_alteracao_resumo_pipeline();
+
+DROP TRIGGER IF EXISTS resumo_pipeline_pendencias ON estruturacao.pendencias;
+CREATE TRIGGER resumo_pipeline_pendencias
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON estruturacao.pendencias
+    FOR EACH STATEMENT EXECUTE FUNCTION estruturacao.registrar_alteracao_resumo_pipeline();
+
+-- 5. Atualização
+CREATE OR REPLACE FUNCTION estruturacao.atualizar_resumo_pipeline(p_forcar boolean DEFAULT false)
+RETURNS boolean
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = estruturacao, public
+AS $$
+DECLARE
+    v_ultima bigint;
+    v_inicio timestamptz := clock_timestamp();
+BEGIN
+    -- Uma atualização por vez; quem não pega o lock lê o que já está materializado
+    IF NOT pg_try_advisory_xact_lock(hashtext('estruturacao.resumo_pipeline')) THEN
+        RETURN false;
+    END IF;
+
+    SELECT max(id) INTO v_ultima FROM estruturacao.resumo_pipeline_alteracoes;
+    IF v_ultima IS NULL AND NOT p_forcar THEN
+        RETURN false;
+    END IF;
+
+    -- Só são consumidas as alterações já confirmadas; o REFRESH, que vem depois,
+    -- enxerga todas elas. Escritas ainda abertas ficam para a próxima atualização.
+    DELETE FROM estruturacao.resumo_pipeline_alteracoes WHERE id <= v_ultima;
+
+    REFRESH MATERIALIZED VIEW CONCURRENTLY estruturacao.mv_resumo_pipeline;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY estruturacao.mv_pendencias_abertas;
+
+    UPDATE estruturacao.resumo_pipeline_estado
+    SET atualizado_em = now(),
+        duracao_ms = (extract(epoch FROM clock_timestamp() - v_inicio) * 1000)::integer;
+
+    RETURN true;
+END;
+$$;
+
+-- 6. Leitura (uma chamada para o Dashboard inteiro)
+CREATE OR REPLACE FUNCTION estruturacao.resumo_pipeline(
+    p_idade_maxima_segundos integer DEFAULT 300,
+    p_limite integer DEFAULT 20
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = estruturacao, public
+AS $$
+DECLARE
+    v_resumo jsonb;
+BEGIN
+    IF EXISTS (SELECT 1 FROM estruturacao.resumo_pipeline_alteracoes)
+       AND (SELECT atualizado_em FROM estruturacao.resumo_pipeline_estado)
+           < now() - make_interval(secs => p_idade_maxima_segundos) THEN
+        PERFORM estruturacao.atualizar_resumo_pipeline();
+    END IF;
+
+    SELECT jsonb_build_object(
+        'atualizado_em', e.atualizado_em,
+        'alteracoes_pendentes', EXISTS (SELECT 1 FROM estruturacao.resumo_pipeline_alteracoes),
+
+        'total', (
+            SELECT jsonb_build_object('quantidade', m.quantidade, 'volume_total', m.volume_total,
+                                      'em_estruturacao', m.em_estruturacao)
+            FROM estruturacao.mv_resumo_pipeline m
+            WHERE m.agrupamento = 'total'
+        ),
+
+        'por_status', (
+            SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                'status', m.status, 'quantidade', m.quantidade, 'volume_total', m.volume_total
+            ) ORDER BY m.quantidade DESC), '[]'::jsonb)
+            FROM estruturacao.mv_resumo_pipeline m
+            WHERE m.agrupamento = 'status'
+        ),
+
+        'por_categoria', (
+            SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                'categoria_id', m.categoria_id, 'categoria_nome', COALESCE(c.codigo, c.nome),
+                'quantidade', m.quantidade, 'volume_total', m.volume_total
+            ) ORDER BY m.quantidade DESC), '[]'::jsonb)
+            FROM estruturacao.mv_resumo_pipeline m
+            LEFT JOIN public.get_base_custos_categorias() c ON c.id = m.categoria_id
+            WHERE m.agrupamento = 'categoria'
+        ),
+
+        'por_status_categoria', (
+            SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                'status', m.status, 'categoria_id', m.categoria_id, 'categoria_nome', COALESCE(c.codigo, c.nome),
+                'quantidade', m.quantidade, 'volume_total', m.volume_total
+            ) ORDER BY m.status, m.volume_total DESC), '[]'::jsonb)
+            FROM estruturacao.mv_resumo_pipeline m
+            LEFT JOIN public.get_base_custos_categorias() c ON c.id = m.categoria_id
+            WHERE m.agrupamento = 'status_categoria'
+        ),
+
+        'por_veiculo', (
+            SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                'veiculo_id', m.veiculo_id, 'veiculo_nome', v.nome,
+                'quantidade', m.quantidade, 'volume_total', m.volume_total
+            ) ORDER BY m.quantidade DESC), '[]'::jsonb)
+            FROM estruturacao.mv_resumo_pipeline m
+            LEFT JOIN public.get_base_custos_veiculos() v ON v.id = m.veiculo_id
+            WHERE m.agrupamento = 'veiculo'
+        ),
+
+        'por_pmo', (
+            SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                'pmo_id', m.pmo_id, 'nome', u.nome,
+                'quantidade', m.quantidade, 'em_estruturacao', m.em_estruturacao, 'volume_total', m.volume_total
+            ) ORDER BY m.em_estruturacao DESC, m.quantidade DESC), '[]'::jsonb)
+            FROM estruturacao.mv_resumo_pipeline m
+            LEFT JOIN public.user_profiles u ON u.id = m.pmo_id
+            WHERE m.agrupamento = 'pmo'
+        ),
+
+        'por_analista', (
+            SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                'analista_gestao_id', m.analista_gestao_id, 'nome', a.nome,
+                'quantidade', m.quantidade, 'em_estruturacao', m.em_estruturacao, 'volume_total', m.volume_total
+            ) ORDER BY m.em_estruturacao DESC, m.quantidade DESC), '[]'::jsonb)
+            FROM estruturacao.mv_resumo_pipeline m
+            LEFT JOIN estruturacao.analistas_gestao a ON a.id = m.analista_gestao_id
+            WHERE m.agrupamento = 'analista'
+        ),
+
+        'pendencias_abertas', (
+            SELECT jsonb_build_object(
+                'operacoes', COUNT(*),
+                'itens', COALESCE(SUM(p.itens_pendentes), 0),
+                'maiores', COALESCE((
+                    SELECT jsonb_agg(x.item ORDER BY x.itens DESC, x.aberta_desde)
+                    FROM (
+                        SELECT jsonb_build_object(
+                                   'operacao_id', mp.operacao_id, 'numero_emissao', o.numero_emissao,
+                                   'nome_operacao', o.nome_operacao, 'pendencias', mp.pendencias,
+                                   'itens_pendentes', mp.itens_pendentes, 'aberta_desde', mp.aberta_desde
+                               ) AS item,
+                               mp.itens_pendentes AS itens,
+                               mp.aberta_desde
+                        FROM estruturacao.mv_pendencias_abertas mp
+                        JOIN estruturacao.operacoes o ON o.id = mp.operacao_id
+                        ORDER BY mp.itens_pendentes DESC, mp.aberta_desde
+                        LIMIT p_limite
+                    ) x
+                ), '[]'::jsonb)
+            )
+            FROM estruturacao.mv_pendencias_abertas p
+        ),
+
+        'proximas_liquidacoes', (
+            SELECT COALESCE(jsonb_agg(x.item ORDER BY x.data_previsao_liquidacao), '[]'::jsonb)
+            FROM (
+                SELECT jsonb_build_object(
+                           'operacao_id', o.id, 'numero_emissao', o.numero_emissao, 'nome_operacao', o.nome_operacao,
+                           'status', o.status, 'volume', o.volume,
+                           'data_previsao_liquidacao', o.data_previsao_liquidacao
+                       ) AS item,
+                       o.data_previsao_liquidacao
+                FROM estruturacao.operacoes o
+                WHERE o.status IN ('Em Estruturação', 'On Hold')
+                  AND o.data_previsao_liquidacao >= current_date
+                ORDER BY o.data_previsao_liquidacao
+                LIMIT p_limite
+            ) x
+        )
+    )
+    INTO v_resumo
+    FROM estruturacao.resumo_pipeline_estado e;
+
+    RETURN v_resumo;
+END;
+$$;
+
+REVOKE ALL ON FUNCTION estruturacao.atualizar_resumo_pipeline(boolean) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION estruturacao.atualizar_resumo_pipeline(boolean) TO service_role;
+GRANT EXECUTE ON FUNCTION estruturacao.resumo_pipeline(integer, integer) TO anon, authenticated, service_role;
+
+-- Atualização a cada minuto (não faz nada sem alterações pendentes)
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule('atualizar-resumo-pipeline', '* * * * *',
+                              'SELECT estruturacao.atualizar_resumo_pipeline()');
+    END IF;
+END
+$$;
+
+-- estatisticas_operacoes não tem mais chamadores (Dashboard e verificar_migracao
+-- leem resumo_pipeline)
+DROP FUNCTION IF EXISTS estruturacao.estatisticas_operacoes();
+
+-- Recarregar schema do PostgREST
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,21 @@
+-- =====================================================
+-- Índices para a exportação da planilha (scripts/exportar_planilha.py)
+-- Data: 29/01/2026
+-- =====================================================
+-- A exportação pagina por chave em vez de OFFSET:
+--   operacoes         ORDER BY data_entrada_pipe, id  (ordem cronológica da planilha)
+--   pendencias        ORDER BY id                      (chave primária)
+--   compliance_checks ORDER BY id                      (chave primária)
+-- e, com --desde, filtra por atualizado_em >= data nas três tabelas.
+
+-- Cursor (data_entrada_pipe, id): cada página começa direto na última linha da anterior
+CREATE INDEX IF NOT EXISTS idx_operacoes_entrada_id
+    ON estruturacao.operacoes(data_entrada_pipe, id);
+
+-- Exportação incremental: poucas linhas alteradas desde a última exportação
+CREATE INDEX IF NOT EXISTS idx_operacoes_atualizado_em
+    ON estruturacao.operacoes(atualizado_em);
+CREATE INDEX IF NOT EXISTS idx_pendencias_atualizado_em
+    ON estruturacao.pendencias(atualizado_em);
+CREATE INDEX IF NOT EXISTS idx_compliance_checks_atualizado_em
+    ON estruturacao.compliance_checks(atualizado_em);
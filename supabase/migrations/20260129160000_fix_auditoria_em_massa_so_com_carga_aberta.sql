@@ -0,0 +1,65 @@
+-- =====================================================
+-- Auditoria por comando só existe enquanto há carga em massa aberta
+-- Data: 29/01/2026
+-- =====================================================
+-- audit_operacoes_em_massa_update/delete (20260129100000) usam transition
+-- tables e ficavam sempre criados: a função saía na hora fora da carga, mas
+-- o Postgres monta as transition tables antes de chamá-la, então cada UPDATE
+-- ou DELETE do app em estruturacao.operacoes pagava a cópia das linhas.
+--
+-- Agora os dois triggers são criados quando uma carga é aberta (INSERT em
+-- estruturacao.cargas_em_massa) e removidos quando ela é fechada (ou apagada).
+--
+-- Custo que sobra:
+--   * enquanto a carga está aberta, todo UPDATE/DELETE em operacoes, inclusive
+--     os do app, monta as transition tables (a função continua ignorando os
+--     que não são do service_role, que já são auditados linha a linha);
+--   * abrir e fechar a carga faz CREATE/DROP TRIGGER, que pega um lock SHARE
+--     ROW EXCLUSIVE em operacoes: espera as escritas em andamento e bloqueia
+--     novas por esse instante.
+
+CREATE OR REPLACE FUNCTION estruturacao.alternar_auditoria_em_massa()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = estruturacao, public
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' AND NEW.finalizada_em IS NULL THEN
+        DROP TRIGGER IF EXISTS audit_operacoes_em_massa_update ON estruturacao.operacoes;
+        CREATE TRIGGER audit_operacoes_em_massa_update
+            AFTER UPDATE ON estruturacao.operacoes
+            REFERENCING OLD TABLE AS antigas NEW TABLE AS novas
+            FOR EACH STATEMENT EXECUTE FUNCTION estruturacao.auditar_operacoes_em_massa();
+
+        DROP TRIGGER IF EXISTS audit_operacoes_em_massa_delete ON estruturacao.operacoes;
+        CREATE TRIGGER audit_operacoes_em_massa_delete
+            AFTER DELETE ON estruturacao.operacoes
+            REFERENCING OLD TABLE AS antigas
+            FOR EACH STATEMENT EXECUTE FUNCTION estruturacao.auditar_operacoes_em_massa();
+    ELSIF (TG_OP = 'UPDATE' AND OLD.finalizada_em IS NULL AND NEW.finalizada_em IS NOT NULL)
+       OR (TG_OP = 'DELETE' AND OLD.finalizada_em IS NULL) THEN
+        DROP TRIGGER IF EXISTS audit_operacoes_em_massa_update ON estruturacao.operacoes;
+        DROP TRIGGER IF EXISTS audit_operacoes_em_massa_delete ON estruturacao.operacoes;
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+
+REVOKE ALL ON FUNCTION estruturacao.alternar_auditoria_em_massa() FROM PUBLIC, anon, authenticated;
+
+DROP TRIGGER IF EXISTS alternar_auditoria_em_massa ON estruturacao.cargas_em_massa;
+CREATE TRIGGER alternar_auditoria_em_massa
+    AFTER INSERT OR UPDATE OF finalizada_em OR DELETE ON estruturacao.cargas_em_massa
+    FOR EACH ROW EXECUTE FUNCTION estruturacao.alternar_auditoria_em_massa();
+
+-- Estado atual: sem carga aberta os triggers saem; com uma carga interrompida, ficam
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM estruturacao.cargas_em_massa WHERE finalizada_em IS NULL) THEN
+        DROP TRIGGER IF EXISTS audit_operacoes_em_massa_update ON estruturacao.operacoes;
+        DROP TRIGGER IF EXISTS audit_operacoes_em_massa_delete ON estruturacao.operacoes;
+    END IF;
+END
+$$;
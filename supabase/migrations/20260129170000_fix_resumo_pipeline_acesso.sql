@@ -0,0 +1,57 @@
+-- =====================================================
+-- resumo_pipeline: só para quem já lê operacoes, sem REFRESH sob demanda
+-- Data: 29/01/2026
+-- =====================================================
+-- resumo_pipeline (20260129140000) é SECURITY DEFINER (lê as materialized
+-- views, fechadas para os roles da API) e estava liberada para anon: passava
+-- por cima do RLS de operacoes/pendencias, onde anon só lê com allow_anon()
+-- em dev, e expunha volumes, nomes, números de emissão, PMOs e analistas.
+-- Além disso, p_idade_maxima_segundos => 0 deixava qualquer chamador forçar
+-- um REFRESH CONCURRENTLY a cada chamada.
+--
+-- Agora:
+--   * a leitura fica em ler_resumo_pipeline, sem EXECUTE para os roles da API;
+--   * resumo_pipeline confere o perfil do chamador com as mesmas funções das
+--     políticas de SELECT de operacoes (admin, gestor/analista de
+--     estruturação, gestor de gestão) ou service_role, e não é mais de anon;
+--   * fora do service_role a idade mínima para atualizar é de 60 segundos
+--     (valores menores são elevados a ela); o pg_cron continua atualizando
+--     a cada minuto.
+
+ALTER FUNCTION estruturacao.resumo_pipeline(integer, integer) RENAME TO ler_resumo_pipeline;
+REVOKE ALL ON FUNCTION estruturacao.ler_resumo_pipeline(integer, integer) FROM PUBLIC, anon, authenticated, service_role;
+
+CREATE OR REPLACE FUNCTION estruturacao.resumo_pipeline(
+    p_idade_maxima_segundos integer DEFAULT 300,
+    p_limite integer DEFAULT 20
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = estruturacao, public
+AS $$
+DECLARE
+    -- Chamadores que não são service_role não forçam REFRESH mais cedo que isso
+    v_idade_minima constant integer := 60;
+    v_service boolean := COALESCE(auth.role() = 'service_role', false);
+BEGIN
+    -- is_*() devolvem NULL para quem não tem perfil
+    IF NOT COALESCE(v_service OR public.is_admin() OR public.is_gestor_estruturacao()
+                    OR public.is_analista_estruturacao() OR public.is_gestor_gestao(), false) THEN
+        RAISE EXCEPTION 'Sem permissao para ler o resumo do pipeline'
+            USING ERRCODE = '42501';
+    END IF;
+
+    RETURN estruturacao.ler_resumo_pipeline(
+        CASE WHEN v_service THEN GREATEST(p_idade_maxima_segundos, 0)
+             ELSE GREATEST(p_idade_maxima_segundos, v_idade_minima) END,
+        p_limite
+    );
+END;
+$$;
+
+REVOKE ALL ON FUNCTION estruturacao.resumo_pipeline(integer, integer) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION estruturacao.resumo_pipeline(integer, integer) TO authenticated, service_role;
+
+-- Recarregar schema do PostgREST
+NOTIFY pgrst, 'reload schema';
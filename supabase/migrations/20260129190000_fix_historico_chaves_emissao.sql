@@ -0,0 +1,65 @@
+-- =====================================================
+-- Histórico da emissão pelas chaves de correlação, não pelos ids atuais
+-- Data: 29/01/2026
+-- =====================================================
+-- HistoricoAlteracoesTab (20260129120000) buscava por record_id os ids que
+-- existem hoje em operacoes, series e custos_linhas: o histórico de uma série
+-- ou linha de custo apagada depois sumia da aba.
+--
+-- As chaves de correlação já ficam em todo diff (diff_auditoria mantém
+-- id_emissao, id_emissao_comercial e id_custos_emissao). Agora o trigger de
+-- compactação as copia para chaves_emissao (text[], índice GIN), e a aba
+-- filtra por record_id da emissão/custos_emissao ou chaves_emissao @> {id}.
+
+CREATE OR REPLACE FUNCTION public.chaves_emissao_auditoria(p_antigo jsonb, p_novo jsonb)
+RETURNS text[]
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT array_agg(DISTINCT v.chave ORDER BY v.chave)
+    FROM (VALUES
+        (p_antigo ->> 'id_emissao'), (p_novo ->> 'id_emissao'),
+        (p_antigo ->> 'id_emissao_comercial'), (p_novo ->> 'id_emissao_comercial'),
+        (p_antigo ->> 'id_custos_emissao'), (p_novo ->> 'id_custos_emissao')
+    ) AS v(chave)
+    WHERE v.chave IS NOT NULL;
+$$;
+
+COMMENT ON FUNCTION public.chaves_emissao_auditoria(jsonb, jsonb) IS 'id_emissao, id_emissao_comercial e id_custos_emissao presentes nas duas versões (NULL se nenhum)';
+
+ALTER TABLE public.historico_alteracoes ADD COLUMN IF NOT EXISTS chaves_emissao text[];
+
+CREATE OR REPLACE FUNCTION public.compactar_historico_alteracoes()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_diff record;
+BEGIN
+    IF NEW.action = 'UPDATE' THEN
+        SELECT * INTO v_diff FROM public.diff_auditoria(NEW.old_data, NEW.new_data);
+        IF v_diff.novo IS NULL THEN
+            RETURN NULL;
+        END IF;
+        NEW.old_data := v_diff.antigo;
+        NEW.new_data := v_diff.novo;
+    ELSE
+        NEW.old_data := jsonb_strip_nulls(NEW.old_data);
+        NEW.new_data := jsonb_strip_nulls(NEW.new_data);
+    END IF;
+
+    NEW.chaves_emissao := public.chaves_emissao_auditoria(NEW.old_data, NEW.new_data);
+    RETURN NEW;
+END;
+$$;
+
+-- Linhas já gravadas (o trigger só roda no INSERT)
+UPDATE public.historico_alteracoes
+SET chaves_emissao = public.chaves_emissao_auditoria(old_data, new_data)
+WHERE chaves_emissao IS NULL
+  AND public.chaves_emissao_auditoria(old_data, new_data) IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_audit_chaves_emissao ON public.historico_alteracoes USING gin (chaves_emissao);
+
+-- Recarregar schema do PostgREST
+NOTIFY pgrst, 'reload schema';
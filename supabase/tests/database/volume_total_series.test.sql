@@ -0,0 +1,198 @@
+-- =====================================================
+-- Regressão: volume_total de public.emissoes por comando x por linha
+-- Data: 29/01/2026
+-- =====================================================
+-- Roda contra o Postgres local (supabase start):
+--   supabase test db
+-- ou, num banco com as migrations aplicadas e o pgTAP instalado:
+--   psql -v ON_ERROR_STOP=1 -f supabase/tests/database/volume_total_series.test.sql
+-- A mesma carga de séries é aplicada a dois grupos de emissões: um com os
+-- triggers por comando (20260129110000) e outro com a versão antiga por
+-- linha (20260126204100, recriada abaixo). Os totais precisam ser iguais
+-- entre si e iguais ao SUM das séries. Tudo é desfeito no ROLLBACK.
+
+BEGIN;
+CREATE EXTENSION IF NOT EXISTS pgtap WITH SCHEMA extensions;
+
+SELECT plan(7);
+
+-- Versão por linha, como em 20260126204100
+CREATE FUNCTION public._legado_sync_volume_total_from_series()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_emissao_id uuid;
+  v_sum numeric;
+BEGIN
+  v_emissao_id := COALESCE(NEW.id_emissao, OLD.id_emissao);
+  IF v_emissao_id IS NULL THEN
+    RETURN COALESCE(NEW, OLD);
+  END IF;
+
+  SELECT COALESCE(SUM(COALESCE(valor_emissao, 0)), 0)
+  INTO v_sum
+  FROM public.series
+  WHERE id_emissao = v_emissao_id;
+
+  UPDATE public.emissoes
+  SET volume_total = v_sum,
+      atualizado_em = now()
+  WHERE id = v_emissao_id;
+
+  RETURN COALESCE(NEW, OLD);
+END;
+$$;
+
+-- Conta os UPDATEs que chegam a public.emissoes
+CREATE TEMP TABLE updates_emissoes (n integer NOT NULL);
+INSERT INTO updates_emissoes VALUES (0);
+
+CREATE FUNCTION public._contar_update_emissao()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  UPDATE updates_emissoes SET n = n + 1;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER _contar_update_emissao
+AFTER UPDATE ON public.emissoes
+FOR EACH ROW EXECUTE FUNCTION public._contar_update_emissao();
+
+-- Carga: INSERT multi-linha e linha a linha, UPDATEs de valor (incluindo NULL),
+-- UPDATE sem mudança de valor, DELETE parcial e total
+CREATE FUNCTION public._carga_series_regressao(p_prefixo text)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  e uuid[];
+BEGIN
+  WITH criadas AS (
+    INSERT INTO public.emissoes (numero_emissao)
+    SELECT p_prefixo || '-' || i FROM generate_series(1, 5) AS i
+    RETURNING id, numero_emissao
+  )
+  SELECT array_agg(id ORDER BY numero_emissao) INTO e FROM criadas;
+
+  INSERT INTO public.series (id_emissao, numero, valor_emissao)
+  SELECT e[1], i, i * 1000.50 FROM generate_series(1, 20) AS i
+  UNION ALL SELECT e[2], i, 250000 FROM generate_series(1, 3) AS i
+  UNION ALL SELECT e[3], i, 10 FROM generate_series(1, 4) AS i
+  UNION ALL SELECT e[4], 1, NULL;
+
+  INSERT INTO public.series (id_emissao, numero, valor_emissao) VALUES (e[5], 1, 99.99);
+  INSERT INTO public.series (id_emissao, numero, valor_emissao) VALUES (e[5], 2, 0.01);
+
+  UPDATE public.series SET valor_emissao = valor_emissao * 2 WHERE id_emissao = e[1] AND numero <= 10;
+  UPDATE public.series SET valor_emissao = NULL WHERE id_emissao = e[2] AND numero = 1;
+  UPDATE public.series SET valor_emissao = 5 WHERE id_emissao IN (e[3], e[4]);
+  UPDATE public.series SET taxa_juros = 1.5 WHERE id_emissao = e[1];
+
+  DELETE FROM public.series WHERE id_emissao = e[1] AND numero > 15;
+  DELETE FROM public.series WHERE id_emissao = e[3];
+END;
+$$;
+
+-- Emissões de um prefixo cujo volume_total difere do SUM das séries
+CREATE FUNCTION public._divergencias_volume_total(p_prefixo text)
+RETURNS TABLE (numero_emissao text, volume_total numeric, soma numeric)
+LANGUAGE sql
+AS $$
+  SELECT e.numero_emissao, e.volume_total, t.soma
+  FROM public.emissoes e
+  CROSS JOIN LATERAL (
+    SELECT COALESCE(SUM(COALESCE(s.valor_emissao, 0)), 0) AS soma
+    FROM public.series s
+    WHERE s.id_emissao = e.id
+  ) t
+  WHERE e.numero_emissao LIKE p_prefixo || '-%'
+    AND e.volume_total IS DISTINCT FROM t.soma;
+$$;
+
+-- 1. Triggers por comando (estado das migrations)
+SELECT public._carga_series_regressao('novo');
+
+SELECT is_empty(
+  $$ SELECT * FROM public._divergencias_volume_total('novo') $$,
+  'por comando: volume_total igual ao SUM das series'
+);
+
+INSERT INTO public.emissoes (numero_emissao) VALUES ('novo-contagem');
+UPDATE updates_emissoes SET n = 0;
+INSERT INTO public.series (id_emissao, numero, valor_emissao)
+SELECT (SELECT id FROM public.emissoes WHERE numero_emissao = 'novo-contagem'), i, 100
+FROM generate_series(1, 20) AS i;
+
+SELECT is(
+  (SELECT n FROM updates_emissoes), 1,
+  'por comando: INSERT de 20 series faz um unico UPDATE na emissao'
+);
+
+UPDATE updates_emissoes SET n = 0;
+UPDATE public.series SET taxa_juros = 2, valor_emissao = valor_emissao
+WHERE id_emissao = (SELECT id FROM public.emissoes WHERE numero_emissao = 'novo-contagem');
+
+SELECT is(
+  (SELECT n FROM updates_emissoes), 0,
+  'por comando: UPDATE que nao muda o total nao toca a emissao'
+);
+
+-- 2. Versão por linha
+ALTER TABLE public.series DISABLE TRIGGER trigger_sync_volume_total_from_series_insert;
+ALTER TABLE public.series DISABLE TRIGGER trigger_sync_volume_total_from_series_update;
+ALTER TABLE public.series DISABLE TRIGGER trigger_sync_volume_total_from_series_delete;
+
+CREATE TRIGGER _legado_sync_volume_total_from_series
+AFTER INSERT OR UPDATE OF valor_emissao OR DELETE
+ON public.series
+FOR EACH ROW
+EXECUTE FUNCTION public._legado_sync_volume_total_from_series();
+
+SELECT public._carga_series_regressao('lega');
+
+SELECT is_empty(
+  $$ SELECT * FROM public._divergencias_volume_total('lega') $$,
+  'por linha: volume_total igual ao SUM das series'
+);
+
+SELECT results_eq(
+  $$ SELECT substr(numero_emissao, 6), volume_total FROM public.emissoes
+     WHERE numero_emissao LIKE 'novo-_' ORDER BY 1 $$,
+  $$ SELECT substr(numero_emissao, 6), volume_total FROM public.emissoes
+     WHERE numero_emissao LIKE 'lega-_' ORDER BY 1 $$,
+  'totais identicos entre a versao por comando e a por linha'
+);
+
+INSERT INTO public.emissoes (numero_emissao) VALUES ('lega-contagem');
+UPDATE updates_emissoes SET n = 0;
+INSERT INTO public.series (id_emissao, numero, valor_emissao)
+SELECT (SELECT id FROM public.emissoes WHERE numero_emissao = 'lega-contagem'), i, 100
+FROM generate_series(1, 20) AS i;
+
+SELECT is(
+  (SELECT n FROM updates_emissoes), 20,
+  'por linha: INSERT de 20 series faz 20 UPDATEs (referencia)'
+);
+
+-- 3. Troca de emissão: origem e destino recalculados (a versão por linha não via)
+DROP TRIGGER _legado_sync_volume_total_from_series ON public.series;
+ALTER TABLE public.series ENABLE TRIGGER trigger_sync_volume_total_from_series_insert;
+ALTER TABLE public.series ENABLE TRIGGER trigger_sync_volume_total_from_series_update;
+ALTER TABLE public.series ENABLE TRIGGER trigger_sync_volume_total_from_series_delete;
+
+UPDATE public.series
+SET id_emissao = (SELECT id FROM public.emissoes WHERE numero_emissao = 'novo-5')
+WHERE id_emissao = (SELECT id FROM public.emissoes WHERE numero_emissao = 'novo-1')
+  AND numero IN (10, 11);
+
+SELECT is_empty(
+  $$ SELECT * FROM public._divergencias_volume_total('novo') $$,
+  'por comando: troca de id_emissao recalcula origem e destino'
+);
+
+SELECT * FROM finish();
+ROLLBACK;